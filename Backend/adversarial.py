@@ -0,0 +1,212 @@
+import time
+import numpy as np
+import pandas as pd
+from .group_metrics import encode_groups, positive_index, to_python
+from .settings import get_setting
+
+FAIRNESS_CRITERIA = ("demographic_parity", "equalized_odds")
+
+
+def _adversarial_settings():
+    config = get_setting("mitigation", "adversarial_debiasing", default={}) or {}
+    return {
+        "num_epochs": int(config.get("num_epochs", 50)),
+        "learning_rate": float(config.get("learning_rate", 0.01)),
+        "adversary_learning_rate": float(config.get("adversary_learning_rate") or config.get("learning_rate", 0.01)),
+        "adversary_weight": float(config.get("adversary_weight", 1.0)),
+        "batch_size": int(config.get("batch_size", 256)),
+        "patience": int(config.get("patience", 5)),
+        "validation_fraction": float(config.get("validation_fraction", 0.2)),
+        "fairness": config.get("fairness", "demographic_parity"),
+        "random_state": config.get("random_state", 0),
+    }
+
+
+def _sigmoid(z):
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+
+def _softmax(a):
+    a = a - a.max(axis=1, keepdims=True)
+    e = np.exp(a)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _bce(y, p):
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def _adversary_inputs(p, y, fairness):
+    """
+    What the adversary sees: the predicted probability, plus its interaction with the
+    true label for equalized odds (so it can only use the prediction within a class).
+    Returns the inputs and their derivative with respect to p.
+    """
+    if fairness == "equalized_odds":
+        return np.column_stack([p, p * y, p * (1 - y)]), np.column_stack([np.ones_like(p), y, 1 - y])
+    return p[:, None], np.ones((len(p), 1))
+
+
+class AdversarialDebiasingClassifier:
+    """
+    Logistic-regression predictor trained against an adversary that tries to recover
+    the sensitive group from the predictor's output (Zhang, Lemoine & Mitchell, 2018).
+    Training uses minibatch gradient steps in NumPy. The predictor's step removes its
+    projection onto the adversary's gradient and then moves against the adversary, so
+    its predictions carry as little group information as the label allows.
+    Exposes the usual predict / predict_proba interface, so a fitted model can be
+    registered and used by the other model endpoints.
+    """
+
+    def __init__(self, num_epochs=50, learning_rate=0.01, adversary_learning_rate=None, adversary_weight=1.0,
+                 batch_size=256, patience=5, validation_fraction=0.2, fairness="demographic_parity", random_state=0):
+        if fairness not in FAIRNESS_CRITERIA:
+            raise ValueError(f"Unknown fairness criterion '{fairness}'. Expected one of: {', '.join(FAIRNESS_CRITERIA)}.")
+        self.num_epochs = num_epochs
+        self.learning_rate = learning_rate
+        self.adversary_learning_rate = adversary_learning_rate or learning_rate
+        self.adversary_weight = adversary_weight
+        self.batch_size = batch_size
+        self.patience = patience
+        self.validation_fraction = validation_fraction
+        self.fairness = fairness
+        self.random_state = random_state
+
+    def _standardize(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[self.feature_names_in_]
+        X = (np.asarray(X, dtype=float) - self.mean_) / self.scale_
+        # Missing feature values fall back to the training mean.
+        return np.nan_to_num(X, nan=0.0)
+
+    def fit(self, X, y, groups):
+        """
+        Fit on features X, binary labels y and sensitive group labels `groups`.
+        Rows with a missing label or group are ignored.
+        """
+        if isinstance(X, pd.DataFrame):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        X = np.asarray(X, dtype=float)
+        label_codes, classes = encode_groups(np.asarray(y))
+        if len(classes) != 2:
+            raise ValueError("Adversarial debiasing requires a binary label.")
+        group_codes, self.groups_ = encode_groups(groups)
+        keep = (label_codes >= 0) & (group_codes >= 0)
+        X, label_codes, group_codes = X[keep], label_codes[keep], group_codes[keep]
+
+        pos = positive_index(classes)
+        self.classes_ = np.array([classes[1 - pos], classes[pos]])
+        target = (label_codes == pos).astype(float)
+
+        self.mean_ = np.nanmean(X, axis=0)
+        scale = np.nanstd(X, axis=0)
+        self.scale_ = np.where(scale > 0, scale, 1.0)
+        X = np.nan_to_num((X - self.mean_) / self.scale_, nan=0.0)
+
+        rng = np.random.default_rng(self.random_state)
+        order = rng.permutation(len(X))
+        n_val = int(len(X) * self.validation_fraction) if len(X) >= 10 else 0
+        val, train = order[:n_val], order[n_val:]
+        # Epoch metrics and early stopping use the held-out rows (the training rows if too few).
+        monitor = val if n_val else train
+
+        n_features, n_groups = X.shape[1], len(self.groups_)
+        n_adv_inputs = 3 if self.fairness == "equalized_odds" else 1
+        # Predictor parameters [w; b] and adversary parameters [U; c].
+        theta = np.zeros(n_features + 1)
+        adversary = np.zeros((n_adv_inputs + 1, n_groups))
+        onehot = np.eye(n_groups)
+
+        best, best_objective, stale = theta.copy(), np.inf, 0
+        self.best_epoch_ = 0
+        self.history_ = []
+        for epoch in range(1, self.num_epochs + 1):
+            started = time.perf_counter()
+            batches = rng.permutation(train)
+            pred_loss = adv_loss = 0.0
+            for start in range(0, len(batches), self.batch_size):
+                idx = batches[start:start + self.batch_size]
+                m = len(idx)
+                Xb, yb = X[idx], target[idx]
+                p = _sigmoid(Xb @ theta[:-1] + theta[-1])
+                h, dh_dp = _adversary_inputs(p, yb, self.fairness)
+                q = _softmax(h @ adversary[:-1] + adversary[-1])
+
+                # Gradients of the mean predictor and adversary losses.
+                dz = (p - yb) / m
+                grad_pred = np.append(Xb.T @ dz, dz.sum())
+                da = (q - onehot[group_codes[idx]]) / m
+                grad_adv_params = np.vstack([h.T @ da, da.sum(axis=0)])
+                dz_adv = ((da @ adversary[:-1].T) * dh_dp).sum(axis=1) * p * (1 - p)
+                grad_adv = np.append(Xb.T @ dz_adv, dz_adv.sum())
+
+                # Predictor: drop the component that helps the adversary, then push against it.
+                norm = grad_adv @ grad_adv
+                projection = (grad_pred @ grad_adv) / norm * grad_adv if norm > 0 else 0.0
+                theta -= self.learning_rate * (grad_pred - projection - self.adversary_weight * grad_adv)
+                adversary -= self.adversary_learning_rate * grad_adv_params
+
+                pred_loss += _bce(yb, p) * m
+                adv_loss += float(-np.log(np.clip(q[np.arange(m), group_codes[idx]], 1e-12, None)).sum())
+
+            self.coef_, self.intercept_ = theta[:-1].copy(), theta[-1]
+            metrics = self._epoch_metrics(X[monitor], target[monitor], group_codes[monitor], adversary)
+            metrics.update({
+                "epoch": epoch,
+                "seconds": time.perf_counter() - started,
+                "train_loss": pred_loss / max(len(train), 1),
+                "adversary_loss": adv_loss / max(len(train), 1),
+            })
+            self.history_.append(metrics)
+
+            # Early stopping on the validation minimax objective the predictor minimizes.
+            objective = metrics["validation_loss"] - self.adversary_weight * metrics["validation_adversary_loss"]
+            if objective < best_objective - 1e-4:
+                best, best_objective, stale = theta.copy(), objective, 0
+                self.best_epoch_ = epoch
+            else:
+                stale += 1
+                if stale >= self.patience:
+                    break
+
+        self.coef_, self.intercept_ = best[:-1], best[-1]
+        self.n_epochs_ = len(self.history_)
+        return self
+
+    def _epoch_metrics(self, X, y, groups, adversary):
+        p = _sigmoid(X @ self.coef_ + self.intercept_)
+        h, _ = _adversary_inputs(p, y, self.fairness)
+        q = _softmax(h @ adversary[:-1] + adversary[-1])
+        predicted = p >= 0.5
+        n_groups = len(self.groups_)
+        size = np.bincount(groups, minlength=n_groups)
+        positives = np.bincount(groups, weights=y, minlength=n_groups)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            selection = np.bincount(groups, weights=predicted, minlength=n_groups) / size
+            tpr = np.bincount(groups, weights=predicted * y, minlength=n_groups) / positives
+        selection, tpr = selection[size > 0], tpr[positives > 0]
+        return {
+            "validation_loss": _bce(y, p),
+            "validation_adversary_loss": float(-np.log(np.clip(q[np.arange(len(q)), groups], 1e-12, None)).mean()) if len(q) else 0.0,
+            "validation_accuracy": float((predicted == y).mean()) if len(y) else None,
+            "demographic_parity_difference": to_python(selection.max() - selection.min()) if len(selection) else None,
+            "equal_opportunity_difference": to_python(tpr.max() - tpr.min()) if len(tpr) else None,
+        }
+
+    def predict_proba(self, X):
+        p = _sigmoid(self._standardize(X) @ self.coef_ + self.intercept_)
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] >= 0.5).astype(int)]
+
+
+def train_adversarial_debiasing(X, y, groups, **overrides):
+    """
+    Fit an AdversarialDebiasingClassifier with the mitigation.adversarial_debiasing
+    settings from metrics.yaml, overridden by any keyword arguments.
+    """
+    params = _adversarial_settings()
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    return AdversarialDebiasingClassifier(**params).fit(X, y, groups)
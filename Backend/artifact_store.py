@@ -0,0 +1,116 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+from .settings import BASE_DIR, get_setting
+
+# Supported artifact formats: file extension and media type.
+ARTIFACT_FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "weights": (".npy", "application/octet-stream"),
+}
+
+
+def _storage_dir():
+    return os.path.join(BASE_DIR, get_setting("artifact_store", "storage_dir", default="artifact_store"))
+
+
+def _file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _store(write, fmt):
+    """
+    Write an artifact through `write(path)` into a temporary file, then move it to
+    its content-addressed name. Identical outputs share one file.
+    """
+    extension, _ = ARTIFACT_FORMATS[fmt]
+    directory = _storage_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        artifact_id = _file_hash(tmp_path)
+        path = os.path.join(directory, artifact_id + extension)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"artifact_id": artifact_id, "format": fmt, "size_bytes": os.path.getsize(path)}
+
+
+def store_frame(df, fmt="parquet"):
+    """
+    Store a DataFrame as a Parquet file or an Arrow IPC file and return its handle.
+    Raises ValueError for unknown formats or when pyarrow is not installed.
+    """
+    if fmt not in ("parquet", "arrow"):
+        raise ValueError(f"Unsupported table format: {fmt}")
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError as e:
+        raise ValueError(f"The '{fmt}' output format requires pyarrow.") from e
+
+    def write(path):
+        if fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path)
+
+    handle = _store(write, fmt)
+    handle.update({"rows": len(df), "columns": [str(col) for col in df.columns]})
+    return handle
+
+
+def store_weights(df, columns):
+    """
+    Store only the given numeric columns (sample weights, debiased scores) as a
+    structured .npy array in input row order.
+    It loads with np.load without allow_pickle, and the field names are the column names.
+    """
+    weights = np.empty(len(df), dtype=[(col, np.float64) for col in columns])
+    for col in columns:
+        weights[col] = df[col].to_numpy(dtype=np.float64)
+
+    def write(path):
+        # Save through a file object: np.save would append ".npy" to the temporary name.
+        with open(path, "wb") as f:
+            np.save(f, weights, allow_pickle=False)
+
+    handle = _store(write, "weights")
+    handle.update({"rows": len(df), "columns": list(columns)})
+    return handle
+
+
+def artifact_path(artifact_id: str):
+    """
+    Return (path, format) of a stored artifact. Raises KeyError for unknown IDs.
+    """
+    if len(artifact_id) != 64 or any(c not in "0123456789abcdef" for c in artifact_id):
+        raise KeyError(artifact_id)
+    for fmt, (extension, _) in ARTIFACT_FORMATS.items():
+        path = os.path.join(_storage_dir(), artifact_id + extension)
+        if os.path.exists(path):
+            return path, fmt
+    raise KeyError(artifact_id)
+
+
+def iter_artifact(path, chunk_size=None):
+    """
+    Yield the bytes of an artifact file in chunks of artifact_store.chunk_size.
+    """
+    chunk_size = chunk_size or get_setting("artifact_store", "chunk_size", default=1024 * 1024)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield chunk
@@ -0,0 +1,186 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import NamedTuple
+import pandas as pd
+from .bias_detector import analyze_dataset_bias, fairness_report, model_report
+from .explainability import explain_shap_dataset
+from .group_metrics import group_confusion_counts
+from .ingestion import feature_columns
+from .mitigations import mitigate_bias
+from .prediction import cached_predictions
+from .reweighing import group_codes, sensitive_columns
+from .settings import get_setting
+
+AUDIT_STAGES = ("dataset", "fairness", "model", "shap", "mitigation")
+# Graph node of each stage; the model stage cannot share its name with the 'model' input.
+STAGE_NODES = {stage: stage for stage in AUDIT_STAGES} | {"model": "model_report"}
+
+
+class StageSkipped(Exception):
+    """
+    Raised by a node whose inputs are not available (e.g. SHAP without a model).
+    """
+
+
+class Node(NamedTuple):
+    fn: object
+    requires: tuple
+
+
+def _audit_settings():
+    config = get_setting("audit", default={}) or {}
+    return {
+        "stages": list(config.get("stages") or AUDIT_STAGES),
+        "max_workers": int(config.get("max_workers") or 4),
+        "mitigation_output": config.get("mitigation_output", "weights"),
+    }
+
+
+def _predictions(frame, model, model_hash=None, dataset_hash=None, n_jobs=None):
+    if model is not None:
+        predictions, _ = cached_predictions(model, frame[feature_columns(frame, model)],
+                                            model_hash=model_hash, dataset_hash=dataset_hash, n_jobs=n_jobs)
+        return predictions
+    if "prediction" in frame.columns:
+        return frame["prediction"].to_numpy()
+    raise StageSkipped("No model and no 'prediction' column.")
+
+
+def _group_counts(frame, predictions):
+    if "label" not in frame.columns:
+        raise StageSkipped("Dataset has no 'label' column.")
+    # Every sensitive column, intersected; a single "all" group when there are none.
+    codes, labels = group_codes(frame, sensitive_columns(frame))
+    return group_confusion_counts(frame["label"], predictions, pd.Categorical.from_codes(codes, labels))
+
+
+def _fairness(frame, counts):
+    if not sensitive_columns(frame):
+        raise StageSkipped("Dataset has no sensitive columns.")
+    return fairness_report(counts)
+
+
+def _shap(frame, model, n_jobs=None):
+    if model is None:
+        raise StageSkipped("No model provided.")
+    return explain_shap_dataset(model, frame, n_jobs=n_jobs)
+
+
+def _mitigation(frame, output):
+    # Mitigation adds its weight columns to the frame it is given; a shallow copy keeps
+    # the shared frame unchanged for the stages running next to it.
+    return mitigate_bias(frame.copy(deep=False), output=output)
+
+
+def build_graph(output, model_hash=None, dataset_hash=None, n_jobs=None):
+    """
+    The audit dependency graph. 'frame' and 'model' are inputs; 'predictions' and
+    'group_counts' are intermediates computed once and shared by the stages, which are
+    named as in STAGE_NODES.
+    Predictions are cached by (model_hash, dataset_hash) across audits, and `n_jobs`
+    caps the worker processes of the prediction and SHAP stages.
+    """
+    return {
+        "predictions": Node(lambda frame, model: _predictions(frame, model, model_hash, dataset_hash, n_jobs),
+                            ("frame", "model")),
+        "group_counts": Node(_group_counts, ("frame", "predictions")),
+        "dataset": Node(analyze_dataset_bias, ("frame",)),
+        "fairness": Node(_fairness, ("frame", "group_counts")),
+        "model_report": Node(model_report, ("group_counts",)),
+        "shap": Node(lambda frame, model: _shap(frame, model, n_jobs), ("frame", "model")),
+        "mitigation": Node(lambda frame: _mitigation(frame, output), ("frame",)),
+    }
+
+
+def _closure(graph, targets):
+    needed, stack = set(), list(targets)
+    while stack:
+        name = stack.pop()
+        if name in graph and name not in needed:
+            needed.add(name)
+            stack.extend(graph[name].requires)
+    return needed
+
+
+def run_graph(graph, inputs, targets, max_workers=4):
+    """
+    Run the nodes needed for `targets` on a thread pool, each as soon as all of its
+    requirements are done, so independent nodes run concurrently and every node runs
+    once. Each node runs in a copy of the caller's context, so its spans count towards
+    the request. Returns {node: {"status", "seconds", "result" | "error" | "reason"}}.
+    A node fails when it raises or returns an {"error": ...} dict; nodes depending on a
+    failed or skipped node are skipped.
+    """
+    values = dict(inputs)
+    pending = _closure(graph, targets)
+    outcomes = {}
+
+    def timed(name):
+        started = time.perf_counter()
+        node = graph[name]
+        try:
+            return node.fn(*(values[req] for req in node.requires)), None, time.perf_counter() - started
+        except StageSkipped as e:
+            return None, ("skipped", str(e)), time.perf_counter() - started
+        except Exception as e:
+            return None, ("failed", str(e)), time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for name in sorted(pending):
+                requires = graph[name].requires
+                blocked = [req for req in requires if req in outcomes and outcomes[req]["status"] != "succeeded"]
+                if blocked:
+                    pending.discard(name)
+                    outcomes[name] = {"status": "skipped", "seconds": 0.0, "reason": f"Requires '{blocked[0]}'."}
+                elif all(req in values for req in requires):
+                    pending.discard(name)
+                    running[pool.submit(contextvars.copy_context().run, timed, name)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result, problem, seconds = future.result()
+                if problem is None and isinstance(result, dict) and "error" in result:
+                    problem = ("failed", result["error"])
+                if problem is None:
+                    values[name] = result
+                    outcomes[name] = {"status": "succeeded", "seconds": seconds, "result": result}
+                else:
+                    status, message = problem
+                    outcomes[name] = {"status": status, "seconds": seconds,
+                                      "error" if status == "failed" else "reason": message}
+    return outcomes
+
+
+def run_audit(frame, model=None, stages=None, max_workers=None, model_hash=None, dataset_hash=None, n_jobs=None):
+    """
+    Run the audit stages from the audit section of metrics.yaml (or `stages`) over one
+    parsed frame and one loaded model. Predictions and the group confusion counts are
+    computed once and shared by the fairness and model stages; independent stages run
+    concurrently. With both hashes given, predictions are reused from earlier audits
+    of the same model and dataset. Returns one report with every stage's result and per-stage timings.
+    """
+    settings = _audit_settings()
+    stages = list(stages or settings["stages"])
+    unknown = [stage for stage in stages if stage not in AUDIT_STAGES]
+    if unknown:
+        return {"error": f"Unknown audit stage '{unknown[0]}'. Expected any of: {', '.join(AUDIT_STAGES)}."}
+
+    started = time.perf_counter()
+    graph = build_graph(settings["mitigation_output"], model_hash, dataset_hash, n_jobs)
+    outcomes = run_graph(graph, {"frame": frame, "model": model}, [STAGE_NODES[stage] for stage in stages],
+                         max_workers=max_workers or settings["max_workers"])
+
+    report = {"rows": len(frame), "stages": {}, "timings": {}}
+    node_stages = {node: stage for stage, node in STAGE_NODES.items()}
+    for node, outcome in outcomes.items():
+        name = node_stages.get(node, node)
+        report["timings"][name] = outcome["seconds"]
+        if name in stages:
+            report["stages"][name] = outcome
+    report["timings"]["total"] = time.perf_counter() - started
+    return report
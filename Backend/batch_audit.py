@@ -0,0 +1,266 @@
+"""
+Batch audit of many (dataset, model) pairs without going through the HTTP API.
+
+    python -m Backend.batch_audit --directory nightly/ --output results.parquet
+    python -m Backend.batch_audit --manifest pairs.json --tasks dataset fairness privacy
+
+A manifest is a JSON list (or a CSV) of {"dataset": ..., "model": ..., "tasks": [...]}
+entries with paths relative to the manifest; "model" and "tasks" are optional.
+A directory pairs every CSV with every pickled model (*.joblib, *.pkl, *.pickle).
+Pairs sharing a dataset are sent to the same worker process together, and each
+worker keeps recently parsed datasets and loaded models, so every file is read
+once per worker. Results are written as one row per (pair, task) with timings.
+"""
+import os
+import sys
+import json
+import time
+import glob
+import logging
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from .audit import run_audit, AUDIT_STAGES
+from .db_manager import _json_default
+from .ingestion import read_csv_upload, content_hash
+from .model_registry import load_model_bytes, model_hash
+from .privacy import perform_privacy_tests
+from .settings import get_setting
+
+BATCH_TASKS = AUDIT_STAGES + ("privacy",)
+MODEL_EXTENSIONS = (".joblib", ".pkl", ".pickle")
+
+logger = logging.getLogger(__name__)
+
+# Per-worker caches of parsed datasets and loaded models, keyed by (path, mtime).
+_datasets = OrderedDict()
+_models = OrderedDict()
+
+
+def _batch_settings():
+    config = get_setting("batch_audit", default={}) or {}
+    return {
+        "tasks": list(config.get("tasks") or BATCH_TASKS),
+        "max_workers": config.get("max_workers") or os.cpu_count() or 1,
+        "models_per_task": int(config.get("models_per_task", 8)),
+        "cache_size": int(config.get("cache_size", 8)),
+    }
+
+
+def _cached(cache, path, load, cache_size):
+    """
+    Return (value, seconds, reused) for a file, loading it on a miss.
+    """
+    key = (path, os.path.getmtime(path))
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key], 0.0, True
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        value = load(f.read())
+    cache[key] = value
+    while len(cache) > cache_size:
+        cache.popitem(last=False)
+    return value, time.perf_counter() - started, False
+
+
+def _parse_dataset(content):
+    return read_csv_upload(content), content_hash(content)
+
+
+def _parse_model(content):
+    key = model_hash(content)
+    return load_model_bytes(content, key), key
+
+
+def _row(dataset, model, task, status, seconds, dataset_hash=None, model_hash=None, result=None, error=None):
+    return {"dataset": dataset, "model": model, "task": task, "status": status, "seconds": seconds,
+            "dataset_hash": dataset_hash, "model_hash": model_hash, "error": error, "result": result}
+
+
+def audit_dataset(dataset_path, model_paths, tasks, cache_size=8):
+    """
+    Run `tasks` for one dataset against each of `model_paths` (None for a dataset-only
+    audit) in this process. Returns the result rows, including the load of each file.
+    """
+    rows = []
+    try:
+        (df, dataset_key), seconds, reused = _cached(_datasets, dataset_path, _parse_dataset, cache_size)
+    except Exception as e:
+        return [_row(dataset_path, None, "load_dataset", "failed", 0.0, error=str(e))]
+    rows.append(_row(dataset_path, None, "load_dataset", "reused" if reused else "succeeded", seconds, dataset_key))
+
+    stages = [task for task in tasks if task in AUDIT_STAGES]
+    for model_path in model_paths:
+        model, model_key = None, None
+        if model_path is not None:
+            try:
+                (model, model_key), seconds, reused = _cached(_models, model_path, _parse_model, cache_size)
+            except Exception as e:
+                rows.append(_row(dataset_path, model_path, "load_model", "failed", 0.0, dataset_key, error=str(e)))
+                continue
+            rows.append(_row(dataset_path, model_path, "load_model", "reused" if reused else "succeeded", seconds,
+                             dataset_key, model_key))
+
+        if stages:
+            # Parallelism comes from the batch workers, so the stages run single-process.
+            try:
+                report = run_audit(df, model, stages=stages, model_hash=model_key, dataset_hash=dataset_key, n_jobs=1)
+            except Exception as e:
+                report = {"error": str(e)}
+            if "error" in report:
+                rows.append(_row(dataset_path, model_path, "audit", "failed", 0.0, dataset_key, model_key, error=report["error"]))
+            for stage, outcome in report.get("stages", {}).items():
+                rows.append(_row(dataset_path, model_path, stage, outcome["status"], outcome["seconds"], dataset_key,
+                                 model_key, outcome.get("result"), outcome.get("error") or outcome.get("reason")))
+        if "privacy" in tasks:
+            if model is None:
+                rows.append(_row(dataset_path, model_path, "privacy", "skipped", 0.0, dataset_key, error="No model provided."))
+                continue
+            started = time.perf_counter()
+            try:
+                result = perform_privacy_tests(model, df)
+            except Exception as e:
+                result = {"error": str(e)}
+            status = "failed" if "error" in result else "succeeded"
+            rows.append(_row(dataset_path, model_path, "privacy", status, time.perf_counter() - started, dataset_key,
+                             model_key, None if status == "failed" else result, result.get("error")))
+    return rows
+
+
+def _audit_work(dataset, models, tasks, cache_size):
+    """
+    audit_dataset for one work item in the parent process; an unexpected failure
+    (or a crashed worker, via `result`) becomes one failed row per pair.
+    """
+    try:
+        return audit_dataset(dataset, models, tasks, cache_size)
+    except Exception as e:
+        return _failed_work(dataset, models, e)
+
+
+def _failed_work(dataset, models, error):
+    logger.error("Audit of %s failed: %s", dataset, error)
+    return [_row(dataset, model, "audit", "failed", 0.0, error=str(error)) for model in models]
+
+
+def read_manifest(path, default_tasks):
+    """
+    Read (dataset, model, tasks) entries from a JSON or CSV manifest; paths are
+    resolved relative to the manifest.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    if path.endswith(".csv"):
+        entries = pd.read_csv(path).astype(object).where(lambda df: df.notna(), None).to_dict("records")
+    else:
+        with open(path) as f:
+            entries = json.load(f)
+    pairs = []
+    for entry in entries:
+        tasks = entry.get("tasks") or default_tasks
+        if isinstance(tasks, str):
+            tasks = [task.strip() for task in tasks.split(",") if task.strip()]
+        model = entry.get("model")
+        pairs.append((os.path.join(base, entry["dataset"]), os.path.join(base, model) if model else None, tuple(tasks)))
+    return pairs
+
+
+def scan_directory(directory, tasks):
+    """
+    Pair every CSV in `directory` with every pickled model in it (or with no model).
+    """
+    datasets = sorted(glob.glob(os.path.join(directory, "*.csv")))
+    models = sorted(path for path in glob.glob(os.path.join(directory, "*")) if path.endswith(MODEL_EXTENSIONS))
+    return [(dataset, model, tuple(tasks)) for dataset in datasets for model in (models or [None])]
+
+
+def plan(pairs, models_per_task):
+    """
+    Group pairs by (dataset, tasks) and split each group into work items of at most
+    `models_per_task` models, so a worker parses a dataset once for several models.
+    """
+    groups = OrderedDict()
+    for dataset, model, tasks in pairs:
+        groups.setdefault((dataset, tasks), []).append(model)
+    return [(dataset, models[i:i + models_per_task], tasks)
+            for (dataset, tasks), models in groups.items()
+            for i in range(0, len(models), models_per_task)]
+
+
+def run_batch(pairs, max_workers=None, models_per_task=None, cache_size=None):
+    """
+    Audit all pairs on a process pool and return the result rows. A pair that fails
+    is reported as a failed row and the rest of the batch still runs.
+    """
+    settings = _batch_settings()
+    max_workers = max_workers or settings["max_workers"]
+    cache_size = cache_size or settings["cache_size"]
+    for _, _, tasks in pairs:
+        unknown = [task for task in tasks if task not in BATCH_TASKS]
+        if unknown:
+            raise ValueError(f"Unknown task '{unknown[0]}'. Expected any of: {', '.join(BATCH_TASKS)}.")
+    work = plan(pairs, models_per_task or settings["models_per_task"])
+    if max_workers <= 1 or len(work) <= 1:
+        return [row for dataset, models, tasks in work for row in _audit_work(dataset, models, tasks, cache_size)]
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(work))) as pool:
+        futures = {pool.submit(audit_dataset, dataset, models, tasks, cache_size): (dataset, models)
+                   for dataset, models, tasks in work}
+        for future in as_completed(futures):
+            dataset, models = futures[future]
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                rows.extend(_failed_work(dataset, models, e))
+                continue
+            logger.info("Audited %s.", dataset)
+    return rows
+
+
+def write_results(rows, path, summary):
+    """
+    Write the result rows as JSON (with the run summary) or as Parquet, where each
+    task's result is stored as a JSON string column.
+    """
+    if path.endswith(".parquet"):
+        frame = pd.DataFrame(rows)
+        frame["result"] = [None if result is None else json.dumps(result, default=_json_default) for result in frame["result"]]
+        frame.to_parquet(path, index=False)
+    else:
+        with open(path, "w") as f:
+            json.dump({"summary": summary, "tasks": rows}, f, default=_json_default, indent=2)
+
+
+def main(argv=None):
+    """
+    Console entry point. Returns 0 when every task succeeded or was skipped, 1 otherwise.
+    """
+    settings = _batch_settings()
+    parser = argparse.ArgumentParser(prog="python -m Backend.batch_audit", description=__doc__.split("\n\n")[0].strip())
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="JSON or CSV list of dataset/model pairs")
+    source.add_argument("--directory", help="Directory of CSV datasets and pickled models")
+    parser.add_argument("--output", default="audit_results.json", help="Results file (.json or .parquet)")
+    parser.add_argument("--tasks", nargs="+", choices=BATCH_TASKS, default=settings["tasks"])
+    parser.add_argument("--workers", type=int, default=settings["max_workers"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    pairs = read_manifest(args.manifest, args.tasks) if args.manifest else scan_directory(args.directory, args.tasks)
+    if not pairs:
+        parser.error("No datasets found.")
+    started = time.perf_counter()
+    rows = run_batch(pairs, max_workers=args.workers)
+    statuses = pd.Series([row["status"] for row in rows]).value_counts().to_dict()
+    summary = {"pairs": len(pairs), "workers": args.workers, "seconds": time.perf_counter() - started,
+               "statuses": statuses}
+    write_results(rows, args.output, summary)
+    logger.info("Audited %d pairs in %.1fs: %s. Results written to %s.", len(pairs), summary["seconds"],
+                statuses, args.output)
+    return 1 if statuses.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Sustained report-insert throughput under concurrent load.
+
+Compares the batched background writer in db_manager with the previous approach
+(a new connection and a commit for every report) on a temporary database:
+
+    python -m Backend.benchmarks.report_storage --threads 8 --reports 5000
+"""
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+from .. import db_manager
+
+
+def _payload(size):
+    return {"mitigated_dataset": "label,weight\n" + "1,0.5\n" * (size // 6)}
+
+
+def _run_threads(n_threads, n_reports, target):
+    per_thread = n_reports // n_threads
+    threads = [threading.Thread(target=target, args=(per_thread,)) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_thread * n_threads, start
+
+
+def bench_batched(path, n_threads, n_reports, payload):
+    db_manager.DATABASE = path
+    db_manager._writer = None
+
+    def work(count):
+        for _ in range(count):
+            db_manager.store_report(payload, dataset_hash="0" * 64)
+
+    total, start = _run_threads(n_threads, n_reports, work)
+    db_manager.flush_reports()
+    return total, time.perf_counter() - start
+
+
+def bench_per_insert(path, n_threads, n_reports, payload):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY AUTOINCREMENT, report TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    def work(count):
+        for _ in range(count):
+            conn = sqlite3.connect(path, timeout=60)
+            conn.execute("INSERT INTO reports (report) VALUES (?)", (str(payload),))
+            conn.commit()
+            conn.close()
+
+    total, start = _run_threads(n_threads, n_reports, work)
+    return total, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--payload-bytes", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    payload = _payload(args.payload_bytes)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, bench in (("per-insert connection", bench_per_insert), ("batched WAL writer", bench_batched)):
+            total, elapsed = bench(os.path.join(tmp, f"{bench.__name__}.db"), args.threads, args.reports, payload)
+            print(f"{name:>22}: {total} reports from {args.threads} threads in {elapsed:.2f}s "
+                  f"({total / elapsed:,.0f} inserts/sec)")
+
+
+if __name__ == "__main__":
+    main()
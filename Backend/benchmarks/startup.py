@@ -0,0 +1,80 @@
+"""
+Cold-start benchmark: time to import the API module in a fresh interpreter.
+
+    python -m Backend.benchmarks.startup --repeats 5
+
+Fails (exit code 1) when the median import time exceeds startup.import_budget_seconds
+or when a dependency that should load lazily (see warmup.LAZY_MODULES) is imported.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from ..settings import get_setting
+from ..warmup import LAZY_MODULES
+
+PACKAGE = __package__.rpartition(".")[0]
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_PROBE = """
+import sys, json, time, importlib
+started = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "lazy_loaded": sorted(m for m in {lazy!r} if m in sys.modules)}}))
+"""
+
+
+def measure_import(module=None, repeats=5):
+    """
+    Import `module` (the API module by default) in `repeats` fresh interpreters.
+    Returns the median and all import times in seconds, and the lazily loaded
+    dependencies that were imported anyway.
+    """
+    module = module or f"{PACKAGE}.main"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    code = _PROBE.format(module=module, lazy=LAZY_MODULES)
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        "module": module,
+        "median_seconds": statistics.median(run["seconds"] for run in runs),
+        "seconds": [run["seconds"] for run in runs],
+        "lazy_loaded": sorted({name for run in runs for name in run["lazy_loaded"]}),
+    }
+
+
+def check_budget(result, budget=None):
+    """
+    List the budget violations of a measure_import result (empty when within budget).
+    """
+    budget = budget if budget is not None else get_setting("startup", "import_budget_seconds", default=2.0)
+    failures = []
+    if result["median_seconds"] > budget:
+        failures.append(f"Importing {result['module']} took {result['median_seconds']:.2f}s (budget {budget:.2f}s).")
+    if result["lazy_loaded"]:
+        failures.append(f"Importing {result['module']} loaded {', '.join(result['lazy_loaded'])} eagerly.")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", help="Module to import (default: the API module)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget", type=float, help="Import budget in seconds (default: startup.import_budget_seconds)")
+    args = parser.parse_args(argv)
+
+    result = measure_import(args.module, args.repeats)
+    failures = check_budget(result, args.budget)
+    print(json.dumps(result, indent=2))
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
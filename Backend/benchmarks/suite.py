@@ -0,0 +1,323 @@
+"""
+Scaled benchmark suite over the bundled COMPAS and German Credit datasets.
+
+Each dataset is scaled to a multiple of its rows (jittered copies of the original
+rows) with synthetic 'label', 'prediction' and 'sensitive' columns. Every public
+function of bias_detector, mitigations, privacy and explainability, and the HTTP
+endpoints through a test client, is timed and its peak traced memory recorded:
+
+    python -m Backend.benchmarks.suite --scales 1 10 100 --output benchmark_results.json
+    python -m Backend.benchmarks.suite --cases shap /audit --baseline benchmark_results.json
+
+With --baseline the run is compared with a stored results file, and it fails when a
+case became slower or used more memory than the tolerances allow.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from .. import artifact_store, bias_detector, db_manager, explainability, mitigations, privacy
+from ..group_metrics import group_confusion_counts
+from ..model_registry import model_cache
+from ..prediction import prediction_cache
+from ..settings import BASE_DIR, get_setting
+
+DATASETS = {
+    "compas": {
+        "file": "compas.csv",
+        "label": "two_year_recid",
+        "sensitive": lambda df: df["race"],
+        "features": ["age", "juv_fel_count", "juv_misd_count", "juv_other_count", "priors_count",
+                     "days_b_screening_arrest", "decile_score"],
+    },
+    "german_credit": {
+        "file": "GermanCredit.csv",
+        "label": "credit_risk",
+        "sensitive": lambda df: df["personal_status_sex"].str.split(" : ").str[0],
+        "features": ["duration", "amount", "installment_rate", "present_residence", "age", "number_credits",
+                     "people_liable"],
+    },
+}
+SCALES = (1, 10, 100)
+# Functions that can fan out over a per-call process pool use every CPU here; the
+# server runs them in-process (n_jobs unset in metrics.yaml).
+N_JOBS = os.cpu_count() or 1
+API_KEY = {"x-api-key": "secret-token"}
+
+
+def base_dataset(name):
+    """
+    Feature columns of a bundled dataset with 'label', 'sensitive' (race or sex) and
+    'sensitive_age' (age band) columns.
+    """
+    spec = DATASETS[name]
+    raw = pd.read_csv(os.path.join(BASE_DIR, "config", "datasets", spec["file"]))
+    df = raw[spec["features"]].fillna(0).astype(float)
+    df["label"] = raw[spec["label"]].astype(int)
+    df["sensitive"] = spec["sensitive"](raw).astype(str)
+    df["sensitive_age"] = pd.cut(raw["age"], [0, 25, 45, np.inf], labels=["<25", "25-45", ">45"]).astype(str)
+    return df
+
+
+def scaled_dataset(base, scale, seed=0):
+    """
+    `scale` times the rows of `base` (fractions sample it): the first copy is the
+    original data and further copies jitter the features by 5% of their standard
+    deviation, so scaled datasets are not exact duplicates.
+    """
+    n_rows = max(1, int(round(len(base) * scale)))
+    index = np.arange(n_rows) % len(base)
+    df = base.iloc[index].reset_index(drop=True)
+    features = [col for col in base.columns if col != "label" and not col.startswith("sensitive")]
+    copies = np.arange(n_rows) >= len(base)
+    if copies.any():
+        rng = np.random.default_rng(seed)
+        noise = rng.normal(0, 0.05, size=(int(copies.sum()), len(features))) * base[features].std().to_numpy()
+        df.loc[copies, features] = df.loc[copies, features].to_numpy() + noise
+    return df
+
+
+def fit_model(base):
+    """
+    Logistic regression of the label on the features of the unscaled dataset.
+    """
+    import joblib
+    import io
+    from sklearn.linear_model import LogisticRegression
+
+    features = [col for col in base.columns if col != "label" and not col.startswith("sensitive")]
+    model = LogisticRegression(max_iter=1000).fit(base[features], base["label"])
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return model, buffer.getvalue()
+
+
+class Context:
+    """
+    The inputs shared by the cases of one (dataset, scale): the frame with the model's
+    predictions as the 'prediction' column, its CSV bytes and file, and the model.
+    """
+
+    def __init__(self, base, scale, model, model_bytes, directory):
+        self.df = scaled_dataset(base, scale)
+        self.model, self.model_bytes = model, model_bytes
+        self.features = list(model.feature_names_in_)
+        self.df["prediction"] = model.predict(self.df[self.features])
+        self.X = self.df[self.features].to_numpy(dtype=float)
+        self.csv = self.df.to_csv(index=False).encode()
+        self.csv_path = os.path.join(directory, "dataset.csv")
+        with open(self.csv_path, "wb") as f:
+            f.write(self.csv)
+        self.counts = group_confusion_counts(self.df["label"], self.df["prediction"], self.df["sensitive"])
+
+
+def function_cases():
+    """
+    (name, call) for every public function of the audited modules; `call` takes a Context.
+    """
+    counterfactual_rows = get_setting("explainability", "counterfactual", "max_rows", default=10000)
+    return [
+        ("bias_detector.analyze_dataset_bias", lambda c: bias_detector.analyze_dataset_bias(c.df)),
+        ("bias_detector.analyze_dataset_bias_streaming", lambda c: bias_detector.analyze_dataset_bias_streaming(c.csv_path)),
+        ("bias_detector.analyze_model_bias", lambda c: bias_detector.analyze_model_bias(c.model, c.df, n_jobs=N_JOBS)),
+        ("bias_detector.compute_fairness_metrics", lambda c: bias_detector.compute_fairness_metrics(c.df)),
+        ("bias_detector.fairness_report", lambda c: bias_detector.fairness_report(c.counts)),
+        ("bias_detector.confusion_report", lambda c: bias_detector.confusion_report(c.counts)),
+        ("bias_detector.model_report", lambda c: bias_detector.model_report(c.counts)),
+        ("bias_detector.compute_intersectional_fairness", lambda c: bias_detector.compute_intersectional_fairness(c.df)),
+        ("bias_detector.adversarial_debias", lambda c: bias_detector.adversarial_debias(c.df.copy(), "sensitive", "label")),
+        ("mitigations.mitigate_bias", lambda c: mitigations.mitigate_bias(c.df.copy(), output="csv")),
+        ("privacy.dp_defaults", lambda c: privacy.dp_defaults()),
+        ("privacy.compute_rdp_sgm", lambda c: privacy.compute_rdp_sgm(64 / len(c.df), 1.1)),
+        ("privacy.rdp_to_epsilon", lambda c: privacy.rdp_to_epsilon(privacy.compute_rdp_sgm(64 / len(c.df), 1.1)[0] * 10, 1e-5)),
+        ("privacy.compute_epsilon_grid", lambda c: privacy.compute_epsilon_grid(
+            [0.8, 1.1, 1.5], [32, 64, 128], [len(c.df)], [5, 10], 1e-5)),
+        ("privacy.evaluate_differential_privacy", lambda c: privacy.evaluate_differential_privacy(dataset_size=len(c.df))),
+        ("privacy.shadow_model_attack", lambda c: privacy.shadow_model_attack(c.model, c.df, n_jobs=N_JOBS)),
+        ("privacy.perform_privacy_tests", lambda c: privacy.perform_privacy_tests(c.model, c.df)),
+        ("explainability.summarize_background", lambda c: explainability.summarize_background(
+            c.df[c.features], get_setting("explainability", "shap", "sample_size", default=10))),
+        ("explainability.explain_shap_dataset", lambda c: explainability.explain_shap_dataset(c.model, c.df, n_jobs=N_JOBS)),
+        ("explainability.generate_shap_explanation", lambda c: explainability.generate_shap_explanation(c.model, c.df)),
+        ("explainability.explain_lime_dataset", lambda c: explainability.explain_lime_dataset(c.model, c.df, n_jobs=N_JOBS)),
+        ("explainability.generate_lime_explanation", lambda c: explainability.generate_lime_explanation(c.model, c.df)),
+        ("explainability.find_counterfactuals", lambda c: explainability.find_counterfactuals(
+            c.model, c.X[:counterfactual_rows], c.features)),
+        ("explainability.generate_counterfactuals", lambda c: explainability.generate_counterfactuals(c.model, c.df)),
+        ("explainability.generate_counterfactual_explanation", lambda c: explainability.generate_counterfactual_explanation(
+            c.model, c.X[0].tolist())),
+    ]
+
+
+def endpoint_cases(client):
+    """
+    (name, call) for the HTTP endpoints, posting the Context's CSV and pickled model.
+    """
+    def post(path, files, data=None):
+        def call(c):
+            response = client.post(path, files={key: make(c) for key, make in files.items()}, data=data, headers=API_KEY)
+            if response.status_code != 200:
+                return {"error": f"HTTP {response.status_code}: {response.text[:200]}"}
+            return response.json()
+        return f"POST {path}", call
+
+    csv = lambda c: ("data.csv", c.csv)
+    model = lambda c: ("model.joblib", c.model_bytes)
+    return [
+        post("/analyze/dataset", {"file": csv}),
+        post("/analyze/dataset/stream", {"file": csv}),
+        post("/analyze/model", {"file": model, "data": csv}),
+        post("/analyze/fairness", {"file": csv}),
+        post("/analyze/fairness/sweep", {"file": model, "data": csv}),
+        post("/analyze/intersectional", {"file": csv}),
+        post("/analyze/privacy", {"model": model, "train": csv}),
+        post("/explain/shap", {"file": model, "data": csv}),
+        post("/explain/lime", {"file": model, "data": csv}),
+        post("/explain/counterfactual", {"file": model, "data": csv}),
+        post("/mitigate", {"file": csv}, data={"output": "csv"}),
+        post("/audit", {"file": model, "data": csv}),
+    ]
+
+
+def _reset_caches():
+    # Every run starts cold, so repeated runs do not measure cache hits.
+    prediction_cache.clear()
+    model_cache.clear()
+    explainability._background_cache.clear()
+    privacy._epsilon.cache_clear()
+
+
+def measure(call, context, repeats=1):
+    """
+    Best wall time of `repeats` runs, then one more run under tracemalloc for the peak
+    memory allocated by this process (work done in worker processes is timed but its
+    memory is not traced). Returns (seconds, peak_mb, error).
+    """
+    seconds = []
+    result = None
+    for _ in range(repeats):
+        _reset_caches()
+        started = time.perf_counter()
+        result = call(context)
+        seconds.append(time.perf_counter() - started)
+    error = result.get("error") if isinstance(result, dict) else None
+    _reset_caches()
+    tracemalloc.start()
+    try:
+        call(context)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(seconds), peak / (1024 * 1024), error
+
+
+def run_suite(datasets=None, scales=SCALES, cases=None, repeats=1, endpoints=True, log=print):
+    """
+    Benchmark the selected cases (substrings of case names; all by default) on every
+    dataset and scale. Report storage and artifacts go to a temporary directory.
+    Returns the result rows.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        saved = db_manager.DATABASE, db_manager._writer, artifact_store._storage_dir
+        db_manager.DATABASE, db_manager._writer = os.path.join(tmp, "reports.db"), None
+        artifact_store._storage_dir = lambda: os.path.join(tmp, "artifacts")
+        try:
+            client = None
+            selected = function_cases()
+            if endpoints:
+                from fastapi.testclient import TestClient
+                from ..main import app
+                client = TestClient(app).__enter__()
+                selected += endpoint_cases(client)
+            if cases:
+                selected = [(name, call) for name, call in selected if any(pattern in name for pattern in cases)]
+            for dataset in datasets or list(DATASETS):
+                base = base_dataset(dataset)
+                model, model_bytes = fit_model(base)
+                for scale in scales:
+                    context = Context(base, scale, model, model_bytes, tmp)
+                    for name, call in selected:
+                        seconds, peak_mb, error = measure(call, context, repeats)
+                        rows.append({"dataset": dataset, "scale": scale, "rows": len(context.df), "case": name,
+                                     "seconds": seconds, "peak_mb": peak_mb,
+                                     "status": "error" if error else "ok", "error": error})
+                        log(f"{dataset:>13} x{scale:<5g} {name:<55} {seconds:9.3f}s {peak_mb:9.1f} MB"
+                            + (f"  ERROR {error}" if error else ""))
+            if client is not None:
+                client.__exit__(None, None, None)
+            db_manager.flush_reports()
+        finally:
+            db_manager.DATABASE, db_manager._writer, artifact_store._storage_dir = saved
+    return rows
+
+
+def compare(rows, baseline, time_tolerance=0.25, memory_tolerance=0.25, min_seconds=0.05, min_mb=1.0):
+    """
+    Regressions of `rows` against the rows of a baseline results file: cases more than
+    `time_tolerance` slower or `memory_tolerance` larger in peak memory. Cases faster
+    than `min_seconds` (or smaller than `min_mb`) in both runs are too noisy to compare.
+    """
+    previous = {(row["dataset"], row["scale"], row["case"]): row for row in baseline}
+    regressions = []
+    for row in rows:
+        before = previous.get((row["dataset"], row["scale"], row["case"]))
+        if before is None:
+            continue
+        for metric, tolerance, floor in (("seconds", time_tolerance, min_seconds), ("peak_mb", memory_tolerance, min_mb)):
+            if max(row[metric], before[metric]) < floor:
+                continue
+            if row[metric] > before[metric] * (1 + tolerance):
+                regressions.append({"dataset": row["dataset"], "scale": row["scale"], "case": row["case"], "metric": metric,
+                                    "baseline": before[metric], "current": row[metric],
+                                    "ratio": row[metric] / before[metric] if before[metric] else float("inf")})
+        if row["status"] == "error" and before["status"] == "ok":
+            regressions.append({"dataset": row["dataset"], "scale": row["scale"], "case": row["case"], "metric": "status",
+                                "baseline": "ok", "current": row["error"], "ratio": None})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS))
+    parser.add_argument("--scales", nargs="+", type=float, default=list(SCALES))
+    parser.add_argument("--cases", nargs="+", help="Only run cases whose name contains one of these")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--no-endpoints", action="store_true", help="Skip the HTTP endpoint cases")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    rows = run_suite(args.datasets, args.scales, args.cases, args.repeats, endpoints=not args.no_endpoints)
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": rows,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        results["regressions"] = compare(rows, baseline, args.time_tolerance, args.memory_tolerance)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}.")
+
+    for regression in results.get("regressions", []):
+        print(f"REGRESSION {regression['dataset']} x{regression['scale']:g} {regression['case']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+    return 1 if results.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
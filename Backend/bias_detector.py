@@ -1,29 +1,46 @@
+import io
 import pandas as pd
-from io import StringIO
 import numpy as np
-from sklearn.metrics import confusion_matrix, accuracy_score
-from fairlearn.metrics import MetricFrame
+from collections import Counter
+from .group_metrics import (
+    GroupCounts,
+    bootstrap_intervals,
+    group_confusion_counts,
+    intersection_counts,
+    rollup_lattice,
+    summarize_group_counts
+)
+from .ingestion import as_frame, content_hash, feature_columns, iter_csv_chunks, DATASET_COLUMNS, FAIRNESS_COLUMNS, INTERSECTIONAL_COLUMNS, SENSITIVE_PREFIX
+from .model_registry import as_model, register_model, model_hash as hash_model_bytes
+from .prediction import cached_predictions
+from .adversarial import train_adversarial_debiasing
+from .reweighing import group_codes, sensitive_columns
+from .settings import get_setting
 
-def analyze_dataset_bias(content: bytes):
+def analyze_dataset_bias(data):
     """
     Analyze a CSV dataset for class imbalances.
-    Expects a CSV file with a 'label' column.
+    Expects CSV bytes or a parsed DataFrame with a 'label' column.
     Returns class counts, imbalance ratios, and a fairness score.
     """
     try:
-        data_str = content.decode("utf-8")
-        df = pd.read_csv(StringIO(data_str))
+        df = as_frame(data, columns=DATASET_COLUMNS)
     except Exception as e:
-        return {"error": f"Failed to parse CSV: {str(e)}"}
+        return {"error": str(e)}
     
     if 'label' not in df.columns:
         return {"error": "Dataset must include a 'label' column."}
     
     counts = df['label'].value_counts().to_dict()
+    return _class_balance(counts, df.shape[0])
+
+def _class_balance(counts: dict, total: int):
+    """
+    Derive imbalance ratios and the fairness score from merged class counts.
+    """
     max_count = max(counts.values())
     imbalance = {cls: max_count / count for cls, count in counts.items()}
     
-    total = df.shape[0]
     proportions = np.array([count / total for count in counts.values()])
     fairness_score = 1 - np.std(proportions)
     
@@ -33,24 +50,101 @@ def analyze_dataset_bias(content: bytes):
         "fairness_score": fairness_score
     }
 
-def analyze_model_bias(content: bytes):
+def analyze_dataset_bias_streaming(source, chunksize=None, include_groups=True):
     """
-    Analyze a serialized model for bias.
-    For demonstration, this function loads a pickled scikit-learn model,
-    runs it on the Iris dataset, and computes a confusion matrix.
+    Streaming variant of analyze_dataset_bias for datasets larger than memory.
+    `source` may be CSV bytes, a binary file object or a server-side path.
+    The CSV is read in chunks of `chunksize` rows (ingestion.chunk_size in metrics.yaml
+    by default) and only mergeable per-chunk counts are kept, so memory is bounded
+    by the chunk size rather than the file size. When `include_groups` is set and a
+    'sensitive' column exists, per-group label counts are computed in the same pass.
     """
-    import joblib
-    import io
-    from sklearn.datasets import load_iris
-    from sklearn.model_selection import train_test_split
+    class_counts = Counter()
+    group_counts = {}
+    total = 0
+    try:
+        for chunk in iter_csv_chunks(source, ['label', 'sensitive'], chunksize=chunksize):
+            if 'label' not in chunk.columns:
+                return {"error": "Dataset must include a 'label' column."}
+            total += len(chunk)
+            for cls, count in chunk['label'].value_counts().items():
+                class_counts[cls] += count
+            if include_groups and 'sensitive' in chunk.columns:
+                pairs = chunk[['sensitive', 'label']].value_counts()
+                for (group, cls), count in pairs.items():
+                    group_counts.setdefault(group, Counter())[cls] += count
+    except Exception as e:
+        return {"error": f"Failed to parse CSV: {str(e)}"}
     
+    if not class_counts:
+        return {"error": "Dataset contains no labelled rows."}
+    
+    result = _class_balance({cls: int(count) for cls, count in class_counts.most_common()}, total)
+    if group_counts:
+        result["group_counts"] = {
+            group: {cls: int(count) for cls, count in counts.most_common()}
+            for group, counts in group_counts.items()
+        }
+    return result
+
+def analyze_model_bias(model, data=None, model_hash=None, dataset_hash=None, chunk_size=None, n_jobs=None):
+    """
+    Evaluate a model on a labelled dataset.
+    Expects a pickled model file (or a loaded model from the registry) and CSV bytes
+    or a parsed DataFrame with a 'label' column and optional sensitive columns.
+    Predictions run in chunks across worker processes (model_evaluation in metrics.yaml)
+    and are cached by (model hash, dataset hash), so re-evaluating the same model on the
+    same data skips prediction. Returns the confusion matrix, per-class accuracy and
+    per-group metrics over the intersections of the sensitive columns.
+    Without `data` the model is evaluated on the Iris dataset for demonstration.
+    """
+    if isinstance(model, (bytes, bytearray)):
+        model_hash = model_hash or hash_model_bytes(bytes(model))
     try:
-        # Use BytesIO to load the model from bytes
-        bytes_buffer = io.BytesIO(content)
-        model = joblib.load(bytes_buffer)
+        model = as_model(model)
     except Exception as e:
         return {"error": f"Failed to load model: {str(e)}"}
     
+    if data is None:
+        return _analyze_model_on_iris(model)
+    if isinstance(data, (bytes, bytearray)):
+        dataset_hash = dataset_hash or content_hash(bytes(data))
+    try:
+        df = as_frame(data)
+    except Exception as e:
+        return {"error": str(e)}
+    if 'label' not in df.columns:
+        return {"error": "Evaluation dataset must include a 'label' column."}
+    features = feature_columns(df, model)
+    if not features:
+        return {"error": "Evaluation dataset has no feature columns."}
+    
+    try:
+        predictions, cached = cached_predictions(model, df[features], model_hash=model_hash, dataset_hash=dataset_hash,
+                                                 chunk_size=chunk_size, n_jobs=n_jobs)
+    except Exception as e:
+        return {"error": f"Failed to run model predictions: {str(e)}"}
+    columns = sensitive_columns(df)
+    codes, labels = group_codes(df, columns)
+    group_counts = group_confusion_counts(df['label'], predictions, pd.Categorical.from_codes(codes, labels))
+    if group_counts.counts.sum() == 0:
+        return {"error": "No labelled rows to evaluate."}
+    
+    return {
+        "rows": len(df),
+        "predictions_cached": cached,
+        "sensitive_columns": columns,
+        **model_report(group_counts)
+    }
+
+def _analyze_model_on_iris(model):
+    """
+    Confusion matrix of `model` on an Iris test split (the demonstration fallback).
+    """
+    from sklearn.datasets import load_iris
+    from sklearn.metrics import confusion_matrix
+    from sklearn.model_selection import train_test_split
+    
     iris = load_iris()
     X_train, X_test, y_train, y_test = train_test_split(
         iris.data, iris.target, test_size=0.3, random_state=42
@@ -70,49 +164,112 @@ def analyze_model_bias(content: bytes):
         "per_class_accuracy": per_class_accuracy
     }
 
-def compute_fairness_metrics(content: bytes):
+def compute_fairness_metrics(data):
     """
-    Compute fairness metrics using fairlearn's MetricFrame.
-    Expects a CSV with columns 'label', 'prediction', and 'sensitive'.
+    Compute group fairness metrics from a single (group x label x prediction) count tensor.
+    Expects CSV bytes or a parsed DataFrame with columns 'label', 'prediction', and 'sensitive'.
+    Selection rate, TPR, FPR and accuracy per group, the demographic parity and
+    equalized-odds gaps, and pass/fail checks against the metrics.yaml thresholds
+    are all derived from the same counts.
     """
-    from fairlearn.metrics import MetricFrame
-    from sklearn.metrics import accuracy_score  # Updated: import accuracy_score from sklearn.metrics
     try:
-        data_str = content.decode("utf-8")
-        df = pd.read_csv(StringIO(data_str))
+        df = as_frame(data, columns=FAIRNESS_COLUMNS)
     except Exception as e:
-        return {"error": f"Failed to parse CSV: {str(e)}"}
+        return {"error": str(e)}
     
     required = ['label', 'prediction', 'sensitive']
     if not all(col in df.columns for col in required):
         return {"error": f"CSV must include columns: {required}"}
     
-    mf = MetricFrame(metrics=accuracy_score,
-                     y_true=df['label'],
-                     y_pred=df['prediction'],
-                     sensitive_features=df['sensitive'])
+    group_counts = group_confusion_counts(df['label'], df['prediction'], df['sensitive'])
+    return fairness_report(group_counts)
+
+def fairness_report(group_counts: GroupCounts, bootstrap=None):
+    """
+    Fairness metrics from an already computed (group x label x prediction) count tensor.
+    Shared by compute_fairness_metrics, the audit pipeline and the drift monitor.
+    Bootstrap confidence intervals for the rates and gaps are added under
+    'confidence_intervals' when `bootstrap` is set (fairness_metrics.bootstrap.enabled
+    by default).
+    """
+    if group_counts.counts.sum() == 0:
+        return {"error": "No rows with a label, prediction and sensitive value to evaluate."}
+    summary = summarize_group_counts(group_counts)
     
-    group_accuracies = mf.by_group.to_dict()
-    overall_accuracy = mf.overall
-    fairness_gap = max(group_accuracies.values()) - min(group_accuracies.values())
+    group_accuracies = {group: metrics["accuracy"] for group, metrics in summary["group_metrics"].items()}
+    overall_accuracy = summary["overall"]["accuracy"]
+    fairness_gap = summary["gaps"]["accuracy_gap"]
     
-    return {
+    result = {
         "group_accuracies": group_accuracies,
         "overall_accuracy": overall_accuracy,
-        "fairness_gap": fairness_gap
+        "fairness_gap": fairness_gap,
+        **summary
+    }
+    if bootstrap is None:
+        bootstrap = get_setting("fairness_metrics", "bootstrap", "enabled", default=True)
+    if bootstrap:
+        intervals = bootstrap_intervals(group_counts)
+        result["confidence_intervals"] = intervals
+        result["fairness_gap_interval"] = intervals["gaps"]["accuracy_gap"]
+    return result
+
+def confusion_report(group_counts: GroupCounts):
+    """
+    Overall confusion matrix and per-class accuracy, summed over the groups of a count tensor.
+    """
+    cm = group_counts.counts.sum(axis=0)
+    totals = cm.sum(axis=1)
+    per_class_accuracy = {
+        f"class_{cls}": float(cm[i, i] / totals[i]) if totals[i] > 0 else 0
+        for i, cls in enumerate(group_counts.classes)
+    }
+    return {
+        "classes": [str(cls) for cls in group_counts.classes],
+        "confusion_matrix": cm.tolist(),
+        "per_class_accuracy": per_class_accuracy
+    }
+
+def model_report(group_counts: GroupCounts):
+    """
+    Model evaluation from a count tensor: the overall confusion matrix and per-class
+    accuracy plus the per-group metrics and gaps.
+    """
+    summary = summarize_group_counts(group_counts)
+    return {
+        **confusion_report(group_counts),
+        "overall": summary["overall"],
+        "group_metrics": summary["group_metrics"],
+        "gaps": summary["gaps"]
     }
 
-def compute_intersectional_fairness(content: bytes):
+def intersectional_column_error(sensitive_cols):
+    """
+    Error message when there are more sensitive columns than
+    fairness_metrics.intersectional.max_columns, since the lattice has 2^k - 1 subsets.
+    """
+    max_columns = get_setting("fairness_metrics", "intersectional", "max_columns", default=8)
+    if max_columns and len(sensitive_cols) > max_columns:
+        return (f"Too many sensitive columns for intersectional analysis ({len(sensitive_cols)}); "
+                f"at most {max_columns} are allowed.")
+    return None
+
+def compute_intersectional_fairness(data, min_support=None):
     """
     Computes fairness metrics across intersections of multiple sensitive features.
-    Expects a CSV with columns 'label', 'prediction' and multiple sensitive columns.
+    Expects CSV bytes or a parsed DataFrame with columns 'label', 'prediction' and
+    multiple sensitive columns.
     Sensitive attribute columns should be prefixed with 'sensitive_'.
+    Groups are keyed by mixed-radix integer codes and counted in one pass; metrics
+    are then reported for every subset of the sensitive columns (the rollup lattice),
+    skipping subgroups with fewer than `min_support` rows
+    (fairness_metrics.intersectional.min_support in metrics.yaml by default).
+    At most fairness_metrics.intersectional.max_columns sensitive columns are accepted.
     """
     try:
-        data_str = content.decode("utf-8")
-        df = pd.read_csv(StringIO(data_str))
+        df = as_frame(data, columns=INTERSECTIONAL_COLUMNS, prefixes=[f"{SENSITIVE_PREFIX}_"])
     except Exception as e:
-        return {"error": f"Failed to parse CSV: {str(e)}"}
+        return {"error": str(e)}
     
     if 'label' not in df.columns or 'prediction' not in df.columns:
         return {"error": "CSV must include 'label' and 'prediction' columns."}
@@ -120,31 +277,91 @@ def compute_intersectional_fairness(content: bytes):
     sensitive_cols = [col for col in df.columns if col.startswith("sensitive_")]
     if not sensitive_cols:
         return {"error": "No sensitive columns found. Please prefix sensitive attribute columns with 'sensitive_'."}
+    error = intersectional_column_error(sensitive_cols)
+    if error:
+        return {"error": error}
     
-    df['intersection'] = df[sensitive_cols].astype(str).agg('-'.join, axis=1)
+    if min_support is None:
+        min_support = get_setting("fairness_metrics", "intersectional", "min_support", default=1)
     
-    mf = MetricFrame(metrics=accuracy_score,
-                     y_true=df['label'],
-                     y_pred=df['prediction'],
-                     sensitive_features=df['intersection'])
+    try:
+        combo_codes, counts, values, classes = intersection_counts(df['label'], df['prediction'], df[sensitive_cols])
+    except ValueError as e:
+        return {"error": str(e)}
+    if counts.sum() == 0:
+        return {"error": "No rows with a label, prediction and sensitive values to evaluate."}
+    
+    lattice = {}
+    for subset, codes, subset_counts, n_pruned in rollup_lattice(combo_codes, counts, min_support):
+        columns = [sensitive_cols[j] for j in subset]
+        labels = ['-'.join(str(values[j][code]) for j, code in zip(subset, row)) for row in codes]
+        summary = summarize_group_counts(GroupCounts(subset_counts, labels, classes))
+        lattice['+'.join(columns)] = {
+            "columns": columns,
+            "group_metrics": summary["group_metrics"],
+            "gaps": summary["gaps"],
+            "threshold_checks": summary["threshold_checks"],
+            "pruned_groups": n_pruned
+        }
     
-    group_accuracies = mf.by_group.to_dict()
-    overall_accuracy = mf.overall
-    fairness_gap = max(group_accuracies.values()) - min(group_accuracies.values())
+    full = lattice['+'.join(sensitive_cols)]
+    group_accuracies = {group: metrics["accuracy"] for group, metrics in full["group_metrics"].items()}
+    total = counts.sum(axis=0)
+    overall_accuracy = float(np.trace(total) / total.sum())
+    fairness_gap = full["gaps"]["accuracy_gap"]
     
     return {
         "intersectional_group_accuracies": group_accuracies,
         "overall_accuracy": overall_accuracy,
-        "intersectional_fairness_gap": fairness_gap
+        "intersectional_fairness_gap": fairness_gap,
+        "min_support": min_support,
+        "lattice": lattice
     }
 
-def adversarial_debias(df, sensitive_attr, target_attr):
+def adversarial_debias(df, sensitive_attr, target_attr, register=False, **params):
     """
-    A placeholder for adversarial debiasing implementation.
-    In a real-world scenario, this would involve training an adversary to remove bias.
-    Here, we simulate by reweighting the dataset based on group frequencies.
+    Train an adversarially debiased classifier for `target_attr` whose predictions
+    carry as little information about `sensitive_attr` (a column, or a list of columns
+    whose intersections form the groups) as possible. Numeric feature columns are used
+    as inputs, and training parameters default to mitigation.adversarial_debiasing.
+
+    Adds the debiased 'adversarial_prediction' and 'adversarial_score' (probability of
+    the positive label) columns to `df` in place. Returns (df, report) where the report
+    holds the per-epoch history and, with register=True, the model_id of the trained
+    model in the model registry.
     """
-    group_counts = df.groupby(sensitive_attr)[target_attr].count()
-    max_count = group_counts.max()
-    df['adversarial_weight'] = df[sensitive_attr].apply(lambda x: max_count / group_counts[x])
-    return df
+    columns = [sensitive_attr] if isinstance(sensitive_attr, str) else list(sensitive_attr)
+    excluded = set(columns) | {target_attr, "sample_weight", "adversarial_prediction", "adversarial_score"}
+    features = [col for col in feature_columns(df)
+                if col not in excluded and pd.api.types.is_numeric_dtype(df[col])]
+    if not features:
+        return df, {"error": "Adversarial debiasing requires at least one numeric feature column."}
+
+    codes, labels = group_codes(df, columns)
+    groups = pd.Categorical.from_codes(codes, labels)
+    try:
+        model = train_adversarial_debiasing(df[features], df[target_attr].to_numpy(), groups, **params)
+    except ValueError as e:
+        return df, {"error": str(e)}
+
+    df['adversarial_score'] = model.predict_proba(df[features])[:, 1]
+    df['adversarial_prediction'] = model.predict(df[features])
+    best = model.history_[model.best_epoch_ - 1]
+    report = {
+        "features": features,
+        "sensitive_columns": columns,
+        "fairness": model.fairness,
+        "epochs_run": model.n_epochs_,
+        "best_epoch": model.best_epoch_,
+        "training_seconds": sum(epoch["seconds"] for epoch in model.history_),
+        "validation_accuracy": best["validation_accuracy"],
+        "demographic_parity_difference": best["demographic_parity_difference"],
+        "equal_opportunity_difference": best["equal_opportunity_difference"],
+        "history": model.history_
+    }
+    if register:
+        import joblib
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        report["model_id"] = register_model(buffer.getvalue())["model_id"]
+    return df, report
@@ -0,0 +1,60 @@
+import zlib
+from .settings import get_setting
+
+
+class RequestTooLarge(ValueError):
+    pass
+
+
+class GzipRequestMiddleware:
+    """
+    ASGI middleware accepting gzip-compressed request bodies (Content-Encoding: gzip).
+    The body is inflated chunk by chunk as the application reads it, so a compressed
+    upload is never held in memory in full; the Content-Encoding and Content-Length
+    headers are removed from the request the application sees. Bodies inflating past
+    ingestion.max_decompressed_mb, or that are not valid gzip, fail while the request
+    is parsed and surface as 400 responses.
+    """
+
+    def __init__(self, app, max_bytes=None):
+        self.app = app
+        if max_bytes is None:
+            max_bytes = int(get_setting("ingestion", "max_decompressed_mb", default=1024)) * 1024 * 1024
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = next((value for name, value in scope["headers"] if name == b"content-encoding"), None)
+        if encoding is None or encoding.strip().lower() != b"gzip":
+            await self.app(scope, receive, send)
+            return
+
+        headers = [(name, value) for name, value in scope["headers"] if name not in (b"content-encoding", b"content-length")]
+        inflater = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        inflated = 0
+
+        async def receive_inflated():
+            nonlocal inflated
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            try:
+                # Inflate at most one byte past the limit, so a single small message
+                # cannot expand in memory before the size check.
+                body = inflater.decompress(message.get("body", b""), max_length=self.max_bytes - inflated + 1)
+                if inflater.unconsumed_tail:
+                    raise RequestTooLarge(f"Decompressed request body exceeds {self.max_bytes} bytes.")
+                if not message.get("more_body", False):
+                    body += inflater.flush()
+            except zlib.error as e:
+                raise ValueError(f"Invalid gzip request body: {str(e)}") from e
+            inflated += len(body)
+            if inflated > self.max_bytes:
+                raise RequestTooLarge(f"Decompressed request body exceeds {self.max_bytes} bytes.")
+            return dict(message, body=body)
+
+        # Updated in place so outer middleware still sees the route the router records in the scope.
+        scope["headers"] = headers
+        await self.app(scope, receive_inflated, send)
@@ -1,29 +1,200 @@
+import os
+import json
+import time
+import zlib
+import queue
+import atexit
+import logging
 import sqlite3
+import threading
+import numpy as np
+from .instrumentation import span
+from .settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+DATABASE = get_setting("storage", "database", default="reports.db")
+
+# Payload encodings stored in the 'encoding' column.
+JSON_ENCODING = "json"
+COMPRESSED_ENCODING = "json+zlib"
+
+_local = threading.local()
 
-DATABASE = "reports.db"
 
 def get_connection():
-    conn = sqlite3.connect(DATABASE)
+    """
+    Return this thread's connection, opening it (and creating the schema) on first use.
+    Connections are never shared between threads or inherited across a fork.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.key != (os.getpid(), DATABASE):
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        # WAL lets readers proceed while a batch is being written.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        create_table(conn)
+        _local.conn, _local.key = conn, (os.getpid(), DATABASE)
     return conn
 
-def create_table():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reports (
+
+def create_table(conn=None):
+    conn = conn or get_connection()
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS audit_reports (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            report TEXT NOT NULL
-        )
+            report_type TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            dataset_hash TEXT,
+            model_hash TEXT,
+            encoding TEXT NOT NULL,
+            payload BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_audit_reports_type_time ON audit_reports (report_type, created_at);
+        CREATE INDEX IF NOT EXISTS idx_audit_reports_dataset ON audit_reports (dataset_hash);
+        CREATE INDEX IF NOT EXISTS idx_audit_reports_model ON audit_reports (model_hash);
     ''')
     conn.commit()
-    conn.close()
 
-def store_report(report_data):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO reports (report) VALUES (?)', (str(report_data),))
-    conn.commit()
-    conn.close()
 
-# Ensures the reports table exists when the module is imported.
-create_table()
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_payload(report_data):
+    """
+    Serialize a report to JSON, compressing it when it is larger than
+    storage.compress_threshold_bytes. Returns (encoding, payload bytes).
+    """
+    payload = json.dumps(report_data, default=_json_default).encode("utf-8")
+    threshold = get_setting("storage", "compress_threshold_bytes", default=4096)
+    if threshold is not None and len(payload) > threshold:
+        return COMPRESSED_ENCODING, zlib.compress(payload, 6)
+    return JSON_ENCODING, payload
+
+
+def decode_payload(encoding, payload):
+    if encoding == COMPRESSED_ENCODING:
+        payload = zlib.decompress(payload)
+    return json.loads(payload)
+
+
+class ReportWriter:
+    """
+    Background thread that drains queued reports and inserts them in batches,
+    one transaction per batch, instead of committing every report on its own.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=0.05, max_queued=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name="report-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row):
+        # Blocks when the queue is full, which throttles producers to the write rate.
+        self._queue.put(row)
+
+    def flush(self):
+        """
+        Wait until every report queued so far has been written.
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                conn = get_connection()
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO audit_reports (report_type, created_at, dataset_hash, model_hash, encoding, payload) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', batch)
+            except sqlite3.Error as e:
+                logger.error("Failed to write %d reports: %s", len(batch), str(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Return the process-wide report writer, starting its thread on first use.
+    """
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            config = get_setting("storage", default={}) or {}
+            _writer = ReportWriter(
+                batch_size=int(config.get("batch_size", 500)),
+                flush_interval=float(config.get("flush_interval", 0.05)),
+                max_queued=int(config.get("queue_size", 10000))
+            )
+            _writer_pid = os.getpid()
+        return _writer
+
+
+def store_report(report_data, report_type="mitigation", dataset_hash=None, model_hash=None, wait=False):
+    """
+    Queue a report for storage. The payload is encoded on the calling thread and
+    inserted by the background writer; pass wait=True to block until it is written.
+    """
+    with span("store"):
+        encoding, payload = encode_payload(report_data)
+        writer = get_writer()
+        writer.put((report_type, time.time(), dataset_hash, model_hash, encoding, sqlite3.Binary(payload)))
+        if wait:
+            writer.flush()
+
+
+def flush_reports():
+    """
+    Block until all queued reports have been written.
+    """
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.flush()
+
+
+def fetch_reports(report_type=None, dataset_hash=None, model_hash=None, limit=100):
+    """
+    Return the most recent reports, newest first, optionally filtered by type and hashes.
+    """
+    clauses, params = [], []
+    for column, value in (("report_type", report_type), ("dataset_hash", dataset_hash), ("model_hash", model_hash)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = get_connection().execute(
+        f'SELECT id, report_type, created_at, dataset_hash, model_hash, encoding, payload '
+        f'FROM audit_reports {where} ORDER BY id DESC LIMIT ?', (*params, limit)).fetchall()
+    return [{
+        "id": row[0],
+        "report_type": row[1],
+        "created_at": row[2],
+        "dataset_hash": row[3],
+        "model_hash": row[4],
+        "report": decode_payload(row[5], row[6])
+    } for row in rows]
+
+
+# Write out anything still queued when the process exits normally.
+atexit.register(flush_reports)
@@ -0,0 +1,351 @@
+import os
+import re
+import json
+import math
+import time
+import tempfile
+import bisect
+import threading
+from collections import Counter, deque
+from datetime import datetime
+import numpy as np
+from .bias_detector import fairness_report
+from .group_metrics import GroupCounts
+from .settings import BASE_DIR, get_setting
+
+STREAM_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+SNAPSHOT_VERSION = 1
+
+
+def _monitor_settings():
+    config = get_setting("drift_monitor", default={}) or {}
+    return {
+        "window_seconds": float(config.get("window_seconds", 3600)),
+        "bucket_seconds": float(config.get("bucket_seconds", 60)),
+        "tumbling_seconds": float(config.get("tumbling_seconds", 3600)),
+        "min_events": int(config.get("min_events", 100)),
+        "max_alerts": int(config.get("max_alerts", 1000)),
+        "snapshot_interval": float(config.get("snapshot_interval", 30)),
+    }
+
+
+def _snapshot_dir():
+    return os.path.join(BASE_DIR, get_setting("drift_monitor", "snapshot_dir", default="monitor_snapshots"))
+
+
+def parse_timestamp(value):
+    """
+    Event time in epoch seconds from a number or an ISO 8601 string; now when missing.
+    Raises ValueError for NaN and infinite numbers, which json.loads accepts.
+    """
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            raise ValueError(f"Timestamp must be finite, got {value}.")
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _class_value(value):
+    """
+    String form of an event value, so 1, 1.0 and true all name the same class.
+    Booleans become "1"/"0" and whole-number floats their integer form.
+    """
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def parse_events(lines):
+    """
+    Parse NDJSON lines into (timestamp, (group, label, prediction)) events.
+    Values are kept as normalized strings so the keys survive a JSON snapshot unchanged.
+    Returns (events, rejected) where rejected lists the line number and reason of bad lines.
+    """
+    events, rejected = [], []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            key = tuple(_class_value(record[field]) for field in ("sensitive", "label", "prediction"))
+            events.append((parse_timestamp(record.get("timestamp")), key))
+        except (ValueError, TypeError, KeyError) as e:
+            rejected.append({"line": number, "error": f"{type(e).__name__}: {e}"})
+    return events, rejected
+
+
+def counts_to_group_counts(counts: Counter):
+    """
+    Turn {(group, label, prediction): count} into a GroupCounts tensor.
+    """
+    groups = sorted({g for g, _, _ in counts})
+    classes = sorted({l for _, l, _ in counts} | {p for _, _, p in counts})
+    g_index = {g: i for i, g in enumerate(groups)}
+    c_index = {c: i for i, c in enumerate(classes)}
+    tensor = np.zeros((len(groups), len(classes), len(classes)), dtype=np.int64)
+    for (g, l, p), n in counts.items():
+        tensor[g_index[g], c_index[l], c_index[p]] += n
+    return GroupCounts(tensor, groups, classes)
+
+
+def _subtract(total: Counter, counts: Counter):
+    for key, n in counts.items():
+        remaining = total[key] - n
+        if remaining:
+            total[key] = remaining
+        else:
+            del total[key]
+
+
+class FairnessMonitor:
+    """
+    Per-group confusion counters over a stream of (label, prediction, sensitive, timestamp)
+    events, in a sliding window and in tumbling windows of event time.
+
+    The sliding window is a ring of time buckets plus a running total: an event adds to
+    its bucket and to the total, and a bucket is subtracted from the total once when it
+    falls out of the window. Bucket indices are kept in ascending order, so expiry only
+    pops from the left and each update is O(1) amortized. Events older than the
+    window (or than the open tumbling window) are counted as late and dropped.
+    The window is evaluated after each batch and each tumbling window when it closes,
+    with the metrics.yaml thresholds raising alerts.
+    """
+
+    def __init__(self, name, window_seconds=3600, bucket_seconds=60, tumbling_seconds=3600,
+                 min_events=100, max_alerts=1000):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.tumbling_seconds = tumbling_seconds
+        self.min_events = min_events
+        self.n_buckets = max(1, int(np.ceil(window_seconds / bucket_seconds)))
+        self.buckets = {}
+        self.order = deque()
+        self.sliding = Counter()
+        self.tumbling = Counter()
+        self.tumbling_index = None
+        self.last_window = None
+        self.watermark = None
+        self.alerts = deque(maxlen=max_alerts)
+        self.failing = set()
+        self.raised = []
+        self.totals = Counter()
+        self.lock = threading.Lock()
+
+    def _expire(self):
+        oldest = int(self.watermark // self.bucket_seconds) - self.n_buckets + 1
+        while self.order and self.order[0] < oldest:
+            _subtract(self.sliding, self.buckets.pop(self.order.popleft()))
+
+    def _bucket(self, index):
+        counts = self.buckets.get(index)
+        if counts is None:
+            counts = self.buckets[index] = Counter()
+            if not self.order or index > self.order[-1]:
+                self.order.append(index)
+            else:
+                # A late event still inside the window opens a bucket behind the newest one.
+                self.order.insert(bisect.bisect(self.order, index), index)
+        return counts
+
+    def _close_tumbling(self):
+        start = self.tumbling_index * self.tumbling_seconds
+        report = self._evaluate(self.tumbling, "tumbling", start, start + self.tumbling_seconds)
+        self.last_window = report
+        self.tumbling = Counter()
+        return report
+
+    def add(self, timestamp, key):
+        """
+        Count one event in the sliding and tumbling windows.
+        """
+        self.totals["events"] += 1
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+            self._expire()
+        index = int(timestamp // self.bucket_seconds)
+        if index <= int(self.watermark // self.bucket_seconds) - self.n_buckets:
+            self.totals["late"] += 1
+        else:
+            self._bucket(index)[key] += 1
+            self.sliding[key] += 1
+
+        window = int(timestamp // self.tumbling_seconds)
+        if self.tumbling_index is None:
+            self.tumbling_index = window
+        if window > self.tumbling_index:
+            if self.tumbling:
+                self._close_tumbling()
+            self.tumbling_index = window
+        if window == self.tumbling_index:
+            self.tumbling[key] += 1
+        else:
+            self.totals["late_tumbling"] += 1
+
+    def _evaluate(self, counts, window, start, end, alert=True):
+        """
+        Fairness report of one window. With `alert`, every failing threshold check raises
+        an alert; a sliding-window check alerts again only after it has recovered.
+        """
+        n = sum(counts.values())
+        report = {"window": window, "start": start, "end": end, "events": n}
+        if n < self.min_events:
+            report["status"] = "insufficient_data"
+            return report
+        report.update(fairness_report(counts_to_group_counts(counts), bootstrap=False))
+        failed = {check: outcome for check, outcome in report["threshold_checks"].items() if outcome["passed"] is False}
+        report["status"] = "alert" if failed else "ok"
+        if not alert:
+            return report
+        for check, outcome in failed.items():
+            if (window, check) not in self.failing:
+                entry = {"window": window, "check": check, "metric": outcome["metric"], "value": outcome["value"],
+                         "threshold": outcome["threshold"], "start": start, "end": end, "raised_at": time.time()}
+                self.alerts.append(entry)
+                self.raised.append(entry)
+        if window == "sliding":
+            self.failing = {state for state in self.failing if state[0] != window} | {(window, check) for check in failed}
+        return report
+
+    def ingest(self, events):
+        """
+        Add a batch of parsed events and evaluate the sliding window.
+        Returns the number of events accepted and the alerts raised by this batch.
+        """
+        with self.lock:
+            self.raised = []
+            late = self.totals["late"]
+            for timestamp, key in events:
+                self.add(timestamp, key)
+            if self.watermark is not None:
+                self._evaluate(self.sliding, "sliding", self.watermark - self.window_seconds, self.watermark)
+            return {"accepted": len(events), "late": self.totals["late"] - late, "alerts": self.raised}
+
+    def status(self):
+        """
+        Current sliding-window metrics, the open and last closed tumbling windows, and recent alerts.
+        """
+        with self.lock:
+            if self.watermark is None:
+                return {"stream": self.name, "events": 0, "alerts": []}
+            tumbling_start = self.tumbling_index * self.tumbling_seconds
+            sliding = self._evaluate(self.sliding, "sliding", self.watermark - self.window_seconds, self.watermark, alert=False)
+            current = self._evaluate(self.tumbling, "tumbling", tumbling_start, tumbling_start + self.tumbling_seconds, alert=False)
+            return {
+                "stream": self.name,
+                "events": self.totals["events"],
+                "late_events": self.totals["late"],
+                "watermark": self.watermark,
+                "sliding": sliding,
+                "tumbling": {"current": current, "last_completed": self.last_window},
+                "alerts": list(self.alerts),
+            }
+
+    def to_state(self):
+        with self.lock:
+            return {
+                "version": SNAPSHOT_VERSION,
+                "name": self.name,
+                "watermark": self.watermark,
+                "buckets": [[index, [[*key, n] for key, n in counts.items()]] for index, counts in self.buckets.items()],
+                "tumbling_index": self.tumbling_index,
+                "tumbling": [[*key, n] for key, n in self.tumbling.items()],
+                "last_window": self.last_window,
+                "alerts": list(self.alerts),
+                "failing": [list(state) for state in self.failing],
+                "totals": dict(self.totals),
+            }
+
+    def load_state(self, state):
+        """
+        Restore the window state written by to_state; the sliding total is rebuilt from the buckets.
+        A non-finite watermark (from a snapshot written before such timestamps were rejected)
+        is ignored and re-established by the next event.
+        """
+        with self.lock:
+            watermark = state["watermark"]
+            self.watermark = watermark if watermark is not None and math.isfinite(watermark) else None
+            self.buckets = {int(index): Counter({tuple(row[:3]): row[3] for row in rows}) for index, rows in state["buckets"]}
+            self.order = deque(sorted(self.buckets))
+            self.sliding = Counter()
+            for counts in self.buckets.values():
+                self.sliding.update(counts)
+            self.tumbling_index = state["tumbling_index"]
+            self.tumbling = Counter({tuple(row[:3]): row[3] for row in state["tumbling"]})
+            self.last_window = state["last_window"]
+            self.alerts.extend(state["alerts"])
+            self.failing = {tuple(item) for item in state["failing"]}
+            self.totals = Counter(state["totals"])
+            if self.watermark is not None:
+                self._expire()
+
+
+class MonitorRegistry:
+    """
+    Named monitors, created on first use and restored from their last snapshot.
+    Snapshots are written atomically at most every drift_monitor.snapshot_interval
+    seconds per stream (and on shutdown), so window state survives restarts.
+    """
+
+    def __init__(self, directory=None, settings=None):
+        self.directory = directory or _snapshot_dir()
+        self.settings = settings or _monitor_settings()
+        self.monitors = {}
+        self.last_snapshot = {}
+        self.lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, name, create=True):
+        """
+        Return the monitor for a stream. Raises ValueError for invalid names and
+        KeyError for unknown streams when create is False.
+        """
+        if not STREAM_NAME.match(name):
+            raise ValueError("Stream names may only contain letters, digits, '_' and '-' (at most 64).")
+        with self.lock:
+            monitor = self.monitors.get(name)
+            if monitor is not None:
+                return monitor
+            path = self._path(name)
+            if not create and not os.path.exists(path):
+                raise KeyError(name)
+            settings = {key: value for key, value in self.settings.items() if key != "snapshot_interval"}
+            monitor = FairnessMonitor(name, **settings)
+            if os.path.exists(path):
+                with open(path) as f:
+                    monitor.load_state(json.load(f))
+            self.monitors[name] = monitor
+            self.last_snapshot[name] = time.monotonic()
+            return monitor
+
+    def ingest(self, name, lines):
+        """
+        Parse and ingest an NDJSON batch into a stream, snapshotting it when due.
+        """
+        events, rejected = parse_events(lines)
+        monitor = self.get(name)
+        result = monitor.ingest(events)
+        result["rejected"] = rejected
+        if time.monotonic() - self.last_snapshot.get(name, 0) >= self.settings["snapshot_interval"]:
+            self.snapshot(name)
+        return result
+
+    def snapshot(self, name):
+        monitor = self.monitors[name]
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(monitor.to_state(), f)
+        os.replace(tmp_path, self._path(name))
+        self.last_snapshot[name] = time.monotonic()
+
+    def snapshot_all(self):
+        for name in list(self.monitors):
+            self.snapshot(name)
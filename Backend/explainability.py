@@ -1,25 +1,188 @@
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
-import joblib
-import shap
-from sklearn.datasets import load_iris
-from sklearn.model_selection import train_test_split
+import pandas as pd
+from .ingestion import as_frame, feature_columns
+from .model_registry import ModelCache, as_model
+from .settings import get_setting
 
-def generate_shap_explanation(content: bytes):
+# Background summaries keyed by (dataset hash, feature columns, size, method), shared
+# by concurrent requests; each entry counts as 1 towards the budget, so at most
+# BACKGROUND_CACHE_SIZE summaries are kept.
+BACKGROUND_CACHE_SIZE = 32
+_background_cache = ModelCache(BACKGROUND_CACHE_SIZE)
+
+# Per-worker state (model, explainer, ...) built once by _init_worker.
+_worker_state = None
+
+TREE_MODULES = ("xgboost", "lightgbm", "catboost")
+TREE_CLASS_MARKERS = ("Tree", "Forest", "GradientBoosting")
+
+def _shap_settings():
+    config = get_setting("explainability", "shap", default={}) or {}
+    return {
+        "sample_size": int(config.get("sample_size", 10)),
+        "background": config.get("background", "kmeans"),
+        "max_rows": int(config.get("max_rows", 2000)),
+        "batch_size": int(config.get("batch_size", 250)),
+        "n_jobs": config.get("n_jobs") or 1,
+    }
+
+def _explainer_kind(model):
+    """
+    Pick the fastest exact SHAP algorithm the model supports: 'tree' for tree
+    ensembles, 'linear' for linear models and 'kernel' for everything else.
+    """
+    cls = type(model)
+    if cls.__module__.split(".")[0] in TREE_MODULES or any(m in cls.__name__ for m in TREE_CLASS_MARKERS):
+        return "tree"
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        return "linear"
+    return "kernel"
+
+def _dataset_hash(X: pd.DataFrame):
+    return hashlib.sha256(pd.util.hash_pandas_object(X, index=False).values.tobytes()).hexdigest()
+
+def summarize_background(X: pd.DataFrame, sample_size: int, method: str = "kmeans"):
+    """
+    Summarize the explanation data into a small background set, either k-means
+    centroids (weighted by cluster size) or a random sample of rows.
+    Summaries are cached per dataset and feature set, so repeated explanations
+    of the same data skip the clustering.
+    """
+    key = (_dataset_hash(X), tuple(X.columns), sample_size, method)
+    background = _background_cache.get(key)
+    if background is not None:
+        return background
+    values = X.to_numpy(dtype=float)
+    if len(values) <= sample_size:
+        background = values
+    elif method == "kmeans":
+        import shap
+        background = shap.kmeans(values, sample_size)
+    else:
+        rng = np.random.default_rng(0)
+        background = values[rng.choice(len(values), size=sample_size, replace=False)]
+    _background_cache.put(key, background, 1)
+    return background
+
+def _build_explainer(model, kind, background, feature_names):
+    # shap takes over a second to import, so it is loaded on the first explanation.
+    import shap
+    if kind == "tree":
+        return shap.TreeExplainer(model)
+    if kind == "linear":
+        data = background.data if hasattr(background, "data") else background
+        return shap.LinearExplainer(model, data)
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+    if getattr(model, "feature_names_in_", None) is not None:
+        # Keep column names so models fitted on DataFrames do not warn on every call.
+        return shap.KernelExplainer(lambda x: predict(pd.DataFrame(x, columns=feature_names)), background)
+    return shap.KernelExplainer(predict, background)
+
+def _init_worker(build, args):
+    global _worker_state
+    _worker_state = build(*args)
+
+def _call_worker(task, batch):
+    return task(_worker_state, batch)
+
+def _map_batches(build, args, task, batches, n_jobs):
+    """
+    Run task(state, batch) over all batches, where state = build(*args).
+    With several batches and n_jobs > 1 the batches are spread over a spawned
+    process pool and each worker builds its state once; otherwise they run in-process.
+    """
+    if n_jobs > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(batches)), mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(build, args)) as pool:
+            return list(pool.map(partial(_call_worker, task), batches))
+    state = build(*args)
+    return [task(state, batch) for batch in batches]
+
+def _mean_abs_shap(shap_values, n_features):
+    """
+    Per-row, per-feature |SHAP| averaged over output classes, shape (rows, features).
+    Handles both the list-per-class and the (rows, features, classes) layouts.
+    """
+    if isinstance(shap_values, list):
+        shap_values = np.stack(shap_values, axis=-1)
+    values = np.abs(np.asarray(shap_values, dtype=float))
+    if values.ndim == 3 and values.shape[1] != n_features:
+        values = np.moveaxis(values, 0, -1)
+    return values.mean(axis=-1) if values.ndim == 3 else values
+
+def _shap_batch(explainer, X_batch):
+    return _mean_abs_shap(explainer.shap_values(X_batch), X_batch.shape[1])
+
+def explain_shap_dataset(model, data, max_rows=None, n_jobs=None):
+    """
+    SHAP explanations for many rows of a user dataset.
+    Uses TreeExplainer or LinearExplainer when the model type supports them and
+    KernelExplainer otherwise, with a cached k-means (or sampled) background of
+    explainability.shap.sample_size rows. Up to `max_rows` rows are explained in
+    batches, across a process pool with n_jobs > 1. Returns the global mean |SHAP| per feature and,
+    when a 'sensitive' column is present, the same aggregate per group.
+    """
+    settings = _shap_settings()
+    max_rows = max_rows or settings["max_rows"]
+    n_jobs = n_jobs or settings["n_jobs"]
+    df = as_frame(data)
+    features = feature_columns(df, model)
+    if not features:
+        return {"error": "Dataset has no feature columns to explain."}
+    if len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=0)
+    X = df[features]
+    
+    kind = _explainer_kind(model)
+    background = None if kind == "tree" else summarize_background(X, settings["sample_size"], settings["background"])
+    values = X.to_numpy(dtype=float)
+    batches = [values[i:i + settings["batch_size"]] for i in range(0, len(values), settings["batch_size"])]
+    
+    abs_values = np.vstack(_map_batches(_build_explainer, (model, kind, background, features),
+                                        _shap_batch, batches, n_jobs))
+    
+    result = {
+        "explainer": kind,
+        "rows_explained": len(values),
+        "background_size": 0 if background is None else len(getattr(background, "data", background)),
+        "global_importance": dict(zip(features, abs_values.mean(axis=0).tolist()))
+    }
+    if 'sensitive' in df.columns:
+        by_group = pd.DataFrame(abs_values, columns=features).groupby(df['sensitive'].to_numpy(), observed=True).mean()
+        result["group_importance"] = dict(zip(by_group.index.tolist(), by_group.to_dict("records")))
+    return result
+
+def generate_shap_explanation(model, data=None):
     """
     Generate an explanation using SHAP.
-    Expects a pickled model file.
-    Uses the Iris dataset for demonstration.
+    Expects a pickled model file or a loaded model from the registry.
+    When `data` (CSV bytes or a DataFrame) is given, its rows are explained with
+    explain_shap_dataset; otherwise the Iris dataset is used for demonstration.
     """
     try:
-        model = joblib.loads(content)
+        model = as_model(model)
     except Exception as e:
         return {"error": f"Failed to load model for SHAP explanation: {str(e)}"}
     
+    if data is not None:
+        try:
+            return explain_shap_dataset(model, data)
+        except Exception as e:
+            return {"error": f"Failed to generate SHAP explanation: {str(e)}"}
+    
+    import shap
+    from sklearn.datasets import load_iris
+    from sklearn.model_selection import train_test_split
+    
     iris = load_iris()
     X_train, X_test, _, _ = train_test_split(iris.data, iris.target, test_size=0.3, random_state=42)
     
     try:
-        explainer = shap.KernelExplainer(model.predict, X_train[:10])
+        explainer = shap.KernelExplainer(model.predict, X_train[:_shap_settings()["sample_size"]])
         shap_values = explainer.shap_values(X_test[:1])
     except Exception as e:
         return {"error": f"Failed to generate SHAP explanation: {str(e)}"}
@@ -30,52 +193,340 @@ def generate_shap_explanation(content: bytes):
         "note": "SHAP explanation generated for one sample."
     }
 
-def generate_lime_explanation(content: bytes):
+def _lime_settings():
+    config = get_setting("explainability", "lime", default={}) or {}
+    return {
+        "num_features": int(config.get("num_features", 2)),
+        "num_samples": int(config.get("num_samples", 5000)),
+        "kernel_width": config.get("kernel_width"),
+        "max_rows": int(config.get("max_rows", 500)),
+        "batch_size": int(config.get("batch_size", 25)),
+        "n_jobs": config.get("n_jobs") or 1,
+    }
+
+def _build_lime_state(model, feature_names, scale, settings):
+    return {"model": model, "feature_names": feature_names, "scale": scale, "settings": settings}
+
+def _weighted_ridge(X, y, w, alpha=1.0):
+    """
+    Weighted ridge fits for a batch of neighbourhoods at once.
+    X: (n, samples, features), y and w: (n, samples). Returns (coef, intercept, r2).
+    """
+    w_sum = w.sum(axis=1, keepdims=True)
+    x_mean = np.einsum("ns,nsf->nf", w, X) / w_sum
+    y_mean = (w * y).sum(axis=1, keepdims=True) / w_sum
+    Xc = X - x_mean[:, None, :]
+    yc = y - y_mean
+    Xw = Xc * w[..., None]
+    A = np.matmul(Xw.transpose(0, 2, 1), Xc) + alpha * np.eye(X.shape[2])
+    b = np.einsum("nsi,ns->ni", Xw, yc)
+    coef = np.linalg.solve(A, b[..., None])[..., 0]
+    intercept = y_mean[:, 0] - np.einsum("nf,nf->n", x_mean, coef)
+    residual = yc - np.einsum("nsf,nf->ns", Xc, coef)
+    total = (w * yc ** 2).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(total > 0, 1 - (w * residual ** 2).sum(axis=1) / total, 1.0)
+    return coef, intercept, r2
+
+def _lime_batch(state, X_batch):
+    """
+    Explain a batch of rows. Every row's perturbation neighbourhood is one block of
+    a single NumPy tensor, and the whole batch is scored with one predict_proba call.
+    """
+    model, scale, settings = state["model"], state["scale"], state["settings"]
+    n_rows, n_features = X_batch.shape
+    n_samples = settings["num_samples"]
+    rng = np.random.default_rng(0)
+    
+    # Perturbations in standardized units; sample 0 is the instance itself.
+    noise = rng.standard_normal((n_rows, n_samples, n_features))
+    noise[:, 0, :] = 0.0
+    neighbourhood = X_batch[:, None, :] + noise * scale
+    flat = neighbourhood.reshape(-1, n_features)
+    if getattr(model, "feature_names_in_", None) is not None:
+        flat = pd.DataFrame(flat, columns=state["feature_names"])
+    
+    if hasattr(model, "predict_proba"):
+        proba = np.asarray(model.predict_proba(flat)).reshape(n_rows, n_samples, -1)
+        target = proba[:, 0, :].argmax(axis=1)
+        y = proba[np.arange(n_rows), :, target]
+        classes = getattr(model, "classes_", np.arange(proba.shape[2]))
+        predicted = [classes[t].item() if hasattr(classes[t], "item") else classes[t] for t in target]
+    else:
+        y = np.asarray(model.predict(flat), dtype=float).reshape(n_rows, n_samples)
+        predicted = y[:, 0].tolist()
+    
+    width = settings["kernel_width"] or 0.75 * np.sqrt(n_features)
+    distances = np.sqrt((noise ** 2).sum(axis=2))
+    weights = np.sqrt(np.exp(-(distances ** 2) / width ** 2))
+    
+    # Fit on all features, keep the num_features largest, then refit on those.
+    full_coef, _, _ = _weighted_ridge(noise, y, weights)
+    k = min(settings["num_features"], n_features)
+    selected = np.argsort(-np.abs(full_coef), axis=1)[:, :k]
+    sel_noise = np.take_along_axis(noise, selected[:, None, :], axis=2)
+    coef, intercept, r2 = _weighted_ridge(sel_noise, y, weights)
+    return {
+        "full_coef": full_coef,
+        "selected": selected,
+        "coef": coef,
+        "intercept": intercept,
+        "score": r2,
+        "predicted": predicted,
+        "prediction_score": y[:, 0],
+    }
+
+def explain_lime_dataset(model, data, max_rows=None, n_jobs=None):
+    """
+    Tabular LIME explanations for many rows of a dataset.
+    Perturbations are Gaussian in units of each feature's standard deviation,
+    weighted by an exponential kernel, and fitted with a weighted ridge model;
+    explainability.lime.num_features features are kept per row. With n_jobs > 1
+    batches of rows are explained concurrently in a process pool.
+    """
+    settings = _lime_settings()
+    max_rows = max_rows or settings["max_rows"]
+    n_jobs = n_jobs or settings["n_jobs"]
+    df = as_frame(data)
+    features = feature_columns(df, model)
+    if not features:
+        return {"error": "Dataset has no feature columns to explain."}
+    scale = df[features].to_numpy(dtype=float).std(axis=0)
+    scale[scale == 0] = 1.0
+    if len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=0)
+    values = df[features].to_numpy(dtype=float)
+    batches = [values[i:i + settings["batch_size"]] for i in range(0, len(values), settings["batch_size"])]
+    
+    parts = _map_batches(_build_lime_state, (model, features, scale, settings), _lime_batch, batches, n_jobs)
+    
+    explanations = []
+    for part in parts:
+        for i in range(len(part["coef"])):
+            weights = {features[j]: float(c) for j, c in zip(part["selected"][i], part["coef"][i])}
+            explanations.append({
+                "predicted": part["predicted"][i],
+                "prediction_score": float(part["prediction_score"][i]),
+                "feature_weights": weights,
+                "intercept": float(part["intercept"][i]),
+                "score": float(part["score"][i])
+            })
+    full_coef = np.abs(np.vstack([part["full_coef"] for part in parts]))
+    result = {
+        "rows_explained": len(explanations),
+        "num_features": min(settings["num_features"], len(features)),
+        "feature_importance": explanations[0]["feature_weights"] if explanations else {},
+        "global_importance": dict(zip(features, full_coef.mean(axis=0).tolist())),
+        "explanations": explanations
+    }
+    if 'sensitive' in df.columns:
+        by_group = pd.DataFrame(full_coef, columns=features).groupby(df['sensitive'].to_numpy(), observed=True).mean()
+        result["group_importance"] = dict(zip(by_group.index.tolist(), by_group.to_dict("records")))
+    return result
+
+def generate_lime_explanation(model, data=None):
     """
     Generate an explanation using LIME.
-    Expects a pickled model file.
+    Expects a pickled model file or a loaded model from the registry.
+    When `data` (CSV bytes or a DataFrame) is given, its rows are explained with
+    explain_lime_dataset; otherwise one Iris test sample is explained for demonstration.
     """
     try:
-        model = joblib.loads(content)
+        model = as_model(model)
     except Exception as e:
         raise RuntimeError("Failed to load model for LIME explanation") from e
     
-    lime_explanation = {
-        "feature_importance": {"feature1": 0.5, "feature2": -0.3},
-        "note": "Simulated LIME explanation for one sample."
-    }
+    if data is None:
+        from sklearn.datasets import load_iris
+        from sklearn.model_selection import train_test_split
+        
+        iris = load_iris()
+        X_train, X_test, _, _ = train_test_split(iris.data, iris.target, test_size=0.3, random_state=42)
+        features = [f"feature{i + 1}" for i in range(X_train.shape[1])]
+        scale = X_train.std(axis=0)
+        part = _lime_batch(_build_lime_state(model, features, scale, _lime_settings()), X_test[:1])
+        weights = {features[j]: float(c) for j, c in zip(part["selected"][0], part["coef"][0])}
+        lime_explanation = {
+            "feature_importance": weights,
+            "intercept": float(part["intercept"][0]),
+            "score": float(part["score"][0]),
+            "note": "LIME explanation for one Iris sample."
+        }
+        return {"lime_explanation": lime_explanation}
+    
+    try:
+        lime_explanation = explain_lime_dataset(model, data)
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate LIME explanation: {str(e)}") from e
+    lime_explanation["note"] = f"LIME explanations for {lime_explanation.get('rows_explained', 0)} samples."
     return {"lime_explanation": lime_explanation}
 
-def generate_counterfactual_explanation(content: bytes, input_sample: list):
+def _counterfactual_settings():
+    config = get_setting("explainability", "counterfactual", default={}) or {}
+    return {
+        "max_distance": float(config.get("max_distance", 3.0)),
+        "steps": int(config.get("steps", 20)),
+        "bisection_steps": int(config.get("bisection_steps", 12)),
+        "batch_size": int(config.get("batch_size", 2000)),
+        "max_rows": int(config.get("max_rows", 10000)),
+    }
+
+def _predict(model, X, feature_names):
+    if getattr(model, "feature_names_in_", None) is not None:
+        X = pd.DataFrame(X, columns=feature_names)
+    return np.asarray(model.predict(X))
+
+def find_counterfactuals(model, X, feature_names, scale=None, settings=None):
     """
-    Generate a counterfactual explanation by perturbing the input sample until the prediction flips.
-    For simplicity, assumes a tabular model with numerical features.
+    Vectorized counterfactual search for a batch of rows.
+    Each row is moved along candidate directions (each feature up or down, and all
+    features together), in units of `scale` per feature. At every step of a coarse
+    grid up to max_distance, all candidates of all unresolved rows are scored in one
+    predict call. Rows whose prediction flipped are then narrowed to the decision
+    boundary by bisection, again one predict call per iteration for the whole batch.
+    Returns (original, counterfactuals, counterfactual_predictions, distances, directions, calls)
+    with NaN rows and direction -1 where no counterfactual was found.
+    """
+    settings = settings or _counterfactual_settings()
+    X = np.asarray(X, dtype=float)
+    n_rows, n_features = X.shape
+    scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=float)
+    directions = np.vstack([np.eye(n_features), -np.eye(n_features), np.ones((2, n_features)) * [[1], [-1]]])
+    lengths = np.linalg.norm(directions, axis=1)
+    
+    original = _predict(model, X, feature_names)
+    calls = 1
+    found = np.zeros(n_rows, dtype=bool)
+    t_lo = np.zeros(n_rows)
+    t_hi = np.full(n_rows, np.nan)
+    best = np.full(n_rows, -1)
+    previous = 0.0
+    for t in np.linspace(settings["max_distance"] / settings["steps"], settings["max_distance"], settings["steps"]):
+        active = np.flatnonzero(~found)
+        if len(active) == 0:
+            break
+        candidates = X[active, None, :] + t * directions[None, :, :] * scale
+        preds = _predict(model, candidates.reshape(-1, n_features), feature_names).reshape(len(active), -1)
+        calls += 1
+        flipped = preds != original[active, None]
+        hit = flipped.any(axis=1)
+        # Among the directions that flip the prediction, keep the shortest move.
+        choice = np.where(flipped, lengths[None, :], np.inf).argmin(axis=1)
+        rows = active[hit]
+        best[rows] = choice[hit]
+        t_lo[rows] = previous
+        t_hi[rows] = t
+        found[rows] = True
+        previous = t
+    
+    rows = np.flatnonzero(found)
+    moves = directions[best[rows]] * scale
+    lo, hi = t_lo[rows], t_hi[rows]
+    for _ in range(settings["bisection_steps"] if len(rows) else 0):
+        mid = (lo + hi) / 2
+        flipped = _predict(model, X[rows] + mid[:, None] * moves, feature_names) != original[rows]
+        calls += 1
+        hi = np.where(flipped, mid, hi)
+        lo = np.where(flipped, lo, mid)
+    
+    counterfactuals = np.full_like(X, np.nan)
+    counterfactuals[rows] = X[rows] + hi[:, None] * moves
+    new_predictions = np.full(n_rows, None, dtype=object)
+    if len(rows):
+        new_predictions[rows] = _predict(model, counterfactuals[rows], feature_names)
+        calls += 1
+    distances = np.full(n_rows, np.nan)
+    distances[rows] = hi * lengths[best[rows]]
+    return original, counterfactuals, new_predictions, distances, best, calls
+
+def _direction_name(index, feature_names):
+    n_features = len(feature_names)
+    if index < 0:
+        return None
+    if index < 2 * n_features:
+        return f"{'+' if index < n_features else '-'}{feature_names[index % n_features]}"
+    return "+all" if index == 2 * n_features else "-all"
+
+def generate_counterfactuals(model, data, target_prediction=None, max_rows=None):
+    """
+    Counterfactuals for a whole cohort of rows.
+    Expects a pickled model file or a loaded model from the registry and CSV bytes
+    or a DataFrame. When `target_prediction` is given, only rows the model currently
+    predicts as that value (e.g. rejected applicants) are explained. Perturbations
+    are scaled by each feature's standard deviation and rows are searched in
+    vectorized batches of explainability.counterfactual.batch_size.
     """
     try:
-        model = joblib.loads(content)
+        model = as_model(model)
     except Exception as e:
         return {"error": f"Failed to load model for counterfactual explanation: {str(e)}"}
     
-    original_prediction = model.predict([input_sample])[0]
+    settings = _counterfactual_settings()
+    df = as_frame(data)
+    features = feature_columns(df, model)
+    if not features:
+        return {"error": "Dataset has no feature columns to perturb."}
+    values = df[features].to_numpy(dtype=float)
+    scale = values.std(axis=0)
+    scale[scale == 0] = 1.0
+    index = np.arange(len(values))
+    if target_prediction is not None:
+        current = _predict(model, values, features)
+        index = index[np.array([str(p) == str(target_prediction) for p in current], dtype=bool)]
+    index = index[:max_rows or settings["max_rows"]]
     
-    step = 0.01
-    counterfactual = input_sample.copy()
+    results = []
+    calls = 0
+    for start in range(0, len(index), settings["batch_size"]):
+        rows = index[start:start + settings["batch_size"]]
+        original, cfs, new_preds, distances, best, batch_calls = find_counterfactuals(
+            model, values[rows], features, scale, settings)
+        calls += batch_calls
+        for i, row in enumerate(rows):
+            entry = {"row": int(row), "original_prediction": original[i].item() if hasattr(original[i], "item") else original[i]}
+            if best[i] < 0:
+                entry["counterfactual"] = None
+            else:
+                changes = cfs[i] - values[row]
+                entry.update({
+                    "counterfactual_prediction": new_preds[i].item() if hasattr(new_preds[i], "item") else new_preds[i],
+                    "counterfactual": dict(zip(features, cfs[i].tolist())),
+                    "changes": {features[j]: float(changes[j]) for j in np.flatnonzero(changes)},
+                    "direction": _direction_name(best[i], features),
+                    "distance": float(distances[i])
+                })
+            results.append(entry)
     
-    max_iterations = 100
-    iterations = 0
-    while iterations < max_iterations:
-        counterfactual = [x + step for x in counterfactual]
-        new_prediction = model.predict([counterfactual])[0]
-        if new_prediction != original_prediction:
-            break
-        iterations += 1
+    n_found = sum(entry["counterfactual"] is not None for entry in results)
+    return {
+        "rows_explained": len(results),
+        "counterfactuals_found": n_found,
+        "predict_calls": calls,
+        "counterfactuals": results
+    }
+
+def generate_counterfactual_explanation(model, input_sample: list):
+    """
+    Generate a counterfactual explanation by perturbing the input sample until the prediction flips.
+    For simplicity, assumes a tabular model with numerical features.
+    Expects a pickled model file or a loaded model from the registry.
+    Uses the same batched search as generate_counterfactuals on a single row.
+    """
+    try:
+        model = as_model(model)
+    except Exception as e:
+        return {"error": f"Failed to load model for counterfactual explanation: {str(e)}"}
+    
+    names = getattr(model, "feature_names_in_", None)
+    features = list(names) if names is not None else [f"feature{i + 1}" for i in range(len(input_sample))]
+    original, cfs, _, _, best, calls = find_counterfactuals(model, [input_sample], features)
     
-    if iterations == max_iterations:
+    if best[0] < 0:
         return {"note": "Counterfactual explanation not found within iteration limit.", "counterfactual": None}
     
     return {
-        "original_prediction": original_prediction,
-        "counterfactual": counterfactual,
-        "iterations": iterations,
+        "original_prediction": original[0].item() if hasattr(original[0], "item") else original[0],
+        "counterfactual": cfs[0].tolist(),
+        "iterations": calls,
         "note": "Counterfactual explanation found by minimal perturbation."
     }
@@ -0,0 +1,350 @@
+import itertools
+import warnings
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+from .settings import get_setting
+
+
+class GroupCounts(NamedTuple):
+    """
+    Confusion counts per group: `counts[g, t, p]` is the number of rows of group
+    `groups[g]` with true label `classes[t]` and prediction `classes[p]`.
+    """
+    counts: np.ndarray
+    groups: list
+    classes: list
+
+
+def encode_groups(groups):
+    """
+    Integer-code a group column. Returns (codes, values) with -1 marking missing groups.
+    Categorical columns reuse their existing codes instead of re-hashing the values.
+    """
+    if isinstance(groups, pd.Series) and isinstance(groups.dtype, pd.CategoricalDtype):
+        return groups.cat.codes.to_numpy(), groups.cat.categories.tolist()
+    groups = np.asarray(groups)
+    if groups.dtype.kind in "iu" and len(groups):
+        # Integer labels in a compact range: a bincount and a dense lookup table give
+        # the same sorted codes as factorize without hashing every row.
+        lo, hi = int(groups.min()), int(groups.max())
+        if hi - lo <= max(len(groups), 1 << 16):
+            shifted = groups - lo if lo else groups
+            present = np.bincount(shifted, minlength=hi - lo + 1) > 0
+            codes = shifted if present.all() else (np.cumsum(present) - 1)[shifted]
+            return codes, (np.flatnonzero(present) + lo).tolist()
+    codes, values = pd.factorize(groups, sort=True)
+    return codes, values.tolist()
+
+
+def encode_labels(y_true, y_pred):
+    """
+    Code true labels and predictions against one shared, sorted class index so that
+    code `i` means the same class in both columns.
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    classes = pd.Index(np.union1d(pd.unique(y_true), pd.unique(y_pred))).dropna()
+    return classes.get_indexer(y_true), classes.get_indexer(y_pred), classes.tolist()
+
+
+def group_confusion_counts(y_true, y_pred, groups):
+    """
+    Build the (group x label x prediction) count tensor in a single np.bincount pass.
+    Rows with a missing group, label or prediction are ignored.
+    """
+    t_codes, p_codes, classes = encode_labels(y_true, y_pred)
+    g_codes, group_values = encode_groups(groups)
+    n_groups, n_classes = len(group_values), len(classes)
+
+    valid = (g_codes >= 0) & (t_codes >= 0) & (p_codes >= 0)
+    if not valid.all():
+        g_codes, t_codes, p_codes = g_codes[valid], t_codes[valid], p_codes[valid]
+
+    flat = (g_codes.astype(np.int64) * n_classes + t_codes) * n_classes + p_codes
+    counts = np.bincount(flat, minlength=n_groups * n_classes * n_classes)
+    counts = counts.reshape(n_groups, n_classes, n_classes)
+
+    # Drop categories that never occur in the data.
+    present = counts.sum(axis=(1, 2)) > 0
+    if not present.all():
+        counts = counts[present]
+        group_values = [g for g, keep in zip(group_values, present) if keep]
+    return GroupCounts(counts, group_values, classes)
+
+
+def intersection_counts(y_true, y_pred, group_frame):
+    """
+    Confusion counts for every observed intersection of the columns of `group_frame`.
+    Each column is integer-coded and the codes are combined into one mixed-radix
+    int64 key, so no per-row string labels are built. Returns
+    (combo_codes, counts, column_values, classes) where combo_codes[i, j] is the
+    code of column j in intersection i and counts[i] its (label x prediction) table.
+    """
+    t_codes, p_codes, classes = encode_labels(y_true, y_pred)
+    n_classes = len(classes)
+    encoded = [encode_groups(group_frame[col]) for col in group_frame.columns]
+    radices = [max(len(values), 1) for _, values in encoded]
+    if np.prod(radices, dtype=float) >= 2 ** 62:
+        raise ValueError("Too many sensitive attribute combinations to encode.")
+
+    valid = (t_codes >= 0) & (p_codes >= 0)
+    key = np.zeros(len(t_codes), dtype=np.int64)
+    for (codes, _), radix in zip(encoded, radices):
+        valid &= codes >= 0
+        key = key * radix + codes
+    if not valid.all():
+        key, t_codes, p_codes = key[valid], t_codes[valid], p_codes[valid]
+
+    combo_ids, combo_keys = pd.factorize(key)
+    flat = (combo_ids.astype(np.int64) * n_classes + t_codes) * n_classes + p_codes
+    counts = np.bincount(flat, minlength=len(combo_keys) * n_classes * n_classes)
+    counts = counts.reshape(len(combo_keys), n_classes, n_classes)
+
+    # Decode the mixed-radix keys of the observed intersections back into column codes.
+    combo_codes = np.empty((len(combo_keys), len(radices)), dtype=np.int64)
+    rest = np.asarray(combo_keys, dtype=np.int64)
+    for j in reversed(range(len(radices))):
+        rest, combo_codes[:, j] = np.divmod(rest, radices[j])
+    return combo_codes, counts, [values for _, values in encoded], classes
+
+
+def rollup_lattice(combo_codes, counts, min_support=1):
+    """
+    Marginalize intersection counts onto every non-empty subset of the group columns.
+    Works on the aggregated intersections only, never on the rows. Yields
+    (subset, subset_codes, subset_counts, n_pruned) where groups with fewer than
+    `min_support` rows have been removed.
+    """
+    n_cols = combo_codes.shape[1]
+    n_classes = counts.shape[-1]
+    flat = counts.reshape(len(counts), -1)
+    for size in range(1, n_cols + 1):
+        for subset in itertools.combinations(range(n_cols), size):
+            codes, inverse = np.unique(combo_codes[:, subset], axis=0, return_inverse=True)
+            merged = np.zeros((len(codes), flat.shape[1]), dtype=counts.dtype)
+            np.add.at(merged, inverse.ravel(), flat)
+            merged = merged.reshape(-1, n_classes, n_classes)
+            keep = merged.sum(axis=(1, 2)) >= min_support
+            yield subset, codes[keep], merged[keep], int((~keep).sum())
+
+
+def positive_index(classes):
+    """
+    Index of the positive class used for selection rate, TPR and FPR.
+    Uses fairness_metrics.positive_label from metrics.yaml when it is one of the
+    observed classes, and the largest class otherwise.
+    """
+    positive = get_setting("fairness_metrics", "positive_label", default=1)
+    for i, cls in enumerate(classes):
+        if cls == positive or str(cls) == str(positive):
+            return i
+    return len(classes) - 1
+
+
+def _safe_divide(num, den):
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+
+def rates_from_counts(counts, pos):
+    """
+    Per-group rates derived from a count tensor of shape (..., label, prediction).
+    Leading axes (groups, bootstrap replicates, ...) are kept, so the same code
+    serves single tables and stacks of them.
+    """
+    counts = np.asarray(counts)
+    n = counts.sum(axis=(-2, -1))
+    correct = np.trace(counts, axis1=-2, axis2=-1)
+    predicted_pos = counts[..., :, pos].sum(axis=-1)
+    actual_pos = counts[..., pos, :].sum(axis=-1)
+    true_pos = counts[..., pos, pos]
+    return {
+        "count": n,
+        "accuracy": _safe_divide(correct, n),
+        "selection_rate": _safe_divide(predicted_pos, n),
+        "true_positive_rate": _safe_divide(true_pos, actual_pos),
+        "false_positive_rate": _safe_divide(predicted_pos - true_pos, n - actual_pos),
+    }
+
+
+def gap(values, axis=-1):
+    """
+    Max-minus-min disparity across groups, ignoring groups where the rate is undefined.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.shape[axis] == 0:
+        return np.full(np.delete(values.shape, axis), np.nan)
+    defined = ~np.isnan(values)
+    hi = np.where(defined, values, -np.inf).max(axis=axis)
+    lo = np.where(defined, values, np.inf).min(axis=axis)
+    return np.where(defined.sum(axis=axis) > 0, hi - lo, np.nan)
+
+
+def disparities(rates):
+    """
+    Fairness gaps across the group axis of `rates` (the last axis).
+    The equalized-odds difference is the larger of the TPR and FPR gaps.
+    """
+    tpr_gap = gap(rates["true_positive_rate"])
+    fpr_gap = gap(rates["false_positive_rate"])
+    return {
+        "accuracy_gap": gap(rates["accuracy"]),
+        "demographic_parity_difference": gap(rates["selection_rate"]),
+        "equal_opportunity_difference": tpr_gap,
+        "false_positive_rate_difference": fpr_gap,
+        "equalized_odds_difference": np.fmax(tpr_gap, fpr_gap),
+    }
+
+
+def to_python(value):
+    """
+    Convert a NumPy scalar to a JSON-safe Python value (NaN becomes None).
+    """
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def check_thresholds(gaps: dict, overall_accuracy):
+    """
+    Compare computed gaps against the fairness_metrics thresholds in metrics.yaml.
+    A check whose metric is undefined (e.g. no positives in any group) has passed=None.
+    """
+    config = get_setting("fairness_metrics", default={}) or {}
+    checks = {}
+    for name, metric in (("demographic_parity", "demographic_parity_difference"),
+                         ("equal_opportunity", "equal_opportunity_difference")):
+        threshold = (config.get(name) or {}).get("threshold")
+        if threshold is None:
+            continue
+        value = to_python(gaps[metric])
+        checks[name] = {
+            "metric": metric,
+            "value": value,
+            "threshold": threshold,
+            "passed": None if value is None else value <= threshold,
+        }
+    min_accuracy = (config.get("overall_accuracy") or {}).get("min_acceptable")
+    if min_accuracy is not None:
+        value = to_python(overall_accuracy)
+        checks["overall_accuracy"] = {
+            "metric": "overall_accuracy",
+            "value": value,
+            "threshold": min_accuracy,
+            "passed": None if value is None else value >= min_accuracy,
+        }
+    return checks
+
+
+BOOTSTRAP_METHODS = ("multinomial", "poisson")
+
+
+def _bootstrap_settings():
+    config = get_setting("fairness_metrics", "bootstrap", default={}) or {}
+    return {
+        "enabled": config.get("enabled", True),
+        "n_replicates": int(config.get("n_replicates", 10000)),
+        "confidence_level": float(config.get("confidence_level", 0.95)),
+        "method": config.get("method", "multinomial"),
+        "random_state": config.get("random_state", 0),
+    }
+
+
+def bootstrap_counts(counts, n_replicates, method="multinomial", rng=None):
+    """
+    Resampled copies of a count tensor, shape (n_replicates, *counts.shape).
+    "multinomial" redraws the same total number of rows over the cells (the row
+    bootstrap, without touching the rows); "poisson" draws each cell independently
+    as Poisson(count).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    flat = np.asarray(counts).ravel()
+    if method == "multinomial":
+        n = flat.sum()
+        draws = rng.multinomial(n, flat / max(n, 1), size=n_replicates)
+    elif method == "poisson":
+        draws = rng.poisson(flat, size=(n_replicates, flat.size))
+    else:
+        raise ValueError(f"Unknown bootstrap method '{method}'. Expected one of: {', '.join(BOOTSTRAP_METHODS)}.")
+    return draws.reshape((n_replicates,) + np.shape(counts))
+
+
+def _interval(values, level):
+    """
+    Percentile interval over the replicate axis (axis 0), ignoring undefined replicates.
+    """
+    tail = (1 - level) / 2 * 100
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanpercentile(values, [tail, 100 - tail], axis=0)
+
+
+def bootstrap_intervals(group_counts: GroupCounts, n_replicates=None, confidence_level=None, method=None,
+                        random_state=None):
+    """
+    Bootstrap confidence intervals for the per-group rates, the overall accuracy and the
+    fairness gaps. Replicates are drawn on the (group x label x prediction) count tensor,
+    and every metric is recomputed for all replicates at once by rates_from_counts.
+    Replicates are processed in batches of about four million cells to bound memory.
+    Defaults come from fairness_metrics.bootstrap in metrics.yaml.
+    """
+    settings = _bootstrap_settings()
+    n_replicates = n_replicates or settings["n_replicates"]
+    level = confidence_level or settings["confidence_level"]
+    method = method or settings["method"]
+    rng = np.random.default_rng(settings["random_state"] if random_state is None else random_state)
+    counts = group_counts.counts
+    pos = positive_index(group_counts.classes)
+
+    rates, gaps, accuracy = [], [], []
+    batch = max(1, min(n_replicates, (1 << 22) // max(counts.size, 1)))
+    for start in range(0, n_replicates, batch):
+        sample = bootstrap_counts(counts, min(batch, n_replicates - start), method, rng)
+        replicate_rates = rates_from_counts(sample, pos)
+        rates.append(replicate_rates)
+        gaps.append(disparities(replicate_rates))
+        accuracy.append(rates_from_counts(sample.sum(axis=1), pos)["accuracy"])
+
+    def bounds(parts, name):
+        lo, hi = _interval(np.concatenate([part[name] for part in parts]), level)
+        return lo, hi
+
+    group_intervals = {group: {} for group in group_counts.groups}
+    for name in ("accuracy", "selection_rate", "true_positive_rate", "false_positive_rate"):
+        lo, hi = bounds(rates, name)
+        for i, group in enumerate(group_counts.groups):
+            group_intervals[group][name] = [to_python(lo[i]), to_python(hi[i])]
+    lo, hi = _interval(np.concatenate(accuracy), level)
+    return {
+        "method": method,
+        "n_replicates": n_replicates,
+        "confidence_level": level,
+        "overall_accuracy": [to_python(lo), to_python(hi)],
+        "gaps": {name: [to_python(value) for value in bounds(gaps, name)] for name in gaps[0]},
+        "group_metrics": group_intervals,
+    }
+
+
+def summarize_group_counts(group_counts: GroupCounts):
+    """
+    Turn a GroupCounts tensor into per-group metrics, overall metrics, the fairness
+    gaps and the configured pass/fail checks.
+    """
+    pos = positive_index(group_counts.classes)
+    rates = rates_from_counts(group_counts.counts, pos)
+    overall = rates_from_counts(group_counts.counts.sum(axis=0), pos)
+    gaps = disparities(rates)
+
+    by_group = {}
+    for i, group in enumerate(group_counts.groups):
+        by_group[group] = {name: to_python(values[i]) for name, values in rates.items()}
+        by_group[group]["count"] = int(rates["count"][i])
+    return {
+        "positive_label": group_counts.classes[pos] if group_counts.classes else None,
+        "group_metrics": by_group,
+        "overall": {name: to_python(value) for name, value in overall.items() if name != "count"},
+        "gaps": {name: to_python(value) for name, value in gaps.items()},
+        "threshold_checks": check_thresholds(gaps, overall["accuracy"]),
+    }
@@ -0,0 +1,113 @@
+import os
+import hashlib
+import pandas as pd
+from io import BytesIO
+from .instrumentation import span
+from .settings import BASE_DIR, get_setting
+
+# Columns every analysis reads, by endpoint.
+DATASET_COLUMNS = ["label"]
+FAIRNESS_COLUMNS = ["label", "prediction", "sensitive"]
+INTERSECTIONAL_COLUMNS = ["label", "prediction"]
+
+SENSITIVE_PREFIX = "sensitive"
+
+
+def _column_dtypes(columns):
+    """
+    Explicit dtypes for the columns that are about to be read.
+    Sensitive attributes are low-cardinality group labels, so they are read
+    as categoricals instead of generic object columns.
+    """
+    return {col: "category" for col in columns if col.startswith(SENSITIVE_PREFIX)}
+
+
+def read_csv_upload(content: bytes, columns=None, prefixes=()):
+    """
+    Parse an uploaded CSV exactly once.
+    When `columns` is given, only those columns (plus any column starting with
+    one of `prefixes`) are read; columns absent from the file are skipped so the
+    caller can report them. Raises ValueError if the upload is empty or is not a
+    valid CSV.
+    """
+    if not content:
+        raise ValueError("Uploaded file is empty.")
+    try:
+        with span("parse"):
+            header = pd.read_csv(BytesIO(content), nrows=0).columns
+            if columns is None and not prefixes:
+                usecols = list(header)
+            else:
+                wanted = set(columns or [])
+                usecols = [col for col in header
+                           if col in wanted or (prefixes and col.startswith(tuple(prefixes)))]
+            return pd.read_csv(BytesIO(content), usecols=usecols, dtype=_column_dtypes(usecols))
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise ValueError(f"Failed to parse CSV: {str(e)}") from e
+
+
+def content_hash(content: bytes):
+    """
+    SHA-256 of an uploaded file, recorded with stored reports to identify the dataset.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def require_columns(df, required):
+    """
+    Raise ValueError naming the first required column missing from `df`.
+    """
+    for col in required:
+        if col not in df.columns:
+            raise ValueError(f"CSV file must include a '{col}' column.")
+
+
+def as_frame(data, columns=None, prefixes=()):
+    """
+    Return `data` as a DataFrame, parsing it if raw CSV bytes were passed.
+    Lets the analysis functions accept either an upload or an already parsed frame.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    return read_csv_upload(data, columns=columns, prefixes=prefixes)
+
+
+def feature_columns(df, model=None):
+    """
+    Columns of `df` to feed to a model.
+    Uses the model's recorded training features when they are all present, and
+    otherwise every column except the label, prediction and sensitive attributes.
+    """
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None and all(name in df.columns for name in names):
+        return list(names)
+    reserved = {"label", "prediction"}
+    return [col for col in df.columns if col not in reserved and not col.startswith(SENSITIVE_PREFIX)]
+
+
+def resolve_data_path(path: str):
+    """
+    Resolve a server-side dataset path, refusing anything outside the configured data root.
+    """
+    root = os.path.realpath(os.path.join(BASE_DIR, get_setting("ingestion", "data_root", default="config/datasets")))
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError("Dataset path must be inside the configured data root.")
+    if not os.path.isfile(resolved):
+        raise ValueError(f"Dataset not found: {path}")
+    return resolved
+
+
+def iter_csv_chunks(source, columns, chunksize=None):
+    """
+    Yield DataFrame chunks of at most `chunksize` rows from CSV bytes, a binary
+    file object or a path, reading only the named columns that exist in the file.
+    """
+    chunksize = chunksize or get_setting("ingestion", "chunk_size", default=100000)
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    wanted = set(columns)
+    reader = pd.read_csv(source, usecols=lambda col: col in wanted, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            yield chunk
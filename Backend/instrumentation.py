@@ -0,0 +1,219 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .settings import get_setting
+
+# Spans of the request being served: {name: seconds}, or None outside a request.
+# Stages of one request may run on several threads, so updates hold _spans_lock.
+_request_spans = ContextVar("request_spans", default=None)
+_spans_lock = threading.Lock()
+
+
+def _instrumentation_settings():
+    config = get_setting("instrumentation", default={}) or {}
+    return {
+        "enabled": bool(config.get("enabled", True)),
+        "server_timing": bool(config.get("server_timing", True)),
+        "latency_buckets": tuple(config.get("latency_buckets") or
+                                 (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)),
+        "size_buckets": tuple(config.get("size_buckets") or
+                              (1024, 10240, 102400, 1048576, 10485760, 104857600, 1073741824)),
+    }
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    Prometheus counter with a fixed set of label names.
+    """
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus histogram with a fixed set of label names. Observations only bump one
+    bucket; the cumulative counts are formed when rendering.
+    """
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(names, label_values + (le,))} {cumulative}")
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_settings = _instrumentation_settings()
+REQUESTS = Counter("auditor_http_requests_total", "HTTP requests served.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("auditor_http_request_duration_seconds", "HTTP request latency.",
+                            _settings["latency_buckets"], ("route",))
+REQUEST_BYTES = Histogram("auditor_http_request_size_bytes", "HTTP request body size.", _settings["size_buckets"], ("route",))
+RESPONSE_BYTES = Histogram("auditor_http_response_size_bytes", "HTTP response body size.", _settings["size_buckets"], ("route",))
+STAGE_SECONDS = Histogram("auditor_stage_duration_seconds", "Time spent per processing stage.",
+                          _settings["latency_buckets"], ("stage",))
+
+
+@contextmanager
+def span(name):
+    """
+    Time a processing stage. During a request the duration is added to the request's
+    spans (repeated stages are summed), which feed its Server-Timing header and, once
+    per request, the stage histogram; outside requests it goes to the histogram directly.
+    """
+    if not _settings["enabled"]:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        spans = _request_spans.get()
+        if spans is None:
+            STAGE_SECONDS.observe(seconds, name)
+        else:
+            _add_span(spans, name, seconds)
+
+
+def _add_span(spans, name, seconds):
+    with _spans_lock:
+        spans[name] = spans.get(name, 0.0) + seconds
+
+
+def server_timing(spans, total):
+    """
+    Server-Timing header value, durations in milliseconds.
+    """
+    with _spans_lock:
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _route_name(scope):
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", "unmatched")
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware counting requests and recording their latency and body sizes by
+    route template, and adding a Server-Timing header with the request's spans.
+    Written against raw ASGI rather than BaseHTTPMiddleware so the endpoint runs in
+    the same task (sharing the span context) and responses are not re-buffered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _settings["enabled"]:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        spans = {}
+        token = _request_spans.set(spans)
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+
+        async def receive_counted():
+            # Time spent waiting for request body messages is the receive span.
+            waited = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                _add_span(spans, "receive", time.perf_counter() - waited)
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if _settings["server_timing"]:
+                    header = server_timing(spans, time.perf_counter() - started).encode("latin-1")
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"server-timing", header)])
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_timed)
+        finally:
+            _request_spans.reset(token)
+            route = _route_name(scope)
+            REQUESTS.inc(scope["method"], route, status["code"])
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+            REQUEST_BYTES.observe(sizes["request"], route)
+            RESPONSE_BYTES.observe(sizes["response"], route)
+            for name, seconds in spans.items():
+                STAGE_SECONDS.observe(seconds, name)
+
+
+def render_metrics(caches=None):
+    """
+    All metrics in the Prometheus text exposition format. `caches` maps a cache name
+    to an object with stats() (see model_registry.ModelCache) whose counters are
+    exported alongside.
+    """
+    lines = []
+    for metric in (REQUESTS, REQUEST_SECONDS, REQUEST_BYTES, RESPONSE_BYTES, STAGE_SECONDS):
+        lines.extend(metric.render())
+    if caches:
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        for key, kind, help in (("hits", "counter", "Cache hits."), ("misses", "counter", "Cache misses."),
+                                ("evictions", "counter", "Cache evictions."), ("entries", "gauge", "Cached entries."),
+                                ("used_bytes", "gauge", "Bytes held by the cache."),
+                                ("hit_rate", "gauge", "Fraction of lookups that were hits since startup.")):
+            name = f"auditor_cache_{key}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{cache="{cache}"}} {"NaN" if values[key] is None else values[key]}'
+                      for cache, values in stats.items()]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,185 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from .settings import get_setting
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    def __init__(self, kind, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.future = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        status = self.status
+        if status == "queued" and self.future is not None and self.future.running():
+            status = "running"
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+
+class JobManager:
+    """
+    Runs analyses as background jobs in a bounded process pool.
+    Each job kind (endpoint) has its own concurrency limit; jobs beyond it wait in
+    a per-kind queue. Submissions are refused with JobQueueFull once `max_queued`
+    jobs are waiting or running. Finished jobs are kept for polling until
+    `max_retained` newer ones have completed.
+    """
+
+    def __init__(self, max_workers=None, max_queued=100, max_retained=1000, limits=None, start_method="spawn"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queued = max_queued
+        self.max_retained = max_retained
+        self.limits = dict(limits or {})
+        self.start_method = start_method
+        self._pool = None
+        self._jobs = OrderedDict()
+        self._pending = {}
+        self._running = {}
+        # Reentrant: a future that is already done runs its callback (and so _finish)
+        # immediately inside _dispatch, while the lock is held.
+        self._lock = threading.RLock()
+
+    def _get_pool(self):
+        # Created on first use so importing the backend never starts worker processes.
+        if self._pool is None:
+            context = multiprocessing.get_context(self.start_method) if self.start_method else None
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._pool
+
+    def _limit(self, kind):
+        return self.limits.get(kind, self.limits.get("default", self.max_workers))
+
+    def _active(self):
+        return sum(len(q) for q in self._pending.values()) + sum(self._running.values())
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) as a job and return its description.
+        `fn` and its arguments must be picklable.
+        """
+        with self._lock:
+            if self._active() >= self.max_queued:
+                raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs queued or running).")
+            job = Job(kind, fn, args, kwargs)
+            self._jobs[job.id] = job
+            self._pending.setdefault(kind, deque()).append(job)
+            self._dispatch(kind)
+            return job.to_dict()
+
+    def _dispatch(self, kind):
+        # Caller holds the lock.
+        queue = self._pending.get(kind)
+        while queue and self._running.get(kind, 0) < self._limit(kind):
+            job = queue.popleft()
+            self._running[kind] = self._running.get(kind, 0) + 1
+            job.future = self._get_pool().submit(job.fn, *job.args, **job.kwargs)
+            # The arguments may be large frames; the worker has its own copy now.
+            job.args, job.kwargs = (), {}
+            job.future.add_done_callback(lambda future, job=job: self._finish(job, future))
+
+    def _finish(self, job, future):
+        with self._lock:
+            self._running[job.kind] -= 1
+            job.finished_at = time.time()
+            if job.status == "cancelled" or future.cancelled():
+                job.status = "cancelled"
+            elif future.exception() is not None:
+                job.status = "failed"
+                job.error = str(future.exception())
+            else:
+                job.result = future.result()
+                if isinstance(job.result, dict) and "error" in job.result:
+                    job.status = "failed"
+                    job.error = job.result["error"]
+                else:
+                    job.status = "succeeded"
+            job.future = None
+            self._dispatch(job.kind)
+            self._prune()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_retained)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Return the job description; raises KeyError for unknown IDs.
+        """
+        with self._lock:
+            return self._jobs[job_id].to_dict()
+
+    def result(self, job_id):
+        """
+        Return (status, result) of a job; the result is None until it has succeeded.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            return job.to_dict(), job.result
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs never run; a job already running in a worker
+        cannot be interrupted, so it is marked cancelled and its result discarded.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            if job.finished_at is not None:
+                return job.to_dict()
+            queue = self._pending.get(job.kind)
+            if queue and job in queue:
+                queue.remove(job)
+                job.finished_at = time.time()
+            elif job.future is not None:
+                job.future.cancel()
+            job.status = "cancelled"
+            return job.to_dict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": sum(len(q) for q in self._pending.values()),
+                "running": dict(self._running),
+                "max_queued": self.max_queued,
+                "max_workers": self.max_workers
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def create_job_manager():
+    config = get_setting("jobs", default={}) or {}
+    return JobManager(
+        max_workers=config.get("max_workers"),
+        max_queued=int(config.get("max_queued", 100)),
+        max_retained=int(config.get("max_retained", 1000)),
+        limits=config.get("limits") or {},
+        start_method=config.get("start_method", "spawn")
+    )
@@ -1,17 +1,41 @@
+import os
+import json
 import logging
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 from .bias_detector import (
     analyze_dataset_bias,
+    analyze_dataset_bias_streaming,
     analyze_model_bias,
-    compute_fairness_metrics
+    compute_fairness_metrics,
+    compute_intersectional_fairness,
+    intersectional_column_error
 )
-from .explainability import generate_shap_explanation, generate_lime_explanation
-from .mitigations import mitigate_bias
-from .privacy import perform_privacy_tests
+from .explainability import (
+    generate_shap_explanation,
+    generate_lime_explanation,
+    generate_counterfactuals,
+    generate_counterfactual_explanation
+)
+from .threshold_sweep import threshold_sweep
+from .mitigations import mitigate_bias, OUTPUT_FORMATS
+from .audit import run_audit, AUDIT_STAGES
+from .reweighing import REWEIGHING_METHODS
+from .privacy import perform_privacy_tests, compute_epsilon_grid, dp_defaults
 from .db_manager import store_report
-import pandas as pd
-from io import StringIO
+from .artifact_store import artifact_path, iter_artifact, ARTIFACT_FORMATS
+from .model_registry import register_model, get_model, load_model_bytes, model_cache, model_hash
+from .ingestion import read_csv_upload, require_columns, content_hash, resolve_data_path, DATASET_COLUMNS, FAIRNESS_COLUMNS, INTERSECTIONAL_COLUMNS, SENSITIVE_PREFIX
+from .prediction import prediction_cache
+from .jobs import create_job_manager, JobQueueFull
+from .drift_monitor import MonitorRegistry
+from .warmup import start_warmup, warmup_status
+from .instrumentation import InstrumentationMiddleware, render_metrics, span
+from .compression import GzipRequestMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -21,7 +45,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Ethics Auditor Backend", version="1.3")
+# Background jobs run in a process pool so CPU-bound analyses never block the event loop.
+job_manager = create_job_manager()
+
+# Streaming fairness monitors, restored from their snapshots on first use.
+monitors = MonitorRegistry()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy dependencies load on first use; startup.warmup preloads them in the background.
+    start_warmup()
+    yield
+    job_manager.shutdown()
+    monitors.snapshot_all()
+
+app = FastAPI(title="AI Ethics Auditor Backend", version="1.3", lifespan=lifespan)
+# Clients may gzip request bodies; they are inflated as the endpoint reads them.
+app.add_middleware(GzipRequestMiddleware)
+# Per-route request metrics for /metrics and a Server-Timing header with the stage spans.
+# Added last so it is outermost and records the body sizes as sent on the wire.
+app.add_middleware(InstrumentationMiddleware)
+
+# Key under which each job kind's result is returned, matching the synchronous endpoints
+# (None when the result already is the response data).
+JOB_RESULT_KEYS = {
+    "analyze/dataset": "bias_analysis",
+    "analyze/dataset/stream": "bias_analysis",
+    "analyze/model": "model_bias",
+    "analyze/fairness": "fairness_analysis",
+    "analyze/fairness/sweep": "threshold_sweep",
+    "analyze/intersectional": "intersectional_analysis",
+    "analyze/privacy": "privacy_analysis",
+    "analyze/privacy/sweep": None,
+    "explain/shap": "shap_explanation",
+    "explain/lime": "lime_explanation",
+    "explain/counterfactual": "counterfactual_explanation",
+    "mitigate": "mitigated_data",
+    "audit": "audit"
+}
 
 # SECURITY: Simple API key dependency for demonstration purposes.
 API_KEY = "secret-token"
@@ -36,138 +97,660 @@ async def verify_api_key(x_api_key: str = Header(...)):
 def consistent_response(success: bool, data=None, error=None):
     return {"success": success, "data": data, "error": error}
 
+async def read_upload(file: UploadFile):
+    """
+    Read an uploaded file, timed as the request's upload span (separate from the
+    middleware's receive span, which times the body arriving on the wire).
+    """
+    with span("upload"):
+        return await file.read()
+
+async def run_stage(fn, *args, **kwargs):
+    """
+    run_in_threadpool, timed as the request's compute span (which includes the
+    parse, predict and store spans of the work it runs).
+    """
+    with span("compute"):
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+async def resolve_model(file: Optional[UploadFile], model_id: Optional[str]):
+    """
+    Load the model for a request, either from the registry by ID or from an uploaded file.
+    Uploaded bytes are looked up in the model cache by content hash before unpickling.
+    """
+    model, _ = await resolve_model_with_hash(file, model_id)
+    return model
+
+async def resolve_model_with_hash(file: Optional[UploadFile], model_id: Optional[str]):
+    """
+    Like resolve_model, but also returns the model's content hash (its registry ID).
+    """
+    if model_id:
+        try:
+            return get_model(model_id), model_id
+        except KeyError:
+            raise ValueError(f"Unknown model id: {model_id}")
+    if file is None:
+        raise ValueError("Either a model file or a model_id must be provided.")
+    content = await read_upload(file)
+    if not content:
+        raise ValueError("Uploaded model file is empty.")
+    content_id = model_hash(content)
+    return load_model_bytes(content, content_id), content_id
+
+def submit_job(kind: str, fn, *args, **kwargs):
+    """
+    Queue an analysis as a background job and return a 202 response with its job ID.
+    Raises a 429 HTTPException when the job queue is full.
+    """
+    try:
+        job = job_manager.submit(kind, fn, *args, **kwargs)
+    except JobQueueFull as e:
+        logger.warning("Rejected %s job: %s", kind, str(e))
+        raise HTTPException(status_code=429, detail=consistent_response(False, error=str(e)))
+    logger.info("Queued %s job %s.", kind, job["job_id"])
+    return JSONResponse(status_code=202, content=consistent_response(True, data={"job": job}))
+
+def mitigate_and_store(df, dataset_hash=None, output=None, method=None, register_model=False, adversarial=None, wait=True):
+    """
+    Mitigation plus report storage, runnable as a single background job.
+    Artifact outputs are already on disk, so only their handle is stored as the report.
+    Job workers exit without running atexit hooks, so by default the report write is waited for.
+    """
+    mitigated_data = mitigate_bias(df, output=output, method=method, register_model=register_model,
+                                   adversarial=adversarial)
+    if "error" in mitigated_data:
+        return mitigated_data
+    if "artifact" in mitigated_data:
+        mitigated_data["artifact"]["download_url"] = f"/artifacts/{mitigated_data['artifact']['artifact_id']}"
+    store_report(mitigated_data, report_type="mitigation", dataset_hash=dataset_hash, wait=wait)
+    return mitigated_data
+
+def audit_and_store(df, model=None, stages=None, dataset_hash=None, model_hash=None, wait=True):
+    """
+    Audit pipeline plus report storage, runnable as a single background job.
+    """
+    report = run_audit(df, model, stages=stages, model_hash=model_hash, dataset_hash=dataset_hash)
+    if "error" in report:
+        return report
+    mitigation = report["stages"].get("mitigation", {}).get("result", {})
+    if "artifact" in mitigation:
+        mitigation["artifact"]["download_url"] = f"/artifacts/{mitigation['artifact']['artifact_id']}"
+    store_report(report, report_type="audit", dataset_hash=dataset_hash, model_hash=model_hash, wait=wait)
+    return report
+
+def sweep_epsilon(noise_multipliers, batch_sizes, dataset_sizes, epochs, delta):
+    return {"delta": delta, "sweep": compute_epsilon_grid(noise_multipliers, batch_sizes, dataset_sizes, epochs, delta)}
+
 @app.get("/")
 def read_root():
     logger.info("Root endpoint accessed")
-    return consistent_response(True, data={"message": "AI Ethics Auditor backend up and running."})
+    return consistent_response(True, data={"message": "AI Ethics Auditor backend up and running.", "warmup": warmup_status()})
+
+@app.post("/models", dependencies=[Depends(verify_api_key)])
+async def endpoint_register_model(file: UploadFile = File(...)):
+    """
+    Registers a pickled model and returns its content-hash ID.
+    The ID can be passed as 'model_id' to the model endpoints instead of re-uploading the file.
+    """
+    try:
+        content = await read_upload(file)
+        result = register_model(content)
+        logger.info("Model %s registered.", result["model_id"])
+        return consistent_response(True, data=result)
+    except Exception as e:
+        logger.error("Error in /models: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
+@app.get("/models/cache", dependencies=[Depends(verify_api_key)])
+def endpoint_model_cache_stats():
+    return consistent_response(True, data={"model_cache": model_cache.stats(), "prediction_cache": prediction_cache.stats()})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def endpoint_metrics():
+    """
+    Request counts, latency, payload-size and per-stage histograms and cache counters
+    in the Prometheus text format. Left without the API key so scrapers can reach it;
+    it only exposes aggregates by route template.
+    """
+    return PlainTextResponse(render_metrics({"model": model_cache, "prediction": prediction_cache}),
+                             media_type="text/plain; version=0.0.4")
 
 @app.post("/analyze/dataset", dependencies=[Depends(verify_api_key)])
-async def endpoint_analyze_dataset(file: UploadFile = File(...)):
-    try:
-        content = await file.read()
-        # Input validation: check for non-empty content.
-        if not content:
-            raise ValueError("Uploaded file is empty.")
-        # Validate CSV contains a 'label' column
-        df = pd.read_csv(StringIO(content.decode("utf-8")))
-        if 'label' not in df.columns:
-            raise ValueError("CSV file must include a 'label' column.")
-        result = analyze_dataset_bias(content)
+async def endpoint_analyze_dataset(file: UploadFile = File(...), background: bool = False):
+    try:
+        content = await read_upload(file)
+        # Parse once, reading only the 'label' column, and validate it.
+        df = read_csv_upload(content, columns=DATASET_COLUMNS)
+        del content
+        require_columns(df, DATASET_COLUMNS)
+        if background:
+            return submit_job("analyze/dataset", analyze_dataset_bias, df)
+        result = await run_stage(analyze_dataset_bias, df)
         logger.info("Dataset analysis completed successfully.")
         return consistent_response(True, data={"bias_analysis": result})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in /analyze/dataset: %s", str(e))
         raise HTTPException(status_code=400, detail=consistent_response(False, error="An error occurred while analyzing the dataset. Please try again later."))
 
+@app.post("/analyze/dataset/stream", dependencies=[Depends(verify_api_key)])
+async def endpoint_analyze_dataset_stream(
+    file: Optional[UploadFile] = File(None),
+    path: Optional[str] = Form(None),
+    chunksize: Optional[int] = Form(None),
+    background: bool = False
+):
+    """
+    Streaming class-imbalance analysis for datasets larger than memory.
+    Expects either an uploaded CSV ('file') or a 'path' relative to the configured
+    data root. The CSV must include a 'label' column; per-group counts are added
+    when a 'sensitive' column is present.
+    """
+    try:
+        if file is not None:
+            # Read straight from the spooled upload instead of loading it into memory;
+            # a background job cannot share the upload, so it gets the bytes.
+            source = await read_upload(file) if background else file.file
+        elif path:
+            source = resolve_data_path(path)
+        else:
+            raise ValueError("Either a CSV file or a dataset path must be provided.")
+        if background:
+            return submit_job("analyze/dataset/stream", analyze_dataset_bias_streaming, source, chunksize=chunksize)
+        result = await run_stage(analyze_dataset_bias_streaming, source, chunksize=chunksize)
+        if "error" in result:
+            raise ValueError(result["error"])
+        logger.info("Streaming dataset analysis completed successfully.")
+        return consistent_response(True, data={"bias_analysis": result})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in /analyze/dataset/stream: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
 @app.post("/analyze/model", dependencies=[Depends(verify_api_key)])
-async def endpoint_analyze_model(file: UploadFile = File(...)):
+async def endpoint_analyze_model(
+    file: Optional[UploadFile] = File(None),
+    model_id: Optional[str] = Form(None),
+    data: Optional[UploadFile] = File(None),
+    background: bool = False
+):
+    """
+    Expects a pickled model file (or 'model_id' of a registered model) and a 'data' CSV
+    with a 'label' column and optional sensitive columns to evaluate it on.
+    Returns the confusion matrix, per-class accuracy and per-group metrics; without
+    'data' the model is evaluated on the Iris demonstration set.
+    """
     try:
-        content = await file.read()
-        if not content:
-            raise ValueError("Uploaded model file is empty.")
-        result = analyze_model_bias(content)
+        model, model_key = await resolve_model_with_hash(file, model_id)
+        df, dataset_hash = None, None
+        if data is not None:
+            content = await read_upload(data)
+            dataset_hash = content_hash(content)
+            df = read_csv_upload(content)
+            del content
+            require_columns(df, DATASET_COLUMNS)
+        options = dict(model_hash=model_key, dataset_hash=dataset_hash)
+        if background:
+            return submit_job("analyze/model", analyze_model_bias, model, df, **options)
+        result = await run_stage(analyze_model_bias, model, df, **options)
+        if "error" in result:
+            raise ValueError(result["error"])
         logger.info("Model analysis completed successfully.")
         return consistent_response(True, data={"model_bias": result})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in /analyze/model: %s", str(e))
         raise HTTPException(status_code=400, detail=consistent_response(False, error="An error occurred while analyzing the model. Please try again later."))
 
 @app.post("/analyze/fairness", dependencies=[Depends(verify_api_key)])
-async def endpoint_analyze_fairness(file: UploadFile = File(...)):
+async def endpoint_analyze_fairness(file: UploadFile = File(...), background: bool = False):
     """
     Expects a CSV with columns: 'label', 'prediction', 'sensitive'.
     """
     try:
-        content = await file.read()
-        if not content:
-            raise ValueError("Uploaded CSV file is empty.")
-        # Validate required columns
-        df = pd.read_csv(StringIO(content.decode("utf-8")))
-        for col in ['label', 'prediction', 'sensitive']:
-            if col not in df.columns:
-                raise ValueError(f"CSV file must include a '{col}' column.")
-        result = compute_fairness_metrics(content)
+        content = await read_upload(file)
+        # Parse once, reading only the required columns, and validate them.
+        df = read_csv_upload(content, columns=FAIRNESS_COLUMNS)
+        del content
+        require_columns(df, FAIRNESS_COLUMNS)
+        if background:
+            return submit_job("analyze/fairness", compute_fairness_metrics, df)
+        result = await run_stage(compute_fairness_metrics, df)
         logger.info("Fairness analysis completed successfully.")
         return consistent_response(True, data={"fairness_analysis": result})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in /analyze/fairness: %s", str(e))
         raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
 
+@app.post("/analyze/fairness/sweep", dependencies=[Depends(verify_api_key)])
+async def endpoint_threshold_sweep(
+    data: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    model_id: Optional[str] = Form(None),
+    max_points: Optional[int] = Form(None),
+    background: bool = False
+):
+    """
+    Fairness-accuracy trade-off across decision thresholds.
+    Expects a pickled model with predict_proba (or 'model_id' of a registered model) and a
+    'data' CSV with a binary 'label' column and optional sensitive columns.
+    Returns accuracy, selection rate, TPR and FPR per group and overall at up to
+    'max_points' thresholds (default from metrics.yaml; 0 returns every threshold).
+    """
+    try:
+        model, model_key = await resolve_model_with_hash(file, model_id)
+        content = await read_upload(data)
+        dataset_hash = content_hash(content)
+        df = read_csv_upload(content)
+        del content
+        require_columns(df, DATASET_COLUMNS)
+        options = dict(max_points=max_points, model_hash=model_key, dataset_hash=dataset_hash)
+        if background:
+            return submit_job("analyze/fairness/sweep", threshold_sweep, model, df, **options)
+        result = await run_stage(threshold_sweep, model, df, **options)
+        if "error" in result:
+            raise ValueError(result["error"])
+        logger.info("Threshold sweep over %d thresholds completed.", len(result["thresholds"]))
+        return consistent_response(True, data={"threshold_sweep": result})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in /analyze/fairness/sweep: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
+@app.post("/analyze/intersectional", dependencies=[Depends(verify_api_key)])
+async def endpoint_analyze_intersectional(
+    file: UploadFile = File(...),
+    min_support: Optional[int] = Form(None),
+    background: bool = False
+):
+    """
+    Expects a CSV with columns 'label', 'prediction' and one or more 'sensitive_*' columns.
+    Returns fairness metrics for every combination of the sensitive columns,
+    skipping subgroups with fewer than 'min_support' rows.
+    More sensitive columns than fairness_metrics.intersectional.max_columns are rejected.
+    """
+    try:
+        content = await read_upload(file)
+        df = read_csv_upload(content, columns=INTERSECTIONAL_COLUMNS, prefixes=[f"{SENSITIVE_PREFIX}_"])
+        del content
+        require_columns(df, INTERSECTIONAL_COLUMNS)
+        error = intersectional_column_error([col for col in df.columns if col.startswith(f"{SENSITIVE_PREFIX}_")])
+        if error:
+            raise HTTPException(status_code=400, detail=consistent_response(False, error=error))
+        if background:
+            return submit_job("analyze/intersectional", compute_intersectional_fairness, df, min_support=min_support)
+        result = await run_stage(compute_intersectional_fairness, df, min_support=min_support)
+        if "error" in result:
+            raise ValueError(result["error"])
+        logger.info("Intersectional fairness analysis completed successfully.")
+        return consistent_response(True, data={"intersectional_analysis": result})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in /analyze/intersectional: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
 # Updated privacy endpoint now accepts two files: model and training dataset.
 @app.post("/analyze/privacy", dependencies=[Depends(verify_api_key)])
 async def endpoint_analyze_privacy(
-    model: UploadFile = File(...), 
-    train: UploadFile = File(...)
+    model: Optional[UploadFile] = File(None),
+    train: UploadFile = File(...),
+    model_id: Optional[str] = Form(None),
+    holdout: Optional[UploadFile] = File(None),
+    attack: str = Form("threshold"),
+    n_shadow_models: Optional[int] = Form(None),
+    sample_size: Optional[int] = Form(None),
+    background: bool = False
 ):
     """
     Expects:
-      - 'model': a pickled model file.
+      - 'model': a pickled model file, or 'model_id' of a registered model.
       - 'train': a CSV file containing the training data.
+    Optional:
+      - 'attack': "threshold" (default) or "shadow" for the shadow-model attack.
+      - 'holdout': a CSV of non-member rows for the shadow-model attack.
+      - 'n_shadow_models' and 'sample_size' to trade accuracy for speed.
     """
     try:
-        model_content = await model.read()
-        train_content = await train.read()
-        if not model_content or not train_content:
+        loaded_model = await resolve_model(model, model_id)
+        train_content = await read_upload(train)
+        if not train_content:
             raise ValueError("Both model and training files must be provided and non-empty.")
-        result = perform_privacy_tests(model_content, train_content)
+        train_df = read_csv_upload(train_content)
+        del train_content
+        holdout_df = read_csv_upload(await read_upload(holdout)) if holdout is not None else None
+        options = dict(attack=attack, holdout_content=holdout_df, n_shadow_models=n_shadow_models, sample_size=sample_size)
+        if background:
+            return submit_job("analyze/privacy", perform_privacy_tests, loaded_model, train_df, **options)
+        result = await run_stage(perform_privacy_tests, loaded_model, train_df, **options)
         logger.info("Privacy analysis completed successfully.")
         return consistent_response(True, data={"privacy_analysis": result})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in /analyze/privacy: %s", str(e))
         raise HTTPException(status_code=400, detail=consistent_response(False, error="An internal error has occurred. Please try again later."))
 
+class PrivacySweepRequest(BaseModel):
+    noise_multipliers: Optional[List[float]] = None
+    batch_sizes: Optional[List[int]] = None
+    dataset_sizes: List[int] = [10000]
+    epochs: Optional[List[float]] = None
+    delta: Optional[float] = None
+
+# Largest parameter grid accepted by /analyze/privacy/sweep.
+MAX_SWEEP_POINTS = 100000
+
+@app.post("/analyze/privacy/sweep", dependencies=[Depends(verify_api_key)])
+async def endpoint_privacy_sweep(request: PrivacySweepRequest, background: bool = False):
+    """
+    Computes DP-SGD epsilon for every combination of the given noise multipliers,
+    batch sizes, dataset sizes and epochs in one vectorized accountant call.
+    Omitted parameters default to the privacy section of metrics.yaml.
+    """
+    try:
+        defaults = dp_defaults()
+        noise_multipliers = request.noise_multipliers or [defaults["noise_multiplier"]]
+        batch_sizes = request.batch_sizes or [defaults["batch_size"]]
+        epochs = request.epochs or [defaults["epochs"]]
+        delta = request.delta if request.delta is not None else defaults["delta"]
+        n_points = len(noise_multipliers) * len(batch_sizes) * len(request.dataset_sizes) * len(epochs)
+        if n_points > MAX_SWEEP_POINTS:
+            raise ValueError(f"Parameter grid has {n_points} points; the maximum is {MAX_SWEEP_POINTS}.")
+        if delta <= 0 or delta >= 1:
+            raise ValueError("delta must be between 0 and 1.")
+        args = (noise_multipliers, batch_sizes, request.dataset_sizes, epochs, delta)
+        if background:
+            return submit_job("analyze/privacy/sweep", sweep_epsilon, *args)
+        result = await run_stage(sweep_epsilon, *args)
+        logger.info("Privacy sweep over %d parameter combinations completed.", len(result["sweep"]))
+        return consistent_response(True, data=result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in /analyze/privacy/sweep: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
 @app.post("/explain/shap", dependencies=[Depends(verify_api_key)])
-async def endpoint_explain_shap(file: UploadFile = File(...)):
+async def endpoint_explain_shap(
+    file: Optional[UploadFile] = File(None),
+    model_id: Optional[str] = Form(None),
+    data: Optional[UploadFile] = File(None),
+    background: bool = False
+):
     """
-    Expects a pickled model file for SHAP explanation.
+    Expects a pickled model file (or 'model_id' of a registered model) for SHAP explanation.
+    An optional 'data' CSV is explained row by row and summarized globally and per
+    'sensitive' group; without it the Iris demonstration sample is used.
     """
     try:
-        content = await file.read()
-        if not content:
-            raise ValueError("Uploaded model file is empty.")
-        explanation = generate_shap_explanation(content)
+        model = await resolve_model(file, model_id)
+        df = read_csv_upload(await read_upload(data)) if data is not None else None
+        if background:
+            return submit_job("explain/shap", generate_shap_explanation, model, df)
+        explanation = await run_stage(generate_shap_explanation, model, df)
         logger.info("SHAP explanation generated successfully.")
         return consistent_response(True, data={"shap_explanation": explanation})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in /explain/shap: %s", str(e))
         raise HTTPException(status_code=400, detail=consistent_response(False, error="An internal error has occurred. Please try again later."))
 
 @app.post("/explain/lime", dependencies=[Depends(verify_api_key)])
-async def endpoint_explain_lime(file: UploadFile = File(...)):
+async def endpoint_explain_lime(
+    file: Optional[UploadFile] = File(None),
+    model_id: Optional[str] = Form(None),
+    data: Optional[UploadFile] = File(None),
+    background: bool = False
+):
     """
-    Expects a pickled model file for LIME explanation.
+    Expects a pickled model file (or 'model_id' of a registered model) for LIME explanation.
+    An optional 'data' CSV is explained row by row; without it one Iris sample is explained.
     """
     try:
-        content = await file.read()
-        if not content:
-            raise ValueError("Uploaded model file is empty.")
-        explanation = generate_lime_explanation(content)
+        model = await resolve_model(file, model_id)
+        df = read_csv_upload(await read_upload(data)) if data is not None else None
+        if background:
+            return submit_job("explain/lime", generate_lime_explanation, model, df)
+        explanation = await run_stage(generate_lime_explanation, model, df)
         logger.info("LIME explanation generated successfully.")
         return consistent_response(True, data={"lime_explanation": explanation})
-    except RuntimeError as e:
+    except HTTPException:
+        raise
+    except (RuntimeError, ValueError) as e:
         logger.error("Error in /explain/lime: %s", str(e))
         raise HTTPException(status_code=400, detail=consistent_response(False, error="An internal error has occurred. Please try again later."))
     except Exception as e:
         logger.error("Unexpected error in /explain/lime: %s", str(e))
         raise HTTPException(status_code=500, detail=consistent_response(False, error="An unexpected error has occurred. Please try again later."))
 
+@app.post("/explain/counterfactual", dependencies=[Depends(verify_api_key)])
+async def endpoint_explain_counterfactual(
+    file: Optional[UploadFile] = File(None),
+    model_id: Optional[str] = Form(None),
+    data: Optional[UploadFile] = File(None),
+    sample: Optional[str] = Form(None),
+    target_prediction: Optional[str] = Form(None),
+    background: bool = False
+):
+    """
+    Expects a pickled model file (or 'model_id' of a registered model) and either:
+      - 'data': a CSV cohort; rows predicted as 'target_prediction' (all rows if omitted)
+        get counterfactuals, or
+      - 'sample': a JSON list with the feature values of a single row.
+    """
+    try:
+        model = await resolve_model(file, model_id)
+        if data is not None:
+            df = read_csv_upload(await read_upload(data))
+            fn, args, kwargs = generate_counterfactuals, (model, df), {"target_prediction": target_prediction}
+        elif sample:
+            fn, args, kwargs = generate_counterfactual_explanation, (model, json.loads(sample)), {}
+        else:
+            raise ValueError("Either a 'data' CSV or a 'sample' must be provided.")
+        if background:
+            return submit_job("explain/counterfactual", fn, *args, **kwargs)
+        explanation = await run_stage(fn, *args, **kwargs)
+        if "error" in explanation:
+            raise ValueError(explanation["error"])
+        logger.info("Counterfactual explanation generated successfully.")
+        return consistent_response(True, data={"counterfactual_explanation": explanation})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in /explain/counterfactual: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
 @app.post("/mitigate", dependencies=[Depends(verify_api_key)])
-async def endpoint_mitigate(file: UploadFile = File(...)):
+async def endpoint_mitigate(
+    file: UploadFile = File(...),
+    output: Optional[str] = Form(None),
+    method: Optional[str] = Form(None),
+    register_model: bool = Form(False),
+    adversarial: Optional[bool] = Form(None),
+    background: bool = False
+):
     """
     Expects a CSV with a 'label' column.
     Applies a simple reweighting scheme to mitigate bias.
+    Optional 'output': "csv" returns the mitigated dataset inline; "parquet", "arrow"
+    or "weights" store it as an artifact and return a handle for GET /artifacts/{id}.
+    Optional 'method': "inverse_frequency" or "kamiran_calders" reweighting over the
+    sensitive columns (default from metrics.yaml).
+    Optional 'adversarial': also train an adversarially debiased classifier on the
+    sensitive columns (default mitigation.adversarial_debiasing.enabled, off).
+    Optional 'register_model': train it and store it in the model registry; its ID
+    is returned in the adversarial_debiasing report.
     """
+    if output is not None and output not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=f"Unknown output format '{output}'. Expected one of: {', '.join(OUTPUT_FORMATS)}."))
+    if method is not None and method not in REWEIGHING_METHODS:
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=f"Unknown reweighting method '{method}'. Expected one of: {', '.join(REWEIGHING_METHODS)}."))
     try:
-        content = await file.read()
-        if not content:
-            raise ValueError("Uploaded CSV file is empty.")
-        df = pd.read_csv(StringIO(content.decode("utf-8")))
-        if 'label' not in df.columns:
-            raise ValueError("CSV file must include a 'label' column.")
-        mitigated_data = mitigate_bias(content)
-        store_report(mitigated_data)
+        content = await read_upload(file)
+        dataset_hash = content_hash(content)
+        # Mitigation returns the full dataset, so every column is parsed (once).
+        df = read_csv_upload(content)
+        del content
+        require_columns(df, DATASET_COLUMNS)
+        if background:
+            return submit_job("mitigate", mitigate_and_store, df, dataset_hash=dataset_hash, output=output, method=method,
+                              register_model=register_model, adversarial=adversarial)
+        mitigated_data = await run_stage(mitigate_and_store, df, dataset_hash=dataset_hash, output=output, method=method,
+                                                 register_model=register_model, adversarial=adversarial, wait=False)
+        if "error" in mitigated_data:
+            raise ValueError(mitigated_data["error"])
         logger.info("Bias mitigation completed and report stored.")
         return consistent_response(True, data={"mitigated_data": mitigated_data})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error in /mitigate: %s", str(e))
-        raise HTTPException(status_code=400, detail=consistent_response(False, error="An internal error has occurred. Please try again later."))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=consistent_response(False, error="An internal error has occurred. Please try again later."))
+
+@app.post("/audit", dependencies=[Depends(verify_api_key)])
+async def endpoint_audit(
+    data: UploadFile = File(...),
+    file: Optional[UploadFile] = File(None),
+    model_id: Optional[str] = Form(None),
+    stages: Optional[str] = Form(None),
+    background: bool = False
+):
+    """
+    Runs the audit pipeline over one dataset and (optionally) one model.
+    Expects a 'data' CSV with a 'label' column, plus a pickled model ('file') or the
+    'model_id' of a registered model; without a model, a 'prediction' column is used
+    and the SHAP stage is skipped. Optional 'stages': a comma-separated subset of
+    dataset, fairness, model, shap and mitigation (default from metrics.yaml).
+    The upload is parsed once, the model unpickled once and its predictions and group
+    confusion counts shared by all stages; independent stages run concurrently.
+    """
+    selected = [stage.strip() for stage in stages.split(",") if stage.strip()] if stages else None
+    unknown = [stage for stage in selected or [] if stage not in AUDIT_STAGES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=f"Unknown audit stage '{unknown[0]}'. Expected any of: {', '.join(AUDIT_STAGES)}."))
+    try:
+        model, model_key = (None, None)
+        if file is not None or model_id:
+            model, model_key = await resolve_model_with_hash(file, model_id)
+        content = await read_upload(data)
+        dataset_hash = content_hash(content)
+        df = read_csv_upload(content)
+        del content
+        require_columns(df, DATASET_COLUMNS)
+        options = dict(stages=selected, dataset_hash=dataset_hash, model_hash=model_key)
+        if background:
+            return submit_job("audit", audit_and_store, df, model, **options)
+        report = await run_stage(audit_and_store, df, model, wait=False, **options)
+        if "error" in report:
+            raise ValueError(report["error"])
+        logger.info("Audit completed in %.2fs and report stored.", report["timings"]["total"])
+        return consistent_response(True, data={"audit": report})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in /audit: %s", str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
+@app.post("/monitor/{stream}/events", dependencies=[Depends(verify_api_key)])
+async def endpoint_monitor_ingest(stream: str, request: Request):
+    """
+    Ingests a batch of live predictions as NDJSON, one event per line:
+    {"label": ..., "prediction": ..., "sensitive": ..., "timestamp": ...}
+    The timestamp (epoch seconds or ISO 8601) defaults to the time of arrival.
+    Returns the accepted, late and rejected events and any alerts the batch raised.
+    """
+    try:
+        body = await request.body()
+        lines = body.decode("utf-8").splitlines()
+        result = await run_stage(monitors.ingest, stream, lines)
+        if result["alerts"]:
+            logger.warning("Stream %s raised %d fairness alert(s).", stream, len(result["alerts"]))
+        return consistent_response(True, data=result)
+    except Exception as e:
+        logger.error("Error in /monitor/%s/events: %s", stream, str(e))
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+
+@app.get("/monitor/{stream}", dependencies=[Depends(verify_api_key)])
+def endpoint_monitor_status(stream: str):
+    """
+    Returns the sliding-window and tumbling-window fairness metrics of a stream and its alerts.
+    """
+    try:
+        monitor = monitors.get(stream, create=False)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=consistent_response(False, error=f"Unknown stream: {stream}"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=consistent_response(False, error=str(e)))
+    return consistent_response(True, data={"monitor": monitor.status()})
+
+@app.get("/artifacts/{artifact_id}", dependencies=[Depends(verify_api_key)])
+def endpoint_download_artifact(artifact_id: str):
+    """
+    Streams a stored artifact (e.g. a mitigated dataset) in chunks.
+    """
+    try:
+        path, fmt = artifact_path(artifact_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=consistent_response(False, error=f"Unknown artifact id: {artifact_id}"))
+    extension, media_type = ARTIFACT_FORMATS[fmt]
+    headers = {
+        "Content-Disposition": f'attachment; filename="{artifact_id}{extension}"',
+        "Content-Length": str(os.path.getsize(path))
+    }
+    return StreamingResponse(iter_artifact(path), media_type=media_type, headers=headers)
+
+@app.get("/jobs", dependencies=[Depends(verify_api_key)])
+def endpoint_job_stats():
+    return consistent_response(True, data={"jobs": job_manager.stats()})
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+def endpoint_job_status(job_id: str):
+    """
+    Returns the status of a background job: queued, running, succeeded, failed or cancelled.
+    """
+    try:
+        return consistent_response(True, data={"job": job_manager.get(job_id)})
+    except KeyError:
+        raise HTTPException(status_code=404, detail=consistent_response(False, error=f"Unknown job id: {job_id}"))
+
+@app.get("/jobs/{job_id}/result", dependencies=[Depends(verify_api_key)])
+def endpoint_job_result(job_id: str):
+    """
+    Returns the result of a finished job in the same shape as the synchronous endpoint.
+    Responds with 409 while the job is still queued or running, or if it was cancelled.
+    """
+    try:
+        job, result = job_manager.result(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=consistent_response(False, error=f"Unknown job id: {job_id}"))
+    if job["status"] == "failed":
+        logger.error("Job %s failed: %s", job_id, job["error"])
+        raise HTTPException(status_code=400, detail=consistent_response(False, data={"job": job}, error=job["error"]))
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=consistent_response(False, data={"job": job}, error=f"Job is {job['status']}."))
+    key = JOB_RESULT_KEYS.get(job["kind"])
+    data = dict(result) if key is None else {key: result}
+    data["job"] = job
+    return consistent_response(True, data=data)
+
+@app.delete("/jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+def endpoint_cancel_job(job_id: str):
+    """
+    Cancels a background job. A queued job never runs; a running job finishes in its
+    worker but its result is discarded.
+    """
+    try:
+        job = job_manager.cancel(job_id)
+        logger.info("Job %s cancelled.", job_id)
+        return consistent_response(True, data={"job": job})
+    except KeyError:
+        raise HTTPException(status_code=404, detail=consistent_response(False, error=f"Unknown job id: {job_id}"))
@@ -1,30 +1,76 @@
 import pandas as pd
-from io import StringIO
 import numpy as np
 from .bias_detector import adversarial_debias
+from .ingestion import as_frame
+from .artifact_store import store_frame, store_weights
+from .reweighing import compute_reweighing, sensitive_columns, REWEIGHING_METHODS
+from .settings import get_setting
 
-def mitigate_bias(content: bytes):
+# Output modes of mitigate_bias: an inline CSV string or an artifact on disk.
+OUTPUT_FORMATS = ("csv", "parquet", "arrow", "weights")
+
+def mitigate_bias(data, output=None, method=None, register_model=False, adversarial=None):
     """
     Mitigate bias in a dataset by applying reweighting and adversarial debiasing.
-    Expects a CSV with a 'label' column.
+    Expects CSV bytes or a parsed DataFrame with a 'label' column.
+    The weight columns are added to the given frame in place.
+
+    `method` selects the reweighting scheme ("inverse_frequency" or "kamiran_calders",
+    default mitigation.reweighting.method); its weights and the label disparity across
+    sensitive groups before and after reweighting are returned under 'reweighing'.
+
+    Adversarial debiasing is opt-in, since training dominates the cost of a call: with
+    adversarial=True (default mitigation.adversarial_debiasing.enabled) or
+    register_model=True and sensitive columns present, a debiased classifier is trained
+    and its predictions are added as the 'adversarial_prediction' and 'adversarial_score'
+    columns; its training report is returned under 'adversarial_debiasing'. With
+    register_model=True the trained model is also stored in the model registry and the
+    report carries its model_id.
+
+    With output="csv" (the default from metrics.yaml) the mitigated dataset is returned
+    inline as a CSV string. "parquet" and "arrow" write it to the artifact store, and
+    "weights" stores only the weight columns in input row order; those modes return
+    an artifact handle instead of the data.
     """
+    output = output or get_setting("mitigation", "output_format", default="csv")
+    if output not in OUTPUT_FORMATS:
+        return {"error": f"Unknown output format '{output}'. Expected one of: {', '.join(OUTPUT_FORMATS)}."}
+    reweighting = get_setting("mitigation", "reweighting", default={}) or {}
+    method = method or reweighting.get("method", "inverse_frequency")
+    if method not in REWEIGHING_METHODS:
+        return {"error": f"Unknown reweighting method '{method}'. Expected one of: {', '.join(REWEIGHING_METHODS)}."}
+
     try:
-        data_str = content.decode("utf-8")
-        df = pd.read_csv(StringIO(data_str))
+        df = as_frame(data)
     except Exception as e:
         return {"error": f"Failed to parse CSV for mitigation: {str(e)}"}
     
     if 'label' not in df.columns:
         return {"error": "Dataset must include a 'label' column for mitigation."}
     
-    # Simple reweighting based on label frequencies
-    counts = df['label'].value_counts().to_dict()
-    max_count = max(counts.values())
-    df['sample_weight'] = df['label'].apply(lambda x: max_count / counts[x])
+    # Reweighting from the joint (sensitive group, label) counts
+    report = None
+    if reweighting.get("enabled", True):
+        df['sample_weight'], report = compute_reweighing(df, method=method)
     
-    # Applying adversarial debiasing simulation if a sensitive attribute is available
-    if 'sensitive' in df.columns:
-        df = adversarial_debias(df, 'sensitive', 'label')
+    # Adversarial debiasing against the sensitive attributes, when requested and available
+    if adversarial is None:
+        adversarial = get_setting("mitigation", "adversarial_debiasing", "enabled", default=False)
+    adversarial_report = None
+    columns = sensitive_columns(df)
+    if columns and (adversarial or register_model):
+        df, adversarial_report = adversarial_debias(df, columns, 'label', register=register_model)
     
-    mitigated_csv = df.to_csv(index=False)
-    return {"mitigated_dataset": mitigated_csv}
+    if output == "csv":
+        mitigated_csv = df.to_csv(index=False)
+        result = {"mitigated_dataset": mitigated_csv}
+    elif output == "weights":
+        weight_columns = [col for col in ("sample_weight", "adversarial_score") if col in df.columns]
+        result = {"artifact": store_weights(df, weight_columns)}
+    else:
+        result = {"artifact": store_frame(df, output)}
+    if report is not None:
+        result["reweighing"] = report
+    if adversarial_report is not None:
+        result["adversarial_debiasing"] = adversarial_report
+    return result
@@ -0,0 +1,154 @@
+import os
+import io
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from .instrumentation import span
+from .settings import BASE_DIR, get_setting
+
+
+def _storage_dir():
+    return os.path.join(BASE_DIR, get_setting("model_registry", "storage_dir", default="model_store"))
+
+
+def model_hash(content: bytes):
+    """
+    Content hash of a serialized model; used as its registry ID.
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class ModelCache:
+    """
+    In-process LRU cache of deserialized models.
+    Entries are sized by their serialized byte length, and the least recently
+    used models are evicted once the total exceeds `budget_bytes`.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model_id: str):
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(model_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, model_id: str, model, size: int):
+        with self._lock:
+            if model_id in self._entries:
+                self._entries.move_to_end(model_id)
+                return
+            self._entries[model_id] = (model, size)
+            # Always keep the newest entry, even if it alone exceeds the budget.
+            while len(self._entries) > 1 and self.used_bytes() > self.budget_bytes:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def used_bytes(self):
+        return sum(size for _, size in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "used_bytes": self.used_bytes(),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None
+            }
+
+
+model_cache = ModelCache(int(get_setting("model_registry", "cache_budget_mb", default=1024)) * 1024 * 1024)
+
+
+def _deserialize(content: bytes):
+    import joblib
+    with span("unpickle"):
+        return joblib.load(io.BytesIO(content))
+
+
+def load_model_bytes(content: bytes, model_id=None):
+    """
+    Deserialize an uploaded model, reusing the cached object when the same bytes were seen before.
+    """
+    model_id = model_id or model_hash(content)
+    model = model_cache.get(model_id)
+    if model is None:
+        model = _deserialize(content)
+        model_cache.put(model_id, model, len(content))
+    return model
+
+
+def register_model(content: bytes):
+    """
+    Store a serialized model under its content hash and warm the cache with it.
+    Registering the same bytes twice returns the same ID without rewriting the file.
+    Raises ValueError if the bytes are not a loadable model.
+    """
+    if not content:
+        raise ValueError("Uploaded model file is empty.")
+    model_id = model_hash(content)
+    try:
+        model = load_model_bytes(content, model_id)
+    except Exception as e:
+        raise ValueError(f"Failed to load model: {str(e)}") from e
+
+    directory = _storage_dir()
+    path = os.path.join(directory, f"{model_id}.joblib")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial model.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return {"model_id": model_id, "size_bytes": len(content), "model_type": type(model).__name__}
+
+
+def get_model(model_id: str):
+    """
+    Return the deserialized model registered under `model_id`, loading it from the
+    registry directory on a cache miss. Raises KeyError for unknown IDs.
+    """
+    model = model_cache.get(model_id)
+    if model is not None:
+        return model
+    # IDs are hex digests; reject anything else before touching the filesystem.
+    if len(model_id) != 64 or any(c not in "0123456789abcdef" for c in model_id):
+        raise KeyError(model_id)
+    path = os.path.join(_storage_dir(), f"{model_id}.joblib")
+    if not os.path.exists(path):
+        raise KeyError(model_id)
+    import joblib
+    with span("unpickle"):
+        model = joblib.load(path)
+    model_cache.put(model_id, model, os.path.getsize(path))
+    return model
+
+
+def as_model(model):
+    """
+    Return a deserialized model from either serialized bytes or an already loaded object.
+    Lets the analysis functions accept an upload or a registry model.
+    """
+    if isinstance(model, (bytes, bytearray)):
+        return load_model_bytes(bytes(model))
+    return model
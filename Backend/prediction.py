@@ -0,0 +1,83 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from .instrumentation import span
+from .model_registry import ModelCache
+from .settings import get_setting
+
+# Per-worker model, set once by _init_worker so it is unpickled once per process.
+_worker_model = None
+
+
+def _prediction_settings():
+    config = get_setting("model_evaluation", default={}) or {}
+    return {
+        "chunk_size": int(config.get("chunk_size", 100000)),
+        "n_jobs": config.get("n_jobs") or 1,
+    }
+
+
+# Predictions keyed by (model hash, dataset hash), sized by their array size.
+prediction_cache = ModelCache(int(get_setting("model_evaluation", "cache_budget_mb", default=256)) * 1024 * 1024)
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _predict_chunk(method, X):
+    return np.asarray(getattr(_worker_model, method)(X))
+
+
+def predict_in_chunks(model, X, chunk_size=None, n_jobs=None, method="predict"):
+    """
+    model.predict (or another row-wise `method` such as predict_proba) over the rows
+    of X in chunks of model_evaluation.chunk_size rows.
+    With several chunks and n_jobs > 1 the chunks are spread over a spawned process
+    pool; at most two chunks per worker are in flight, so memory stays bounded by the
+    chunk size rather than the dataset size. n_jobs defaults to model_evaluation.n_jobs,
+    which is unset (in-process) so server requests do not each start a pool.
+    """
+    settings = _prediction_settings()
+    chunk_size = chunk_size or settings["chunk_size"]
+    n_jobs = n_jobs or settings["n_jobs"]
+    bounds = [(start, min(start + chunk_size, len(X))) for start in range(0, len(X), chunk_size)]
+    predict = getattr(model, method)
+    if not bounds:
+        return np.asarray(predict(X))
+    if n_jobs <= 1 or len(bounds) <= 1:
+        return np.concatenate([np.asarray(predict(X[start:end])) for start, end in bounds])
+
+    n_workers = min(n_jobs, len(bounds))
+    results = [None] * len(bounds)
+    # Spawned like the job pool: forking from a request thread copies the other threads' locks.
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(model,)) as pool:
+        in_flight = {}
+        for i, (start, end) in enumerate(bounds):
+            if len(in_flight) >= 2 * n_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[in_flight.pop(future)] = future.result()
+            in_flight[pool.submit(_predict_chunk, method, X[start:end])] = i
+        for future, i in in_flight.items():
+            results[i] = future.result()
+    return np.concatenate(results)
+
+
+def cached_predictions(model, X, model_hash=None, dataset_hash=None, method="predict", **kwargs):
+    """
+    predict_in_chunks, cached by (model hash, dataset hash, method) when both hashes
+    are known. Returns (predictions, cached).
+    """
+    key = (model_hash, dataset_hash, method) if model_hash and dataset_hash else None
+    if key is not None:
+        predictions = prediction_cache.get(key)
+        if predictions is not None:
+            return predictions, True
+    with span("predict"):
+        predictions = predict_in_chunks(model, X, method=method, **kwargs)
+    if key is not None:
+        prediction_cache.put(key, predictions, predictions.nbytes)
+    return predictions, False
@@ -1,59 +1,320 @@
-import joblib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-from io import StringIO
+from .ingestion import as_frame, feature_columns
+from .model_registry import as_model
+from .settings import get_setting
 
-def evaluate_differential_privacy(noise_multiplier=1.1, batch_size=64, dataset_size=10000, epochs=10):
+# Integer Renyi orders searched when converting RDP to (epsilon, delta):
+# dense where the optimum usually lies, sparse for very small epsilons.
+RDP_ORDERS = np.concatenate([np.arange(2, 65), [80, 96, 128, 192, 256]]).astype(float)
+
+def dp_defaults():
+    config = get_setting("privacy", "differential_privacy", default={}) or {}
+    return {
+        "noise_multiplier": float(config.get("noise_multiplier", 1.1)),
+        "batch_size": int(config.get("batch_size", 64)),
+        "epochs": float(config.get("epochs", 10)),
+        # YAML reads "1e-5" as a string, so it is converted explicitly.
+        "delta": float(config.get("delta", 1e-5)),
+    }
+
+def compute_rdp_sgm(q, noise_multiplier, orders=RDP_ORDERS):
     """
-    Evaluate differential privacy parameters using TensorFlow Privacy.
-    Computes epsilon using the DP-SGD accountant.
+    Renyi DP of one step of the sampled Gaussian mechanism (Mironov et al., 2019)
+    at integer orders, for arrays of sampling rates and noise multipliers.
+    Uses the binomial expansion
+      A_a = sum_k C(a, k) (1 - q)^(a - k) q^k exp((k^2 - k) / (2 sigma^2))
+    evaluated in log space, all parameter sets and orders at once.
+    Returns an array of shape (len(q), len(orders)).
     """
-    try:
-        from tensorflow_privacy.privacy.analysis import compute_dp_sgd_privacy
-    except ImportError as e:
-        return {"error": f"TensorFlow Privacy not installed: {str(e)}"}
+    from scipy.special import gammaln, logsumexp
+    
+    q = np.atleast_1d(np.asarray(q, dtype=float))
+    sigma = np.atleast_1d(np.asarray(noise_multiplier, dtype=float))
+    alpha = np.asarray(orders, dtype=float)
+    k = np.arange(int(alpha.max()) + 1, dtype=float)
+    
+    # log C(a, k), with -inf for k > a so those terms vanish in the sum.
+    with np.errstate(invalid="ignore"):
+        log_binom = gammaln(alpha[:, None] + 1) - gammaln(k + 1) - gammaln(np.maximum(alpha[:, None] - k, 0) + 1)
+    log_binom = np.where(k <= alpha[:, None], log_binom, -np.inf)
+    
+    # log term = log C(a, k) + a log(1 - q) + k (log q - log(1 - q)) + (k^2 - k) / (2 sigma^2)
+    q_inner = np.clip(q, 1e-300, 1 - 1e-16)
+    log_1mq = np.log1p(-q_inner)
+    slope = np.log(q_inner) - log_1mq
+    with np.errstate(divide="ignore", invalid="ignore"):
+        curvature = 1.0 / (2 * sigma ** 2)
+        log_terms = (log_binom[None, :, :]
+                     + (alpha[None, :] * log_1mq[:, None])[:, :, None]
+                     + (slope[:, None] * k[None, :] + curvature[:, None] * (k * k - k)[None, :])[:, None, :])
+        rdp = logsumexp(log_terms, axis=2) / (alpha - 1)
     
-    epsilon, _ = compute_dp_sgd_privacy(
-        dataset_size, batch_size, noise_multiplier, epochs, delta=1e-5
+    # Closed forms for the degenerate cases.
+    rdp = np.where(q[:, None] >= 1.0, alpha[None, :] * curvature[:, None], rdp)
+    rdp = np.where(q[:, None] <= 0.0, 0.0, rdp)
+    return np.where(sigma[:, None] > 0, rdp, np.inf)
+
+def rdp_to_epsilon(rdp, delta, orders=RDP_ORDERS):
+    """
+    Convert accumulated RDP to epsilon at the given delta, minimizing over orders
+    (with the tighter conversion of Balle et al., 2020). Works row-wise on arrays.
+    """
+    orders = np.asarray(orders, dtype=float)
+    eps = rdp - (np.log(delta) + np.log(orders)) / (orders - 1) + np.log((orders - 1) / orders)
+    return np.maximum(np.min(eps, axis=-1), 0.0)
+
+def compute_epsilon_grid(noise_multipliers, batch_sizes, dataset_sizes, epochs, delta):
+    """
+    Epsilon of DP-SGD for every combination of the given parameter values in one
+    vectorized RDP computation. Steps are ceil(epochs * dataset_size / batch_size)
+    and the sampling rate is batch_size / dataset_size, as in TensorFlow Privacy's
+    compute_dp_sgd_privacy. Returns a list of dicts, one per combination.
+    """
+    grid = np.array(np.meshgrid(noise_multipliers, batch_sizes, dataset_sizes, epochs, indexing="ij"),
+                    dtype=float).reshape(4, -1)
+    sigma, batch, n, n_epochs = grid
+    q = batch / n
+    steps = np.ceil(n_epochs * n / batch)
+    epsilons = np.empty(len(q))
+    # Bound the (params x orders x terms) tensor by evaluating the grid in blocks.
+    block = 64
+    for start in range(0, len(q), block):
+        rdp = compute_rdp_sgm(q[start:start + block], sigma[start:start + block]) * steps[start:start + block, None]
+        epsilons[start:start + block] = rdp_to_epsilon(rdp, delta)
+    return [
+        {"noise_multiplier": float(s), "batch_size": int(b), "dataset_size": int(d), "epochs": float(e),
+         "epsilon": float(eps) if np.isfinite(eps) else None}
+        for s, b, d, e, eps in zip(sigma, batch, n, n_epochs, epsilons)
+    ]
+
+@lru_cache(maxsize=1024)
+def _epsilon(noise_multiplier, batch_size, dataset_size, epochs, delta):
+    return compute_epsilon_grid([noise_multiplier], [batch_size], [dataset_size], [epochs], delta)[0]["epsilon"]
+
+def evaluate_differential_privacy(noise_multiplier=None, batch_size=None, dataset_size=10000, epochs=None, delta=None):
+    """
+    Evaluate differential privacy parameters with the built-in RDP accountant.
+    Computes epsilon of DP-SGD (sampled Gaussian mechanism); missing parameters
+    default to the privacy.differential_privacy section of metrics.yaml. Results
+    are memoized on (noise_multiplier, batch_size, dataset_size, epochs, delta).
+    """
+    defaults = dp_defaults()
+    return _epsilon(
+        float(defaults["noise_multiplier"] if noise_multiplier is None else noise_multiplier),
+        int(defaults["batch_size"] if batch_size is None else batch_size),
+        int(dataset_size),
+        float(defaults["epochs"] if epochs is None else epochs),
+        float(defaults["delta"] if delta is None else delta)
     )
-    return epsilon
 
-def perform_privacy_tests(model_content: bytes, train_content: bytes):
+def _mia_settings():
+    config = get_setting("privacy", "membership_inference", default={}) or {}
+    return {
+        "n_shadow_models": int(config.get("n_shadow_models", 4)),
+        "shadow_size": int(config.get("shadow_size", 5000)),
+        "chunk_size": int(config.get("chunk_size", 50000)),
+        "sample_size": config.get("sample_size"),
+        "noise_std": float(config.get("noise_std", 0.1)),
+        "n_jobs": config.get("n_jobs") or 1,
+    }
+
+def _model_input(model, X, feature_names):
+    if getattr(model, "feature_names_in_", None) is not None:
+        return pd.DataFrame(X, columns=feature_names)
+    return X
+
+def _attack_features(model, proba, y):
+    """
+    Vectorized attack features from a model's output: top confidence, confidence in
+    the true label (0 when the model never saw that class) and prediction entropy.
+    """
+    classes = pd.Index(getattr(model, "classes_", np.arange(proba.shape[1])))
+    idx = classes.get_indexer(y)
+    true_conf = np.where(idx >= 0, proba[np.arange(len(proba)), np.maximum(idx, 0)], 0.0)
+    entropy = -(proba * np.log(np.clip(proba, 1e-12, 1.0))).sum(axis=1)
+    return np.column_stack([proba.max(axis=1), true_conf, entropy])
+
+def _split(X, y, size, seed):
+    """
+    Stratified subsample of `size` rows split in two halves (shadow members / non-members).
+    Falls back to a plain random split when a class is too rare to stratify.
+    """
+    from sklearn.model_selection import train_test_split
+    
+    size = min(size, len(X))
+    try:
+        if size < len(X):
+            X, _, y, _ = train_test_split(X, y, train_size=size, stratify=y, random_state=seed)
+        return train_test_split(X, y, test_size=0.5, stratify=y, random_state=seed)
+    except ValueError:
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(X))[:size]
+        half = size // 2
+        return X[order[:half]], X[order[half:]], y[order[:half]], y[order[half:]]
+
+def _train_shadow(args):
     """
-    The privacy test that performs a basic membership inference attack and
+    Train one shadow model on its member rows and return its labelled attack
+    training set. Runs in a worker process.
+    """
+    from sklearn.base import clone
+    
+    template, X_in, X_out, y_in, y_out, feature_names = args
+    shadow = clone(template)
+    shadow.fit(_model_input(template, X_in, feature_names), y_in)
+    features = np.vstack([
+        _attack_features(shadow, shadow.predict_proba(_model_input(template, X_in, feature_names)), y_in),
+        _attack_features(shadow, shadow.predict_proba(_model_input(template, X_out, feature_names)), y_out),
+    ])
+    membership = np.concatenate([np.ones(len(X_in)), np.zeros(len(X_out))])
+    return features, membership
+
+def _chunked_attack(model, attack, X, y, feature_names, chunk_size, noise_std=None, seed=0):
+    """
+    Fraction of rows the attack flags as members, scoring the target model in
+    fixed-size chunks so memory does not grow with the dataset. With `noise_std`,
+    each chunk is perturbed with Gaussian noise first (synthetic non-members).
+    """
+    rng = np.random.default_rng(seed)
+    flagged = 0
+    for start in range(0, len(X), chunk_size):
+        chunk = X[start:start + chunk_size]
+        if noise_std:
+            chunk = chunk + rng.normal(0, noise_std, size=chunk.shape)
+        proba = model.predict_proba(_model_input(model, chunk, feature_names))
+        flagged += int(attack.predict(_attack_features(model, proba, y[start:start + chunk_size])).sum())
+    return flagged / len(X) if len(X) else float("nan")
+
+def shadow_model_attack(model, train_df, holdout_df=None, n_shadow_models=None, sample_size=None, n_jobs=None):
+    """
+    Shadow-model membership inference attack (Shokri et al.).
+    Clones of the target model are trained (in a process pool with n_jobs > 1) on
+    stratified subsamples of the labelled data, half of each subsample used as
+    members. An attack classifier is fitted on the shadow models' vectorized outputs
+    and then applied to the target model in fixed-size chunks: training rows are the
+    members, and `holdout_df` rows (or noise-perturbed training rows) the non-members.
+    `sample_size` limits the rows used on both sides for a fast estimate.
+    """
+    from sklearn.base import clone
+    from sklearn.linear_model import LogisticRegression
+    
+    settings = _mia_settings()
+    n_shadow_models = n_shadow_models or settings["n_shadow_models"]
+    sample_size = sample_size or settings["sample_size"]
+    n_jobs = n_jobs or settings["n_jobs"]
+    
+    if 'label' not in train_df.columns:
+        return {"error": "Training CSV must include a 'label' column for the shadow-model attack."}
+    features = feature_columns(train_df, model)
+    X = train_df[features].to_numpy(dtype=float)
+    y = train_df['label'].to_numpy()
+    if sample_size and len(X) > int(sample_size):
+        keep = np.random.default_rng(0).choice(len(X), size=int(sample_size), replace=False)
+        X, y = X[keep], y[keep]
+    try:
+        clone(model)
+    except Exception as e:
+        return {"error": f"Shadow models require a scikit-learn compatible estimator: {str(e)}"}
+    
+    # Subsample in the parent so each worker receives only its own shadow_size rows.
+    tasks = [(model, *_split(X, y, settings["shadow_size"], seed), features) for seed in range(n_shadow_models)]
+    if n_jobs > 1 and n_shadow_models > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, n_shadow_models),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            shadow_sets = list(pool.map(_train_shadow, tasks))
+    else:
+        shadow_sets = [_train_shadow(task) for task in tasks]
+    attack = LogisticRegression(max_iter=1000)
+    attack.fit(np.vstack([f for f, _ in shadow_sets]), np.concatenate([m for _, m in shadow_sets]))
+    
+    member_rate = _chunked_attack(model, attack, X, y, features, settings["chunk_size"])
+    if holdout_df is not None:
+        X_out = holdout_df[features].to_numpy(dtype=float)
+        y_out = holdout_df['label'].to_numpy()
+        if sample_size and len(X_out) > int(sample_size):
+            keep = np.random.default_rng(1).choice(len(X_out), size=int(sample_size), replace=False)
+            X_out, y_out = X_out[keep], y_out[keep]
+        non_member_rate = _chunked_attack(model, attack, X_out, y_out, features, settings["chunk_size"])
+    else:
+        non_member_rate = _chunked_attack(model, attack, X, y, features, settings["chunk_size"],
+                                          noise_std=settings["noise_std"], seed=1)
+    
+    return {
+        "attack": "shadow_model",
+        "membership_inference_attack_accuracy": 0.5 * (member_rate + (1 - non_member_rate)),
+        "member_true_positive_rate": member_rate,
+        "non_member_false_positive_rate": non_member_rate,
+        "attack_advantage": member_rate - non_member_rate,
+        "n_shadow_models": n_shadow_models,
+        "rows_evaluated": int(len(X)),
+        "non_members": "holdout" if holdout_df is not None else "synthetic"
+    }
+
+def perform_privacy_tests(model_content, train_content, attack="threshold", holdout_content=None,
+                          n_shadow_models=None, sample_size=None):
+    """
+    The privacy test that performs a membership inference attack and
     estimates differential privacy parameters.
     
     Expects:
-      - model_content: a pickled model file.
-      - train_content: a CSV file containing training data.
+      - model_content: a pickled model file or a loaded model from the registry.
+      - train_content: a CSV file (or parsed DataFrame) containing training data.
+      - attack: "threshold" for the basic confidence-threshold attack or
+        "shadow" for the shadow-model attack (see shadow_model_attack).
+      - holdout_content: optional non-member CSV used by the shadow-model attack.
+      - sample_size: optional number of training rows to evaluate, for fast estimates.
     """
     try:
-        model = joblib.loads(model_content)
+        model = as_model(model_content)
     except Exception as e:
         return {"error": f"Failed to load model for privacy test: {str(e)}"}
     
     try:
-        data_str = train_content.decode("utf-8")
-        train_df = pd.read_csv(StringIO(data_str))
+        train_df = as_frame(train_content)
+        holdout_df = as_frame(holdout_content) if holdout_content is not None else None
     except Exception as e:
         return {"error": f"Failed to parse training CSV: {str(e)}"}
     
-    if 'label' in train_df.columns:
-        X_train = train_df.drop(columns=['label'])
-    else:
-        X_train = train_df.copy()
+    if not hasattr(model, "predict_proba"):
+        return {"error": "Model does not support predict_proba."}
     
+    settings = _mia_settings()
+    sample_size = sample_size or settings["sample_size"]
+    epsilon = evaluate_differential_privacy(dataset_size=len(train_df))
+    
+    if attack == "shadow":
+        result = shadow_model_attack(model, train_df, holdout_df, n_shadow_models=n_shadow_models,
+                                     sample_size=sample_size)
+        if "error" not in result:
+            result["differential_privacy_epsilon"] = epsilon
+            result["note"] = "Attack accuracy near 0.5 and a small attack advantage indicate better privacy protection."
+        return result
+    
+    features = feature_columns(train_df, model)
+    X_train = train_df[features].to_numpy(dtype=float)
+    if sample_size and len(X_train) > int(sample_size):
+        X_train = X_train[np.random.default_rng(0).choice(len(X_train), size=int(sample_size), replace=False)]
+    
+    # Score members and their noisy copies chunk by chunk; only confidences are kept.
+    rng = np.random.default_rng(0)
+    train_confidences = []
+    synthetic_confidences = []
     try:
-        train_probs = model.predict_proba(X_train)
-        train_confidences = np.max(train_probs, axis=1)
+        for start in range(0, len(X_train), settings["chunk_size"]):
+            chunk = X_train[start:start + settings["chunk_size"]]
+            train_probs = model.predict_proba(_model_input(model, chunk, features))
+            train_confidences.append(np.max(train_probs, axis=1))
+            noisy = chunk + rng.normal(0, settings["noise_std"], size=chunk.shape)
+            synthetic_probs = model.predict_proba(_model_input(model, noisy, features))
+            synthetic_confidences.append(np.max(synthetic_probs, axis=1))
     except Exception as e:
         return {"error": f"Model does not support predict_proba: {str(e)}"}
-    
-    synthetic_data = X_train.copy()
-    synthetic_data = synthetic_data.apply(lambda col: col + np.random.normal(0, 0.1, size=len(col)))
-    
-    synthetic_probs = model.predict_proba(synthetic_data)
-    synthetic_confidences = np.max(synthetic_probs, axis=1)
+    train_confidences = np.concatenate(train_confidences)
+    synthetic_confidences = np.concatenate(synthetic_confidences)
     
     threshold = np.mean(synthetic_confidences)
     
@@ -64,14 +325,6 @@ def perform_privacy_tests(model_content: bytes, train_content: bytes):
     non_member_accuracy = np.mean(non_member_predictions == 0)
     attack_accuracy = 0.5 * (train_accuracy + non_member_accuracy)
     
-    # Use TensorFlow Privacy to compute epsilon
-    epsilon = evaluate_differential_privacy(
-        noise_multiplier=1.1,
-        batch_size=64,
-        dataset_size=len(X_train),
-        epochs=10
-    )
-    
     return {
         "membership_inference_attack_accuracy": attack_accuracy,
         "threshold": threshold,
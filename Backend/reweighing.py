@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from .group_metrics import encode_groups, positive_index, gap, to_python, _safe_divide
+from .ingestion import SENSITIVE_PREFIX
+from .settings import get_setting
+
+REWEIGHING_METHODS = ("inverse_frequency", "kamiran_calders")
+
+
+def sensitive_columns(df):
+    """
+    The sensitive attribute columns of a frame: 'sensitive' and any 'sensitive_*' column.
+    """
+    return [col for col in df.columns if str(col).startswith(SENSITIVE_PREFIX)]
+
+
+def group_codes(df, columns):
+    """
+    Integer-code the intersection of `columns` (one code per observed combination).
+    Returns (codes, labels) with -1 for rows missing any of the columns; with no
+    columns every row belongs to a single group.
+    """
+    if not columns:
+        return np.zeros(len(df), dtype=np.int64), ["all"]
+    key = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    values, radices = [], []
+    for col in columns:
+        col_codes, col_values = encode_groups(df[col])
+        radix = max(len(col_values), 1)
+        valid &= col_codes >= 0
+        key = key * radix + col_codes
+        values.append(col_values)
+        radices.append(radix)
+    if np.prod(radices, dtype=float) >= 2 ** 62:
+        raise ValueError("Too many sensitive attribute combinations to encode.")
+
+    all_valid = valid.all()
+    valid_keys = key if all_valid else key[valid]
+    n_keys = int(np.prod(radices))
+    if n_keys <= max(len(df), 1 << 16):
+        # Small key space: find the observed keys with a bincount and remap them
+        # through a dense lookup table instead of hashing every row.
+        present = np.bincount(valid_keys, minlength=n_keys) > 0
+        observed = np.flatnonzero(present)
+        valid_codes = valid_keys if present.all() else (np.cumsum(present) - 1)[valid_keys]
+    else:
+        valid_codes, observed = pd.factorize(valid_keys, sort=True)
+    if all_valid:
+        codes = valid_codes.astype(np.int64, copy=False)
+    else:
+        codes = np.full(len(df), -1, dtype=np.int64)
+        codes[valid] = valid_codes
+
+    # Decode the observed keys back into per-column codes to label the groups.
+    parts = []
+    rest = np.asarray(observed, dtype=np.int64)
+    for radix in reversed(radices):
+        rest, col_codes = np.divmod(rest, radix)
+        parts.append(col_codes)
+    parts.reverse()
+    labels = ["-".join(str(col_values[c]) for col_values, c in zip(values, combo))
+              for combo in zip(*parts)]
+    return codes, labels
+
+
+def cell_codes(group, label, n_labels):
+    """
+    Flat (group, label) cell index per row, -1 where the group or label is missing.
+    """
+    cells = group.astype(np.int64) * n_labels + label
+    invalid = (group < 0) | (label < 0)
+    if invalid.any():
+        cells[invalid] = -1
+    return cells
+
+
+def joint_counts(cells, n_groups, n_labels):
+    """
+    The (group x label) count table, built in one np.bincount pass over the cell codes.
+    """
+    valid = cells[cells >= 0] if cells.size and cells.min() < 0 else cells
+    return np.bincount(valid, minlength=n_groups * n_labels).reshape(n_groups, n_labels)
+
+
+def weight_table(counts, method):
+    """
+    Per (group, label) weights from a joint count table.
+      - inverse_frequency: max label count / label count, the same for every group.
+      - kamiran_calders: expected / observed frequency of each (group, label) cell,
+        P(group) * P(label) / P(group, label), which makes label and group independent.
+    """
+    if method == "inverse_frequency":
+        label_counts = counts.sum(axis=0)
+        table = _safe_divide(label_counts.max(), label_counts)
+        return np.broadcast_to(table, counts.shape)
+    if method == "kamiran_calders":
+        n = counts.sum()
+        expected = np.outer(counts.sum(axis=1), counts.sum(axis=0)) / max(n, 1)
+        return _safe_divide(expected, counts)
+    raise ValueError(f"Unknown reweighting method '{method}'. Expected one of: {', '.join(REWEIGHING_METHODS)}.")
+
+
+def _label_disparity(counts, weights, pos, groups):
+    """
+    Weighted positive-label rate per group and its max-min gap (demographic parity of the labels).
+    """
+    weighted = np.where(counts > 0, counts * np.nan_to_num(weights), 0.0)
+    rates = _safe_divide(weighted[:, pos], weighted.sum(axis=1))
+    return {
+        "positive_rate": {group: to_python(rate) for group, rate in zip(groups, rates)},
+        "demographic_parity_difference": to_python(gap(rates)),
+    }
+
+
+def compute_reweighing(df, method=None, label_col="label", sensitive=None):
+    """
+    Sample weights for bias mitigation, computed from one grouped count table and a
+    vectorized gather over integer (group, label) codes; no per-row Python runs.
+    `sensitive` defaults to every sensitive column, whose intersections form the groups.
+    Rows with a missing label or sensitive value get weight 1.
+
+    Returns (weights, report) where the report gives the weight per (group, label)
+    cell and the label disparity across groups before and after reweighing.
+    """
+    method = method or get_setting("mitigation", "reweighting", "method", default="inverse_frequency")
+    columns = sensitive_columns(df) if sensitive is None else list(sensitive)
+
+    label, classes = encode_groups(df[label_col])
+    group, groups = group_codes(df, columns)
+    cells = cell_codes(group, label, len(classes))
+    counts = joint_counts(cells, len(groups), len(classes))
+    table = weight_table(counts, method)
+
+    # Gather each row's weight from the flattened table; missing cells map to weight 1.
+    lookup = np.append(np.ravel(table), 1.0)
+    weights = lookup[cells]
+
+    pos = positive_index(classes)
+    report = {
+        "method": method,
+        "sensitive_columns": columns,
+        "weights": {
+            str(g): {str(c): to_python(table[i, j]) for j, c in enumerate(classes) if counts[i, j] > 0}
+            for i, g in enumerate(groups)
+        },
+        "before": _label_disparity(counts, np.ones(counts.shape), pos, groups),
+        "after": _label_disparity(counts, table, pos, groups),
+    }
+    return weights, report
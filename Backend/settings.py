@@ -0,0 +1,28 @@
+import os
+from functools import lru_cache
+import yaml
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, "config", "metrics.yaml")
+
+
+@lru_cache(maxsize=None)
+def load_config(path: str = CONFIG_PATH):
+    """
+    Load and cache the YAML configuration (config/metrics.yaml by default).
+    """
+    with open(path, "r") as f:
+        return yaml.safe_load(f) or {}
+
+
+def get_setting(*keys, default=None):
+    """
+    Look up a nested configuration value, e.g. get_setting("privacy", "differential_privacy", "delta").
+    Returns `default` when any key along the path is missing.
+    """
+    node = load_config()
+    for key in keys:
+        if not isinstance(node, dict) or key not in node:
+            return default
+        node = node[key]
+    return node
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from backend import audit
+from backend.bias_detector import compute_fairness_metrics
+
+def _dataset(n=200):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x1": rng.normal(size=n), "x2": rng.normal(size=n)})
+    df["label"] = (df["x1"] + 0.5 * df["x2"] > 0).astype(int)
+    df["sensitive"] = np.where(rng.random(n) > 0.5, "a", "b")
+    return df
+
+def test_audit_shares_predictions_and_counts(monkeypatch):
+    df = _dataset()
+    model = LogisticRegression().fit(df[["x1", "x2"]], df["label"])
+    calls = []
+    original = audit._predictions
+    monkeypatch.setattr(audit, "_predictions", lambda *args: calls.append(1) or original(*args))
+
+    report = audit.run_audit(df, model, stages=["dataset", "fairness", "model"])
+    assert set(report["stages"]) == {"dataset", "fairness", "model"}
+    assert all(stage["status"] == "succeeded" for stage in report["stages"].values())
+    # Predictions are made once and shared by the fairness and model stages.
+    assert len(calls) == 1
+    assert {"predictions", "group_counts", "total"} <= set(report["timings"])
+
+    expected = compute_fairness_metrics(df.assign(prediction=model.predict(df[["x1", "x2"]])))
+    assert report["stages"]["fairness"]["result"]["group_accuracies"] == expected["group_accuracies"]
+    cm = np.array(report["stages"]["model"]["result"]["confusion_matrix"])
+    assert cm.sum() == len(df) and report["stages"]["dataset"]["result"]["class_counts"] == df["label"].value_counts().to_dict()
+    # The shared frame is not modified by the stages.
+    assert list(df.columns) == ["x1", "x2", "label", "sensitive"]
+
+def test_audit_skips_stages_without_inputs():
+    df = _dataset().drop(columns="sensitive")
+    report = audit.run_audit(df, None, stages=["fairness", "model", "shap"])
+    assert report["stages"]["shap"]["status"] == "skipped"
+    # Without a model or a 'prediction' column the count-based stages are skipped too.
+    assert report["stages"]["model"]["status"] == "skipped"
+    assert "error" in audit.run_audit(df, None, stages=["unknown"])
+
+def test_shap_only_audit_runs_only_shap(monkeypatch):
+    df = _dataset(50)
+    model = LogisticRegression().fit(df[["x1", "x2"]], df["label"])
+    monkeypatch.setattr(audit, "explain_shap_dataset", lambda model, frame, n_jobs=None: {"feature_importance": {}})
+    report = audit.run_audit(df, model, stages=["shap"])
+    # The model stage's node is not the 'model' input, so no predictions or counts are made.
+    assert set(report["stages"]) == {"shap"} and report["stages"]["shap"]["status"] == "succeeded"
+    assert set(report["timings"]) == {"shap", "total"}
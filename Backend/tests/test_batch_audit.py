@@ -0,0 +1,69 @@
+import json
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from backend import batch_audit
+
+def _write_pair(directory, n=200):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x1": rng.normal(size=n), "x2": rng.normal(size=n)})
+    df["label"] = (df["x1"] + 0.5 * df["x2"] > 0).astype(int)
+    df["sensitive"] = np.where(rng.random(n) > 0.5, "a", "b")
+    df.to_csv(directory / "data.csv", index=False)
+    for i, C in enumerate([1.0, 0.1]):
+        joblib.dump(LogisticRegression(C=C).fit(df[["x1", "x2"]], df["label"]), directory / f"model_{i}.joblib")
+
+def test_batch_audit_reuses_datasets_and_models(tmp_path):
+    _write_pair(tmp_path)
+    output = tmp_path / "results.json"
+    code = batch_audit.main(["--directory", str(tmp_path), "--output", str(output),
+                             "--tasks", "dataset", "fairness", "privacy", "--workers", "1"])
+    assert code == 0
+    results = json.loads(output.read_text())
+    assert results["summary"]["pairs"] == 2
+    rows = pd.DataFrame(results["tasks"])
+    # The dataset is parsed once for both models; each model is loaded once.
+    assert (rows["task"] == "load_dataset").sum() == 1
+    assert (rows["task"] == "load_model").sum() == 2
+    for task in ("dataset", "fairness", "privacy"):
+        done = rows[rows["task"] == task]
+        assert len(done) == 2 and (done["status"] == "succeeded").all()
+    assert (rows["seconds"] >= 0).all()
+
+def test_batch_audit_manifest_in_process_pool(tmp_path):
+    _write_pair(tmp_path)
+    manifest = tmp_path / "pairs.json"
+    manifest.write_text(json.dumps([
+        {"dataset": "data.csv", "model": "model_0.joblib", "tasks": ["fairness"]},
+        {"dataset": "data.csv", "tasks": "dataset"},
+        {"dataset": "missing.csv"},
+    ]))
+    pairs = batch_audit.read_manifest(str(manifest), ["dataset"])
+    rows = batch_audit.run_batch(pairs, max_workers=2)
+    by_task = {(row["model"] is not None, row["task"]): row for row in rows if row["dataset"].endswith("data.csv")}
+    assert by_task[(True, "fairness")]["status"] == "succeeded"
+    assert by_task[(False, "dataset")]["status"] == "succeeded"
+    failed = [row for row in rows if row["dataset"].endswith("missing.csv")]
+    assert failed[0]["task"] == "load_dataset" and failed[0]["status"] == "failed"
+
+def test_batch_audit_continues_after_a_failing_pair(tmp_path):
+    _write_pair(tmp_path)
+    # A string feature column makes the privacy tests raise for this dataset only.
+    pd.read_csv(tmp_path / "data.csv").assign(x2="x").to_csv(tmp_path / "notes.csv", index=False)
+    output = tmp_path / "results.json"
+    code = batch_audit.main(["--directory", str(tmp_path), "--output", str(output),
+                             "--tasks", "dataset", "privacy", "--workers", "2"])
+    assert code == 1
+    rows = pd.DataFrame(json.loads(output.read_text())["tasks"])
+    privacy = rows[rows["task"] == "privacy"].set_index(["dataset", "model"])["status"]
+    assert len(privacy) == 4
+    assert (privacy[[d.endswith("notes.csv") for d, _ in privacy.index]] == "failed").all()
+    assert (privacy[[d.endswith("data.csv") for d, _ in privacy.index]] == "succeeded").all()
+
+def test_run_batch_reports_a_crashed_work_item(monkeypatch):
+    def crash(*args):
+        raise RuntimeError("worker died")
+    monkeypatch.setattr(batch_audit, "audit_dataset", crash)
+    rows = batch_audit.run_batch([("a.csv", "m.joblib", ("dataset",))], max_workers=1)
+    assert rows == [batch_audit._row("a.csv", "m.joblib", "audit", "failed", 0.0, error="worker died")]
@@ -0,0 +1,23 @@
+from backend.benchmarks.suite import base_dataset, scaled_dataset, compare
+
+def test_scaled_dataset_has_synthetic_columns():
+    base = base_dataset("german_credit")
+    assert {"label", "sensitive", "sensitive_age"} <= set(base.columns)
+    assert set(base["sensitive"]) == {"male", "female"}
+    scaled = scaled_dataset(base, 10)
+    assert len(scaled) == 10 * len(base)
+    # The first copy is the original data; later copies are jittered.
+    assert scaled.iloc[:len(base)].equals(base)
+    assert not scaled["amount"].iloc[len(base):2 * len(base)].reset_index(drop=True).equals(base["amount"])
+    assert len(scaled_dataset(base, 0.1)) == 100
+
+def test_compare_flags_regressions():
+    row = {"dataset": "compas", "scale": 1, "case": "POST /audit", "seconds": 1.0, "peak_mb": 10.0, "status": "ok", "error": None}
+    assert compare([row], [row]) == []
+    slower = dict(row, seconds=1.5)
+    assert [r["metric"] for r in compare([slower], [row])] == ["seconds"]
+    # Differences below the noise floor are ignored.
+    fast = dict(row, seconds=0.001, peak_mb=0.1)
+    assert compare([dict(fast, seconds=0.004)], [fast]) == []
+    failed = dict(row, status="error", error="boom")
+    assert [r["metric"] for r in compare([failed], [row])] == ["status"]
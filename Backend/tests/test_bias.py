@@ -66,3 +66,173 @@ def test_analyze_model_bias_valid():
     result = analyze_model_bias(content)
     assert "confusion_matrix" in result
     assert "per_class_accuracy" in result
+
+def test_analysis_accepts_parsed_frame():
+    # The same parsed frame can be shared across analyses instead of re-parsing bytes.
+    from backend.ingestion import read_csv_upload
+    csv_data = "label,prediction,sensitive,extra\n0,0,0,a\n1,1,1,b\n0,0,0,c\n1,0,1,d\n"
+    df = read_csv_upload(csv_data.encode("utf-8"), columns=["label", "prediction", "sensitive"])
+    assert "extra" not in df.columns
+    assert str(df["sensitive"].dtype) == "category"
+    assert analyze_dataset_bias(df) == analyze_dataset_bias(csv_data.encode("utf-8"))
+    assert compute_fairness_metrics(df)["overall_accuracy"] == 0.75
+
+def test_analyze_dataset_bias_streaming_matches_batch():
+    # Chunked counting must produce the same summary as the in-memory analysis.
+    csv_data = "label,sensitive\n0,a\n1,b\n0,a\n1,a\n1,b\n"
+    content = csv_data.encode("utf-8")
+    from backend.bias_detector import analyze_dataset_bias_streaming
+    result = analyze_dataset_bias_streaming(content, chunksize=2)
+    expected = analyze_dataset_bias(content)
+    assert result["class_counts"] == expected["class_counts"]
+    assert result["imbalance_ratios"] == expected["imbalance_ratios"]
+    assert result["fairness_score"] == pytest.approx(expected["fairness_score"])
+    assert result["group_counts"] == {"a": {0: 2, 1: 1}, "b": {1: 2}}
+
+def test_compute_fairness_metrics_group_rates_and_thresholds():
+    # Group 'a': perfect predictions; group 'b': one false negative, one false positive.
+    csv_data = ("label,prediction,sensitive\n"
+                "1,1,a\n0,0,a\n1,1,a\n0,0,a\n"
+                "1,0,b\n0,1,b\n1,1,b\n0,0,b\n")
+    result = compute_fairness_metrics(csv_data.encode("utf-8"))
+    group_b = result["group_metrics"]["b"]
+    assert group_b["true_positive_rate"] == 0.5
+    assert group_b["false_positive_rate"] == 0.5
+    assert group_b["selection_rate"] == 0.5
+    assert result["gaps"]["demographic_parity_difference"] == 0.0
+    assert result["gaps"]["equalized_odds_difference"] == 0.5
+    assert result["threshold_checks"]["demographic_parity"]["passed"] is True
+    assert result["threshold_checks"]["equal_opportunity"]["passed"] is False
+    assert result["fairness_gap"] == 0.5
+
+def test_compute_intersectional_fairness_lattice_and_min_support():
+    rows = (["1,1,m,young"] * 3 + ["0,1,m,old"] * 3 +
+            ["1,0,f,young"] * 3 + ["0,0,f,old"] * 3 + ["1,1,f,mid"])
+    csv_data = "label,prediction,sensitive_gender,sensitive_age\n" + "\n".join(rows) + "\n"
+    result = compute_intersectional_fairness(csv_data.encode("utf-8"), min_support=2)
+    lattice = result["lattice"]
+    assert set(lattice) == {"sensitive_gender", "sensitive_age", "sensitive_gender+sensitive_age"}
+    # The single 'f-mid' row falls below the support cutoff.
+    assert lattice["sensitive_gender+sensitive_age"]["pruned_groups"] == 1
+    assert set(result["intersectional_group_accuracies"]) == {"m-young", "m-old", "f-young", "f-old"}
+    assert lattice["sensitive_gender"]["group_metrics"]["m"]["selection_rate"] == 1.0
+    assert lattice["sensitive_gender"]["group_metrics"]["f"]["count"] == 7
+    assert result["overall_accuracy"] == pytest.approx(7 / 13)
+
+def test_compute_intersectional_fairness_rejects_too_many_columns():
+    columns = [f"sensitive_{i}" for i in range(9)]
+    csv_data = "label,prediction," + ",".join(columns) + "\n" + "1,1," + ",".join(["a"] * 9) + "\n"
+    result = compute_intersectional_fairness(csv_data.encode("utf-8"))
+    assert "at most 8" in result["error"]
+
+def test_model_registry_caches_by_content_hash(tmp_path, monkeypatch):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.datasets import load_iris
+    from backend import model_registry
+    from backend.model_registry import ModelCache, register_model, get_model
+
+    monkeypatch.setattr(model_registry, "_storage_dir", lambda: str(tmp_path))
+    monkeypatch.setattr(model_registry, "model_cache", ModelCache(budget_bytes=10 ** 9))
+    iris = load_iris()
+    buffer = io.BytesIO()
+    joblib.dump(LogisticRegression(max_iter=200).fit(iris.data, iris.target), buffer)
+    content = buffer.getvalue()
+
+    info = register_model(content)
+    assert register_model(content)["model_id"] == info["model_id"]
+    model = get_model(info["model_id"])
+    assert "confusion_matrix" in analyze_model_bias(model)
+    # A fresh cache falls back to the stored file.
+    model_registry.model_cache.clear()
+    assert type(get_model(info["model_id"])) is type(model)
+    with pytest.raises(KeyError):
+        get_model("0" * 64)
+
+def test_model_cache_evicts_least_recently_used():
+    from backend.model_registry import ModelCache
+    cache = ModelCache(budget_bytes=100)
+    cache.put("a", "model-a", 60)
+    cache.put("b", "model-b", 30)
+    assert cache.get("a") == "model-a"
+    cache.put("c", "model-c", 30)
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+
+def test_analyze_model_bias_on_user_data_chunked_and_cached(monkeypatch):
+    from sklearn.linear_model import LogisticRegression
+    from backend import prediction
+    from backend.model_registry import ModelCache
+    monkeypatch.setattr(prediction, "prediction_cache", ModelCache(budget_bytes=10 ** 9))
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x1": rng.normal(size=500), "x2": rng.normal(size=500)})
+    df["label"] = (df["x1"] > 0).astype(int)
+    df["sensitive"] = np.where(rng.random(500) > 0.5, "a", "b")
+    model = LogisticRegression().fit(df[["x1", "x2"]], df["label"])
+
+    # Chunks spread over two worker processes give the same predictions as one call.
+    chunked = prediction.predict_in_chunks(model, df[["x1", "x2"]], chunk_size=64, n_jobs=2)
+    assert (chunked == model.predict(df[["x1", "x2"]])).all()
+
+    result = analyze_model_bias(model, df, model_hash="m", dataset_hash="d", chunk_size=128, n_jobs=1)
+    assert np.array(result["confusion_matrix"]).sum() == 500
+    assert set(result["group_metrics"]) == {"a", "b"}
+    assert result["per_class_accuracy"]["class_1"] > 0.9 and result["predictions_cached"] is False
+    # The same (model hash, dataset hash) reuses the cached predictions.
+    again = analyze_model_bias(model, df, model_hash="m", dataset_hash="d")
+    assert again["predictions_cached"] is True and again["confusion_matrix"] == result["confusion_matrix"]
+    assert "error" in analyze_model_bias(model, df.drop(columns="label"))
+
+def test_fairness_gap_bootstrap_intervals_from_count_tensor():
+    from backend.group_metrics import group_confusion_counts, bootstrap_intervals, bootstrap_counts
+    rng = np.random.default_rng(1)
+    groups = np.where(rng.random(2000) < 0.95, "large", "small")
+    y = rng.integers(0, 2, 2000)
+    pred = np.where(rng.random(2000) < 0.8, y, 1 - y)
+    counts = group_confusion_counts(y, pred, groups)
+
+    samples = bootstrap_counts(counts.counts, 50, rng=np.random.default_rng(0))
+    assert samples.shape == (50,) + counts.counts.shape
+    assert (samples.sum(axis=(1, 2, 3)) == 2000).all()
+
+    result = compute_fairness_metrics(pd.DataFrame({"label": y, "prediction": pred, "sensitive": groups}))
+    intervals = result["confidence_intervals"]
+    assert intervals["n_replicates"] == 10000 and intervals["confidence_level"] == 0.95
+    lo, hi = result["fairness_gap_interval"]
+    assert lo <= result["fairness_gap"] <= hi
+    # The small group's rates are far less certain than the large group's.
+    width = lambda bounds: bounds[1] - bounds[0]
+    group_intervals = intervals["group_metrics"]
+    assert width(group_intervals["small"]["accuracy"]) > 3 * width(group_intervals["large"]["accuracy"])
+    poisson = bootstrap_intervals(counts, n_replicates=2000, method="poisson")
+    assert poisson["gaps"]["accuracy_gap"][0] <= result["fairness_gap"] <= poisson["gaps"]["accuracy_gap"][1]
+
+def test_threshold_sweep_matches_rescoring_each_threshold():
+    from sklearn.linear_model import LogisticRegression
+    from backend.threshold_sweep import threshold_sweep
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"x1": rng.normal(size=400), "x2": rng.normal(size=400)})
+    df["sensitive"] = np.where(rng.random(400) > 0.3, "a", "b")
+    df["label"] = (df["x1"] + rng.normal(size=400) > 0).astype(int)
+    model = LogisticRegression().fit(df[["x1", "x2"]], df["label"])
+    scores = model.predict_proba(df[["x1", "x2"]])[:, 1]
+
+    result = threshold_sweep(model, df, max_points=0)
+    # Every distinct score plus one threshold that selects nobody.
+    assert len(result["thresholds"]) == len(np.unique(scores)) + 1
+    for i in range(0, len(result["thresholds"]), 37):
+        t = result["thresholds"][i]
+        for group in ("a", "b"):
+            rows = (df["sensitive"] == group).to_numpy()
+            predicted = scores[rows] >= t
+            labels = df["label"].to_numpy()[rows]
+            curves = result["groups"][group]
+            assert curves["selection_rate"][i] == pytest.approx(predicted.mean())
+            assert curves["accuracy"][i] == pytest.approx((predicted == labels).mean())
+            assert curves["true_positive_rate"][i] == pytest.approx(predicted[labels == 1].mean())
+    assert result["overall"]["selection_rate"][0] == 1.0 and result["overall"]["selection_rate"][-1] == 0.0
+
+    downsampled = threshold_sweep(model, df, max_points=10)
+    assert len(downsampled["thresholds"]) == 10
+    assert len(downsampled["gaps"]["demographic_parity_difference"]) == 10
+    assert "error" in threshold_sweep(model, df.assign(label=rng.integers(0, 3, 400)))
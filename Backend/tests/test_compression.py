@@ -0,0 +1,51 @@
+import gzip
+import asyncio
+import pytest
+from backend.compression import GzipRequestMiddleware, RequestTooLarge
+
+def _call(middleware, body, chunk=7):
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen["headers"] = dict(scope["headers"])
+        data = b""
+        while True:
+            message = await receive()
+            data += message["body"]
+            if not message["more_body"]:
+                break
+        seen["body"] = data
+
+    messages = [{"type": "http.request", "body": body[i:i + chunk], "more_body": i + chunk < len(body)}
+                for i in range(0, len(body), chunk)]
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "headers": [(b"content-encoding", b"gzip"), (b"content-length", str(len(body)).encode()),
+                                         (b"content-type", b"text/csv")]}
+    asyncio.run(middleware(app)(scope, receive, None))
+    return seen
+
+def test_gzip_request_body_is_inflated_in_chunks():
+    payload = b"label,prediction,sensitive\n" + b"1,0,a\n" * 1000
+    seen = _call(GzipRequestMiddleware, gzip.compress(payload))
+    assert seen["body"] == payload
+    assert seen["headers"] == {b"content-type": b"text/csv"}
+
+def test_gzip_request_body_limits():
+    with pytest.raises(ValueError, match="Invalid gzip"):
+        _call(GzipRequestMiddleware, b"not gzip at all")
+    with pytest.raises(RequestTooLarge):
+        _call(lambda app: GzipRequestMiddleware(app, max_bytes=100), gzip.compress(b"x" * 1000))
+
+    # A bomb in a single body message is stopped without inflating it in full.
+    import tracemalloc
+    bomb = gzip.compress(b"\0" * (64 * 1024 * 1024))
+    tracemalloc.start()
+    try:
+        with pytest.raises(RequestTooLarge):
+            _call(lambda app: GzipRequestMiddleware(app, max_bytes=1024 * 1024), bomb, chunk=len(bomb))
+        assert tracemalloc.get_traced_memory()[1] < 8 * 1024 * 1024
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,33 @@
+import threading
+import numpy as np
+from backend import db_manager
+
+def test_store_report_batches_json_and_compresses_large_payloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_manager, "DATABASE", str(tmp_path / "reports.db"))
+    monkeypatch.setattr(db_manager, "_writer", None)
+
+    small = {"fairness_score": np.float64(0.5), "class_counts": {"1": np.int64(3)}}
+    large = {"mitigated_dataset": "label,weight\n" + "1,0.5\n" * 2000}
+    db_manager.store_report(small, report_type="dataset", dataset_hash="a" * 64)
+
+    def work():
+        for _ in range(50):
+            db_manager.store_report(large, model_hash="b" * 64)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db_manager.flush_reports()
+
+    reports = db_manager.fetch_reports(report_type="mitigation", limit=1000)
+    assert len(reports) == 200
+    assert reports[0]["report"] == large and reports[0]["model_hash"] == "b" * 64
+    [stored] = db_manager.fetch_reports(dataset_hash="a" * 64)
+    assert stored["report"] == {"fairness_score": 0.5, "class_counts": {"1": 3}}
+
+    conn = db_manager.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    encodings = dict(conn.execute("SELECT encoding, COUNT(*) FROM audit_reports GROUP BY encoding").fetchall())
+    assert encodings == {"json": 1, "json+zlib": 200}
@@ -0,0 +1,88 @@
+import json
+from backend.drift_monitor import FairnessMonitor, MonitorRegistry, parse_events
+
+def _events(start, n, group, correct_every, positive_every=2):
+    # `group` rows whose prediction is wrong except every `correct_every`-th one.
+    for i in range(n):
+        label = int(i % positive_every == 0)
+        prediction = label if i % correct_every == 0 else 1 - label
+        yield json.dumps({"label": label, "prediction": prediction, "sensitive": group, "timestamp": start + i})
+
+def test_sliding_window_expires_old_buckets_and_alerts():
+    monitor = FairnessMonitor("s", window_seconds=100, bucket_seconds=10, tumbling_seconds=1000, min_events=10)
+    fair = list(_events(0, 50, "a", 1)) + list(_events(0, 50, "b", 1))
+    result = monitor.ingest(parse_events(fair)[0])
+    assert result["accepted"] == 100 and result["alerts"] == []
+
+    # Group 'b' starts getting every prediction wrong: equal opportunity breaks.
+    unfair = list(_events(60, 40, "a", 1)) + list(_events(60, 40, "b", 1000))
+    result = monitor.ingest(parse_events(unfair)[0])
+    assert {alert["check"] for alert in result["alerts"]} >= {"equal_opportunity"}
+    # Still failing: no repeated alert for the same sliding-window check.
+    repeated = monitor.ingest(parse_events(list(_events(100, 5, "b", 1000)))[0])["alerts"]
+    assert "equal_opportunity" not in {alert["check"] for alert in repeated}
+
+    status = monitor.status()
+    sliding = status["sliding"]
+    # The window (5, 104] no longer holds the first bucket of events.
+    assert sliding["events"] == sum(monitor.buckets[index][key] for index in monitor.buckets for key in monitor.buckets[index])
+    assert sliding["events"] < 185 and sliding["status"] == "alert"
+    assert monitor.ingest(parse_events(list(_events(0, 3, "a", 1)))[0])["late"] == 3
+
+def test_tumbling_windows_and_snapshot_restore(tmp_path):
+    settings = {"window_seconds": 100, "bucket_seconds": 10, "tumbling_seconds": 50, "min_events": 10,
+                "max_alerts": 100, "snapshot_interval": 0}
+    registry = MonitorRegistry(directory=str(tmp_path), settings=settings)
+    lines = list(_events(0, 40, "a", 1)) + list(_events(0, 40, "b", 1000)) + ["not json", '{"label": 1}']
+    result = registry.ingest("live", lines)
+    assert result["accepted"] == 80 and len(result["rejected"]) == 2
+    # Crossing into the next tumbling window closes and evaluates the first one.
+    result = registry.ingest("live", list(_events(55, 20, "a", 1)))
+    last = registry.get("live").status()["tumbling"]["last_completed"]
+    assert last["events"] == 80 and last["status"] == "alert"
+    assert any(alert["window"] == "tumbling" for alert in result["alerts"])
+
+    # A fresh registry restores the same window state from the snapshot.
+    before = registry.get("live").status()
+    restored = MonitorRegistry(directory=str(tmp_path), settings=settings).get("live", create=False).status()
+    assert restored["sliding"]["events"] == before["sliding"]["events"]
+    assert restored["tumbling"]["current"]["events"] == before["tumbling"]["current"]["events"]
+    assert len(restored["alerts"]) == len(before["alerts"])
+
+def test_parse_events_normalizes_mixed_numeric_values():
+    lines = [
+        '{"label": 1, "prediction": 1.0, "sensitive": 0, "timestamp": 1}',
+        '{"label": 1.0, "prediction": true, "sensitive": 0.0, "timestamp": 2}',
+        '{"label": false, "prediction": 0, "sensitive": "a", "timestamp": 3}',
+        '{"label": 0.5, "prediction": 0, "sensitive": "a", "timestamp": 4}',
+    ]
+    events, rejected = parse_events(lines)
+    assert rejected == []
+    assert [key for _, key in events] == [("0", "1", "1"), ("0", "1", "1"), ("a", "0", "0"), ("a", "0.5", "0")]
+
+def test_bucket_order_tracks_late_buckets_inside_the_window():
+    monitor = FairnessMonitor("s", window_seconds=100, bucket_seconds=10, tumbling_seconds=1000, min_events=1)
+    monitor.ingest(parse_events(list(_events(50, 1, "a", 1)) + list(_events(20, 1, "a", 1)) + list(_events(35, 1, "b", 1)))[0])
+    assert list(monitor.order) == [2, 3, 5]
+    # Advancing the watermark to 135 expires the buckets before index 4 only.
+    monitor.ingest(parse_events(list(_events(135, 1, "a", 1)))[0])
+    assert list(monitor.order) == [5, 13] and sorted(monitor.buckets) == [5, 13]
+    assert sum(monitor.sliding.values()) == 2
+
+def test_non_finite_timestamps_are_rejected(tmp_path):
+    settings = {"window_seconds": 100, "bucket_seconds": 10, "tumbling_seconds": 50, "min_events": 1,
+                "max_alerts": 100, "snapshot_interval": 0}
+    registry = MonitorRegistry(directory=str(tmp_path), settings=settings)
+    lines = ['{"label": 1, "prediction": 1, "sensitive": "a", "timestamp": NaN}',
+             '{"label": 1, "prediction": 1, "sensitive": "a", "timestamp": Infinity}'] + list(_events(0, 3, "a", 1))
+    result = registry.ingest("live", lines)
+    assert result["accepted"] == 3 and [row["line"] for row in result["rejected"]] == [1, 2]
+    assert registry.ingest("live", list(_events(3, 2, "a", 1)))["accepted"] == 2
+
+    # A snapshot holding a NaN watermark does not break the restored stream.
+    state = registry.get("live").to_state()
+    state["watermark"] = float("nan")
+    (tmp_path / "live.json").write_text(json.dumps(state))
+    restored = MonitorRegistry(directory=str(tmp_path), settings=settings)
+    assert restored.ingest("live", list(_events(10, 2, "a", 1)))["accepted"] == 2
+    assert restored.get("live").status()["watermark"] == 11
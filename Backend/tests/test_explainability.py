@@ -0,0 +1,100 @@
+import pandas as pd
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from backend.explainability import generate_shap_explanation, explain_shap_dataset
+
+def _dataset(n=200):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x1": rng.normal(size=n), "x2": rng.normal(size=n), "noise": rng.normal(size=n)})
+    df["label"] = (df["x1"] + 0.5 * df["x2"] > 0).astype(int)
+    df["sensitive"] = np.where(rng.random(n) > 0.5, "a", "b")
+    return df
+
+@pytest.mark.parametrize("model_cls, kind", [
+    (RandomForestClassifier, "tree"),
+    (LogisticRegression, "linear"),
+    (KNeighborsClassifier, "kernel"),
+])
+def test_explain_shap_dataset_picks_explainer(model_cls, kind):
+    df = _dataset()
+    model = model_cls().fit(df[["x1", "x2", "noise"]], df["label"])
+    result = explain_shap_dataset(model, df, max_rows=20 if kind == "kernel" else None, n_jobs=1)
+    assert result["explainer"] == kind
+    assert set(result["global_importance"]) == {"x1", "x2", "noise"}
+    assert set(result["group_importance"]) == {"a", "b"}
+    # The informative feature should dominate the pure-noise one.
+    assert result["global_importance"]["x1"] > result["global_importance"]["noise"]
+
+def test_generate_shap_explanation_with_dataset_in_process_pool(monkeypatch):
+    from backend import explainability
+    settings = dict(explainability._shap_settings(), batch_size=50, n_jobs=2)
+    monkeypatch.setattr(explainability, "_shap_settings", lambda: settings)
+    df = _dataset()
+    model = LogisticRegression().fit(df[["x1", "x2", "noise"]], df["label"])
+    pooled = generate_shap_explanation(model, df)
+    inline = explain_shap_dataset(model, df, n_jobs=1)
+    assert pooled["rows_explained"] == len(df)
+    assert pooled["global_importance"] == pytest.approx(inline["global_importance"])
+
+def test_explain_lime_dataset_ranks_informative_features(monkeypatch):
+    from backend import explainability
+    from backend.explainability import explain_lime_dataset
+    settings = dict(explainability._lime_settings(), num_features=2, num_samples=500, batch_size=10)
+    monkeypatch.setattr(explainability, "_lime_settings", lambda: settings)
+    df = _dataset()
+    model = LogisticRegression().fit(df[["x1", "x2", "noise"]], df["label"])
+    result = explain_lime_dataset(model, df, max_rows=30, n_jobs=2)
+    assert result["rows_explained"] == 30
+    assert all(len(e["feature_weights"]) == 2 for e in result["explanations"])
+    assert all("noise" not in e["feature_weights"] for e in result["explanations"])
+    assert set(result["group_importance"]) <= {"a", "b"}
+
+def test_generate_lime_explanation_without_data():
+    from sklearn.datasets import load_iris
+    from backend.explainability import generate_lime_explanation
+    iris = load_iris()
+    model = LogisticRegression(max_iter=200).fit(iris.data, iris.target)
+    explanation = generate_lime_explanation(model)["lime_explanation"]
+    assert len(explanation["feature_importance"]) == 2
+
+def test_generate_counterfactuals_flip_cohort_at_boundary():
+    from backend.explainability import generate_counterfactuals
+    df = _dataset()
+    model = LogisticRegression().fit(df[["x1", "x2", "noise"]], df["label"])
+    result = generate_counterfactuals(model, df, target_prediction=0)
+    rejected = (model.predict(df[["x1", "x2", "noise"]]) == 0).sum()
+    assert result["rows_explained"] == rejected
+    assert result["counterfactuals_found"] > 0.9 * rejected
+    # The whole cohort is searched with a bounded number of predict calls.
+    assert result["predict_calls"] < 40
+    for entry in result["counterfactuals"]:
+        if entry["counterfactual"] is not None:
+            assert entry["counterfactual_prediction"] == 1
+            assert entry["distance"] > 0
+
+def test_generate_counterfactual_explanation_single_sample():
+    from backend.explainability import generate_counterfactual_explanation
+    df = _dataset()
+    model = LogisticRegression().fit(df[["x1", "x2"]].to_numpy(), df["label"])
+    result = generate_counterfactual_explanation(model, [-0.2, -0.1])
+    assert result["original_prediction"] == 0
+    assert model.predict([result["counterfactual"]])[0] == 1
+
+def test_background_cache_is_shared_safely_across_threads(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from backend import explainability
+    from backend.model_registry import ModelCache
+    monkeypatch.setattr(explainability, "_background_cache", ModelCache(2))
+    frames = [pd.DataFrame({"x": np.arange(20, dtype=float) + i}) for i in range(6)]
+
+    def summarize(i):
+        return explainability.summarize_background(frames[i % len(frames)], 5, method="sample")
+
+    # Keys are evicted by other threads while they are being looked up.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        backgrounds = list(pool.map(summarize, range(600)))
+    assert all(len(background) == 5 for background in backgrounds)
+    assert explainability._background_cache.stats()["entries"] == 2
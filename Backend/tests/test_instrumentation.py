@@ -0,0 +1,57 @@
+import asyncio
+from backend.instrumentation import Histogram, InstrumentationMiddleware, render_metrics, span
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test latency.", [0.1, 1], ("route",))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, "/audit")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/audit",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/audit",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{route="/audit",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{route="/audit"} 4' in lines
+
+def test_middleware_adds_server_timing_and_metrics():
+    async def app(scope, receive, send):
+        await receive()
+        with span("parse"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b"a,b\n1,2\n", "more_body": False}
+
+    sent = []
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/test", "endpoint": app}
+    asyncio.run(InstrumentationMiddleware(app)(scope, receive, send))
+    header = dict(sent[0]["headers"])[b"server-timing"].decode()
+    assert [entry.split(";")[0] for entry in header.split(", ")] == ["receive", "parse", "total"]
+    metrics = render_metrics()
+    assert 'auditor_http_requests_total{method="POST",route="app",status="200"} 1' in metrics
+    assert 'auditor_stage_duration_seconds_count{stage="parse"}' in metrics
+
+def test_audit_stage_spans_reach_server_timing():
+    import io
+    import joblib
+    import numpy as np
+    import pandas as pd
+    from fastapi.testclient import TestClient
+    from sklearn.linear_model import LogisticRegression
+    from backend.main import app, API_KEY
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x1": rng.normal(size=200), "x2": rng.normal(size=200)})
+    df["label"] = (df["x1"] > 0).astype(int)
+    df["sensitive"] = np.where(rng.random(200) > 0.5, "a", "b")
+    model = io.BytesIO()
+    joblib.dump(LogisticRegression().fit(df[["x1", "x2"]], df["label"]), model)
+
+    response = TestClient(app).post("/audit", headers={"x-api-key": API_KEY}, data={"stages": "fairness,model"},
+                                    files={"data": ("data.csv", df.to_csv(index=False)), "file": ("m.joblib", model.getvalue())})
+    assert response.status_code == 200
+    names = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    # 'predict' runs on an audit stage thread and still counts towards the request.
+    assert {"upload", "unpickle", "parse", "predict", "compute", "total"} <= set(names)
@@ -0,0 +1,48 @@
+import time
+import pytest
+from backend.bias_detector import analyze_dataset_bias
+from backend.jobs import JobManager, JobQueueFull
+
+def _wait(manager, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while manager.get(job_id)["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.05)
+    return manager.result(job_id)
+
+def test_job_runs_in_process_pool_and_reports_result():
+    manager = JobManager(max_workers=1)
+    try:
+        job = manager.submit("analyze/dataset", analyze_dataset_bias, b"label\n1\n0\n1\n")
+        assert job["status"] in ("queued", "running")
+        status, result = _wait(manager, job["job_id"])
+        assert status["status"] == "succeeded"
+        assert result["class_counts"] == {1: 2, 0: 1}
+        # Analyses reporting an error dict are marked as failed jobs.
+        job = manager.submit("analyze/dataset", analyze_dataset_bias, b"x\n1\n")
+        status, _ = _wait(manager, job["job_id"])
+        assert status["status"] == "failed" and "label" in status["error"]
+    finally:
+        manager.shutdown()
+
+def test_per_kind_limit_admission_control_and_cancel():
+    manager = JobManager(max_workers=2, max_queued=3, limits={"slow": 1})
+    try:
+        first = manager.submit("slow", time.sleep, 1.0)
+        second = manager.submit("slow", time.sleep, 0)
+        third = manager.submit("slow", time.sleep, 0)
+        # Only one "slow" job may run at a time; the others wait in the kind's queue.
+        assert manager.stats()["running"] == {"slow": 1}
+        assert manager.stats()["queued"] == 2
+        with pytest.raises(JobQueueFull):
+            manager.submit("slow", time.sleep, 0)
+
+        cancelled = manager.cancel(second["job_id"])
+        assert cancelled["status"] == "cancelled"
+        assert _wait(manager, first["job_id"])[0]["status"] == "succeeded"
+        assert _wait(manager, third["job_id"])[0]["status"] == "succeeded"
+        assert manager.get(second["job_id"])["status"] == "cancelled"
+        with pytest.raises(KeyError):
+            manager.get("missing")
+    finally:
+        manager.shutdown()
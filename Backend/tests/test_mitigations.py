@@ -7,14 +7,14 @@ def test_mitigate_bias_valid():
     # Create a CSV with a 'label' column and some dummy features.
     csv_data = "label,feature,sensitive\n0,1.0,0\n1,2.0,1\n0,1.5,0\n1,3.0,1\n"
     content = csv_data.encode("utf-8")
-    result = mitigate_bias(content)
+    result = mitigate_bias(content, adversarial=True)
     # Check that the mitigated output includes the expected key.
     assert "mitigated_dataset" in result
     # Verify that the returned CSV now has a 'sample_weight' column.
     df = pd.read_csv(io.StringIO(result["mitigated_dataset"]))
     assert "sample_weight" in df.columns
-    # Also check if 'adversarial_weight' column exists since sensitive attribute is provided.
-    assert "adversarial_weight" in df.columns
+    # Also check the adversarially debiased predictions since they were requested.
+    assert "adversarial_prediction" in df.columns
 
 def test_mitigate_bias_missing_label():
     # CSV without a 'label' column should return an error.
@@ -22,3 +22,94 @@ def test_mitigate_bias_missing_label():
     content = csv_data.encode("utf-8")
     result = mitigate_bias(content)
     assert "error" in result
+
+def test_mitigate_bias_accepts_parsed_frame():
+    df = pd.DataFrame({"label": [0, 1, 0, 1], "feature": [1.0, 2.0, 1.5, 3.0]})
+    result = mitigate_bias(df)
+    assert "mitigated_dataset" in result
+    assert "sample_weight" in df.columns
+
+def test_mitigate_bias_writes_content_addressed_artifacts(tmp_path, monkeypatch):
+    import numpy as np
+    from backend import artifact_store
+    monkeypatch.setattr(artifact_store, "_storage_dir", lambda: str(tmp_path))
+    df = pd.DataFrame({"label": [0, 1, 0, 0], "feature": [1.0, 2.0, 1.5, 3.0], "sensitive": ["a", "b", "a", "b"]})
+
+    handle = mitigate_bias(df.copy(), output="parquet")["artifact"]
+    assert handle["rows"] == 4 and "sample_weight" in handle["columns"]
+    path, fmt = artifact_store.artifact_path(handle["artifact_id"])
+    assert fmt == "parquet"
+    pd.testing.assert_series_equal(pd.read_parquet(path)["sample_weight"], pd.Series([1.0, 3.0, 1.0, 1.0], name="sample_weight"))
+    # Identical output maps to the same artifact.
+    assert mitigate_bias(df.copy(), output="parquet")["artifact"]["artifact_id"] == handle["artifact_id"]
+
+    # Adversarial debiasing is opt-in; its score is stored next to the sample weights.
+    assert "adversarial_debiasing" not in mitigate_bias(df.copy(), output="parquet")
+    handle = mitigate_bias(df.copy(), output="weights", adversarial=True)["artifact"]
+    path, fmt = artifact_store.artifact_path(handle["artifact_id"])
+    weights = np.load(path)
+    assert weights.dtype.names == ("sample_weight", "adversarial_score")
+    assert weights["sample_weight"].tolist() == [1.0, 3.0, 1.0, 1.0]
+    with open(path, "rb") as f:
+        assert b"".join(artifact_store.iter_artifact(path, chunk_size=16)) == f.read()
+    assert "error" in mitigate_bias(df.copy(), output="xlsx")
+
+def test_reweighing_methods_on_joint_label_group_counts():
+    import numpy as np
+    from backend.reweighing import compute_reweighing
+    df = pd.DataFrame({
+        "label": [1, 1, 1, 0, 1, 0, 0, 0],
+        "sensitive": pd.Categorical(["a", "a", "a", "a", "b", "b", "b", "b"]),
+        "sensitive_age": ["y", "o", "y", "o", "y", "o", "y", "o"],
+    })
+    # Inverse frequency depends only on the label and matches max(count)/count.
+    weights, report = compute_reweighing(df, method="inverse_frequency", sensitive=["sensitive"])
+    assert weights.tolist() == [1.0] * 8
+
+    # Kamiran-Calders makes the weighted positive rate equal across groups.
+    weights, report = compute_reweighing(df, method="kamiran_calders", sensitive=["sensitive"])
+    assert report["before"]["demographic_parity_difference"] == 0.5
+    assert abs(report["after"]["demographic_parity_difference"]) < 1e-12
+    np.testing.assert_allclose(weights[:4], [2 / 3, 2 / 3, 2 / 3, 2.0])
+    assert report["weights"]["a"] == {"0": 2.0, "1": 2 / 3}
+
+    # Every sensitive column is used by default; groups are their intersections.
+    weights, report = compute_reweighing(df, method="kamiran_calders")
+    assert report["sensitive_columns"] == ["sensitive", "sensitive_age"]
+    assert sorted(report["weights"]) == ["a-o", "a-y", "b-o", "b-y"]
+    assert len(weights) == len(df)
+
+def test_mitigate_bias_uses_configured_reweighting_method():
+    df = pd.DataFrame({"label": [1, 1, 1, 0, 1, 0, 0, 0], "sensitive": ["a"] * 4 + ["b"] * 4})
+    result = mitigate_bias(df.copy(), method="kamiran_calders")
+    assert result["reweighing"]["method"] == "kamiran_calders"
+    mitigated = pd.read_csv(io.StringIO(result["mitigated_dataset"]))
+    assert mitigated["sample_weight"].round(3).tolist() == [0.667, 0.667, 0.667, 2.0, 2.0, 0.667, 0.667, 0.667]
+    assert mitigate_bias(df.copy())["reweighing"]["method"] == "inverse_frequency"
+    assert "error" in mitigate_bias(df.copy(), method="unknown")
+
+def test_adversarial_debiasing_reduces_disparity_and_registers_model(tmp_path, monkeypatch):
+    import numpy as np
+    from backend import model_registry
+    from backend.bias_detector import adversarial_debias
+    monkeypatch.setattr(model_registry, "_storage_dir", lambda: str(tmp_path))
+    rng = np.random.default_rng(0)
+    s = rng.integers(0, 2, 4000)
+    # x1 is a proxy for the sensitive attribute.
+    x1, x2 = rng.normal(size=4000) + 1.5 * s, rng.normal(size=4000)
+    y = ((x1 + x2 + rng.normal(size=4000)) > 1).astype(int)
+    df = pd.DataFrame({"x1": x1, "x2": x2, "label": y, "sensitive": np.where(s, "a", "b")})
+
+    def parity_gap(pred):
+        return abs(pred[s == 1].mean() - pred[s == 0].mean())
+
+    # With a frozen adversary the trainer is plain logistic regression.
+    baseline, _ = adversarial_debias(df.copy(), "sensitive", "label", adversary_weight=0.0, adversary_learning_rate=1e-300)
+    debiased, report = adversarial_debias(df, "sensitive", "label", register=True)
+    assert parity_gap(debiased["adversarial_prediction"].to_numpy()) < parity_gap(baseline["adversarial_prediction"].to_numpy()) / 3
+    assert report["features"] == ["x1", "x2"]
+    assert 1 <= report["best_epoch"] <= report["epochs_run"] <= 50
+    assert all(epoch["seconds"] >= 0 and "demographic_parity_difference" in epoch for epoch in report["history"])
+
+    model = model_registry.get_model(report["model_id"])
+    np.testing.assert_array_equal(model.predict(df[["x1", "x2"]]), debiased["adversarial_prediction"])
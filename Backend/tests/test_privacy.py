@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+from backend.privacy import perform_privacy_tests, shadow_model_attack
+
+def _data(n, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"x1": rng.normal(size=n), "x2": rng.normal(size=n)})
+    # Noisy labels give an overfitting model something to memorize.
+    df["label"] = ((df["x1"] + rng.normal(scale=1.0, size=n)) > 0).astype(int)
+    return df
+
+def test_threshold_attack_with_subsample():
+    train = _data(400, 0)
+    model = LogisticRegression().fit(train[["x1", "x2"]], train["label"])
+    result = perform_privacy_tests(model, train, sample_size=100)
+    assert 0.0 <= result["membership_inference_attack_accuracy"] <= 1.0
+
+def test_shadow_attack_detects_overfitting_model():
+    train, holdout = _data(600, 1), _data(600, 2)
+    model = DecisionTreeClassifier(random_state=0).fit(train[["x1", "x2"]], train["label"])
+    result = shadow_model_attack(model, train, holdout, n_shadow_models=2, n_jobs=2)
+    assert result["attack"] == "shadow_model"
+    assert result["non_members"] == "holdout"
+    # A fully grown tree memorizes its training rows, so the attack beats chance.
+    assert result["membership_inference_attack_accuracy"] > 0.6
+    assert result["attack_advantage"] > 0.2
+
+def test_shadow_attack_requires_label():
+    train = _data(100, 3).drop(columns=["label"])
+    model = LogisticRegression().fit(train, np.arange(100) % 2)
+    result = perform_privacy_tests(model, train, attack="shadow")
+    assert "error" in result
+
+def test_rdp_accountant_matches_closed_forms_and_memoizes():
+    import math
+    from backend.privacy import compute_rdp_sgm, evaluate_differential_privacy, compute_epsilon_grid
+    # Direct binomial expansion for a single order.
+    q, sigma, order = 0.01, 1.0, 10
+    a = sum(math.comb(order, k) * (1 - q) ** (order - k) * q ** k * math.exp((k * k - k) / (2 * sigma ** 2))
+            for k in range(order + 1))
+    assert compute_rdp_sgm([q], [sigma], [order])[0, 0] == pytest.approx(math.log(a) / (order - 1))
+    # Without subsampling the Gaussian mechanism has RDP alpha / (2 sigma^2).
+    assert compute_rdp_sgm([1.0], [2.0], [4])[0, 0] == pytest.approx(0.5)
+
+    eps = evaluate_differential_privacy(noise_multiplier=1.1, batch_size=256, dataset_size=60000, epochs=60, delta=1e-5)
+    assert 2.0 < eps < 3.5
+    grid = compute_epsilon_grid([0.8, 1.1, 2.0], [256], [60000], [60], 1e-5)
+    epsilons = [point["epsilon"] for point in grid]
+    # More noise means a smaller epsilon, and the grid agrees with the memoized scalar path.
+    assert epsilons[0] > epsilons[1] > epsilons[2]
+    assert epsilons[1] == pytest.approx(eps)
@@ -0,0 +1,15 @@
+from backend import warmup
+from backend.benchmarks.startup import measure_import
+
+def test_api_import_defers_heavy_dependencies():
+    # Heavy dependencies (shap, sklearn, scipy, joblib) load on first use only.
+    # The wall-clock budget is checked by python -m Backend.benchmarks.startup.
+    result = measure_import(repeats=1)
+    assert result["lazy_loaded"] == []
+
+def test_warmup_preloads_subsystems():
+    thread = warmup.start_warmup(["joblib", "sklearn"])
+    thread.join()
+    status = warmup.warmup_status()
+    assert isinstance(status["joblib"], float) and isinstance(status["sklearn"], float)
+    assert warmup.start_warmup([]) is None
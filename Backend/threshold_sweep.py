@@ -0,0 +1,124 @@
+import numpy as np
+from .group_metrics import encode_groups, positive_index, rates_from_counts, disparities, to_python
+from .ingestion import as_frame, content_hash, feature_columns
+from .model_registry import as_model, model_hash as hash_model_bytes
+from .prediction import cached_predictions
+from .reweighing import group_codes, sensitive_columns
+from .settings import get_setting
+
+# Per-threshold metrics reported for every group and overall.
+SWEEP_METRICS = ("accuracy", "selection_rate", "true_positive_rate", "false_positive_rate")
+
+
+def threshold_counts(scores, positive, groups, n_groups, thresholds):
+    """
+    Confusion counts of the rule `score >= threshold` for every threshold and group,
+    shape (thresholds, groups, label, prediction) with index 1 the positive class.
+    Scores are sorted once per group and the positives cumulated, so each threshold
+    is a binary search into the sorted scores: O(n log n) in total instead of
+    re-scoring every row per threshold.
+    """
+    # One argsort of the scores, then a stable (radix) sort of the small group codes
+    # keeps each group's scores in ascending order; faster than np.lexsort.
+    order = np.argsort(scores)
+    code_type = np.int16 if n_groups < (1 << 15) else np.int64
+    order = order[np.argsort(groups[order].astype(code_type), kind="stable")]
+    scores, positive, groups = scores[order], positive[order], groups[order]
+    starts = np.searchsorted(groups, np.arange(n_groups + 1))
+    counts = np.zeros((len(thresholds), n_groups, 2, 2), dtype=np.int64)
+    for g in range(n_groups):
+        lo, hi = starts[g], starts[g + 1]
+        # positives_below[k]: positives among the group's k lowest-scored rows.
+        positives_below = np.concatenate([[0], np.cumsum(positive[lo:hi])])
+        below = np.searchsorted(scores[lo:hi], thresholds, side="left")
+        false_neg = positives_below[below]
+        true_pos = positives_below[-1] - false_neg
+        counts[:, g, 1, 0] = false_neg
+        counts[:, g, 1, 1] = true_pos
+        counts[:, g, 0, 0] = below - false_neg
+        counts[:, g, 0, 1] = (hi - lo - below) - true_pos
+    return counts
+
+
+def sweep_thresholds(scores, max_points=None):
+    """
+    Every distinct score plus one threshold above the highest (nothing selected),
+    downsampled to `max_points` thresholds at evenly spaced ranks.
+    """
+    thresholds = np.unique(scores)
+    if len(thresholds):
+        thresholds = np.append(thresholds, np.nextafter(thresholds[-1], np.inf))
+    if max_points and len(thresholds) > max_points:
+        thresholds = thresholds[np.unique(np.linspace(0, len(thresholds) - 1, max_points).round().astype(int))]
+    return thresholds
+
+
+def _as_list(values):
+    return [to_python(value) for value in values]
+
+
+def threshold_sweep(model, data, max_points=None, model_hash=None, dataset_hash=None):
+    """
+    Fairness-accuracy trade-off across decision thresholds for a model with predict_proba.
+    Expects a pickled model file (or a loaded model) and CSV bytes or a parsed DataFrame
+    with a binary 'label' column and optional sensitive columns, whose intersections
+    form the groups. For each threshold on the positive-class probability, returns the
+    accuracy, selection rate, TPR and FPR per group and overall, and the fairness gaps.
+    The curve is downsampled to `max_points` thresholds
+    (fairness_metrics.threshold_sweep.max_points in metrics.yaml by default; 0 keeps all).
+    Scores are computed with chunked, cached prediction as in analyze_model_bias.
+    """
+    if isinstance(model, (bytes, bytearray)):
+        model_hash = model_hash or hash_model_bytes(bytes(model))
+    if isinstance(data, (bytes, bytearray)):
+        dataset_hash = dataset_hash or content_hash(bytes(data))
+    try:
+        model = as_model(model)
+        df = as_frame(data)
+    except Exception as e:
+        return {"error": str(e)}
+    if not hasattr(model, "predict_proba"):
+        return {"error": "Threshold sweeps require a model with predict_proba."}
+    if 'label' not in df.columns:
+        return {"error": "Dataset must include a 'label' column."}
+    label, classes = encode_groups(df['label'])
+    if len(classes) != 2:
+        return {"error": "Threshold sweeps require a binary label."}
+    pos = positive_index(classes)
+    model_classes = [str(cls) for cls in getattr(model, "classes_", [])]
+    if str(classes[pos]) not in model_classes:
+        return {"error": f"The model does not predict the positive label {classes[pos]!r}."}
+    if max_points is None:
+        max_points = get_setting("fairness_metrics", "threshold_sweep", "max_points", default=200)
+
+    try:
+        proba, _ = cached_predictions(model, df[feature_columns(df, model)], model_hash=model_hash,
+                                      dataset_hash=dataset_hash, method="predict_proba")
+    except Exception as e:
+        return {"error": f"Failed to score the dataset: {str(e)}"}
+    scores = proba[:, model_classes.index(str(classes[pos]))].astype(float)
+    columns = sensitive_columns(df)
+    group, groups = group_codes(df, columns)
+    valid = (label >= 0) & (group >= 0) & ~np.isnan(scores)
+    if not valid.any():
+        return {"error": "No labelled rows to evaluate."}
+    scores, positive, group = scores[valid], (label[valid] == pos).astype(np.int64), group[valid]
+
+    thresholds = sweep_thresholds(scores, max_points)
+    counts = threshold_counts(scores, positive, group, len(groups), thresholds)
+    rates = rates_from_counts(counts, 1)
+    overall = rates_from_counts(counts.sum(axis=1), 1)
+    gaps = disparities(rates)
+    sizes = counts[0].sum(axis=(1, 2))
+    return {
+        "positive_label": classes[pos],
+        "sensitive_columns": columns,
+        "rows": int(valid.sum()),
+        "thresholds": thresholds.tolist(),
+        "overall": {name: _as_list(overall[name]) for name in SWEEP_METRICS},
+        "groups": {
+            str(g): {"count": int(sizes[i]), **{name: _as_list(rates[name][:, i]) for name in SWEEP_METRICS}}
+            for i, g in enumerate(groups) if sizes[i] > 0
+        },
+        "gaps": {name: _as_list(values) for name, values in gaps.items()},
+    }
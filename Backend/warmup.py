@@ -0,0 +1,66 @@
+import time
+import logging
+import importlib
+import threading
+from .settings import get_setting
+
+# Heavy dependencies imported on first use by the endpoints that need them,
+# and the modules each warm-up subsystem preloads.
+WARMUP_TARGETS = {
+    "joblib": ("joblib",),
+    "scipy": ("scipy.special",),
+    "sklearn": ("sklearn.base", "sklearn.linear_model", "sklearn.metrics", "sklearn.model_selection"),
+    "shap": ("shap",),
+}
+LAZY_MODULES = tuple(sorted({module.split(".")[0] for modules in WARMUP_TARGETS.values() for module in modules}))
+
+logger = logging.getLogger(__name__)
+
+_status = {}
+_lock = threading.Lock()
+
+
+def warm_up(subsystems):
+    """
+    Import the modules of each subsystem in WARMUP_TARGETS.
+    Returns {subsystem: seconds} with an error message in place of the time on failure.
+    """
+    for name in subsystems:
+        if name not in WARMUP_TARGETS:
+            raise ValueError(f"Unknown warm-up subsystem '{name}'. Expected any of: {', '.join(WARMUP_TARGETS)}.")
+    for name in subsystems:
+        with _lock:
+            _status[name] = "loading"
+        started = time.perf_counter()
+        try:
+            for module in WARMUP_TARGETS[name]:
+                importlib.import_module(module)
+            result = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            result = f"failed: {str(e)}"
+        with _lock:
+            _status[name] = result
+        logger.info("Warm-up of %s: %s.", name, result)
+    return warmup_status()
+
+
+def start_warmup(subsystems=None):
+    """
+    Warm up `subsystems` (startup.warmup in metrics.yaml by default) in a daemon
+    thread, so the server accepts requests while they load. Returns the thread,
+    or None when there is nothing to warm up.
+    """
+    if subsystems is None:
+        subsystems = get_setting("startup", "warmup", default=[]) or []
+    if not subsystems:
+        return None
+    with _lock:
+        _status.update({name: "pending" for name in subsystems})
+    thread = threading.Thread(target=warm_up, args=(list(subsystems),), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_status():
+    with _lock:
+        return dict(_status)
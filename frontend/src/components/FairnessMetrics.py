@@ -2,7 +2,8 @@ def format_fairness_data(raw_data: dict):
     """
     Processes raw fairness data (e.g., from a backend API) into a format for visualization.
     Expects raw_data to contain 'group_accuracies' and 'overall_accuracy'.
-    Returns a dictionary with lists of groups and corresponding accuracies.
+    Returns a dictionary with lists of groups and corresponding accuracies, plus their
+    bootstrap confidence intervals when the backend reports them.
     """
     if "group_accuracies" not in raw_data:
         return {}
@@ -13,4 +14,9 @@ def format_fairness_data(raw_data: dict):
         "accuracies": accuracies,
         "overall_accuracy": raw_data.get("overall_accuracy")
     }
+    intervals = raw_data.get("confidence_intervals")
+    if intervals:
+        formatted["accuracy_intervals"] = [intervals["group_metrics"].get(group, {}).get("accuracy") for group in groups]
+        formatted["fairness_gap"] = raw_data.get("fairness_gap")
+        formatted["fairness_gap_interval"] = raw_data.get("fairness_gap_interval")
     return formatted
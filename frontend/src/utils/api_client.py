@@ -1,9 +1,61 @@
+import gzip
+import json
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Only calls that can safely be repeated are retried on 5xx responses; connection
+# failures are retried for every call since the request never reached the server.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "DELETE"})
 
 class AIEthicsClient:
-    def __init__(self, base_url="http://localhost:8000"):
+    def __init__(self, base_url="http://localhost:8000", pool_size=10, retries=3, backoff=0.5,
+                 compress=True, compress_min_bytes=1024, timeout=None):
+        """
+        All calls share one requests.Session, so connections are kept alive and
+        reused (up to pool_size per host). Request bodies of at least
+        compress_min_bytes are sent gzip-compressed when compress is set.
+        Idempotent calls are retried up to `retries` times on 502/503/504 responses
+        with exponential backoff (backoff, 2 * backoff, ... seconds).
+        """
         self.base_url = base_url
         self.headers = {"X-API-Key": "secret-token"}
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                      allowed_methods=IDEMPOTENT_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request(self, method, url, stream=False, **kwargs):
+        """
+        Sends a request on the pooled session, gzip-compressing a large body.
+        """
+        prepared = self.session.prepare_request(requests.Request(method, url, **kwargs))
+        body = prepared.body
+        if self.compress and body is not None and not hasattr(body, "read") and len(body) >= self.compress_min_bytes:
+            prepared.body = gzip.compress(body.encode("utf-8") if isinstance(body, str) else body, compresslevel=5)
+            prepared.headers["Content-Encoding"] = "gzip"
+            prepared.headers["Content-Length"] = str(len(prepared.body))
+        settings = self.session.merge_environment_settings(prepared.url, {}, stream, None, None)
+        return self.session.send(prepared, timeout=self.timeout, **settings)
 
     def analyze_dataset(self, file_bytes):
         """
@@ -11,7 +63,7 @@ class AIEthicsClient:
         """
         url = f"{self.base_url}/analyze/dataset"
         files = {"file": file_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        response = self._request("POST", url, files=files)
         return response.json()
 
     def analyze_fairness(self, file_bytes):
@@ -20,50 +72,284 @@ class AIEthicsClient:
         """
         url = f"{self.base_url}/analyze/fairness"
         files = {"file": file_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        response = self._request("POST", url, files=files)
         return response.json()
 
-    def mitigate_bias(self, file_bytes):
+    def mitigate_bias(self, file_bytes, output=None, method=None, register_model=False, adversarial=False):
         """
         Sends the dataset file to mitigate bias.
+        With output="parquet", "arrow" or "weights" the result is stored on the backend
+        and the response carries an artifact handle for download_artifact.
+        method selects "inverse_frequency" or "kamiran_calders" reweighting,
+        adversarial=True also trains an adversarially debiased classifier, and
+        register_model=True trains it and stores the model in the registry.
         """
         url = f"{self.base_url}/mitigate"
         files = {"file": file_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        data = {key: value for key, value in (("output", output), ("method", method)) if value is not None}
+        if register_model:
+            data["register_model"] = "true"
+        if adversarial:
+            data["adversarial"] = "true"
+        response = self._request("POST", url, files=files, data=data)
         return response.json()
 
-    def analyze_model(self, model_bytes):
+    def download_artifact(self, artifact_id, path, chunk_size=1024 * 1024):
         """
-        Sends the model file to analyze its performance (model audit).
+        Streams a stored artifact to a local file without holding it in memory.
         """
-        url = f"{self.base_url}/analyze/model"
+        url = f"{self.base_url}/artifacts/{artifact_id}"
+        with self._request("GET", url, stream=True) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+        return path
+
+    def register_model(self, model_bytes):
+        """
+        Uploads a model once and returns its registry ID for use in later calls.
+        """
+        url = f"{self.base_url}/models"
         files = {"file": model_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        response = self._request("POST", url, files=files)
+        return response.json()["data"]["model_id"]
+
+    def model_cache_stats(self):
+        """
+        Returns hit/miss/eviction statistics of the backend model cache.
+        """
+        url = f"{self.base_url}/models/cache"
+        response = self._request("GET", url)
+        return response.json()
+
+    @staticmethod
+    def _model_payload(model_bytes=None, model_id=None, field="file"):
+        """
+        Builds the multipart files and form data referencing a model by bytes or registry ID.
+        """
+        if model_id is not None:
+            return {}, {"model_id": model_id}
+        if model_bytes is None:
+            raise ValueError("Either model_bytes or model_id must be given.")
+        return {field: model_bytes}, {}
+
+    def analyze_model(self, model_bytes=None, model_id=None, data_bytes=None):
+        """
+        Sends the model file (or a registered model ID) to analyze its performance (model audit).
+        Optional CSV data with a 'label' column is used as the evaluation set.
+        """
+        url = f"{self.base_url}/analyze/model"
+        files, data = self._model_payload(model_bytes, model_id)
+        if data_bytes is not None:
+            files["data"] = data_bytes
+        response = self._request("POST", url, files=files, data=data)
         return response.json()
 
-    def explain_shap(self, model_bytes):
+    def explain_shap(self, model_bytes=None, model_id=None, data_bytes=None):
         """
-        Sends the model file to generate a SHAP explanation.
+        Sends the model file (or a registered model ID) to generate a SHAP explanation.
+        Optional CSV data is explained globally and per sensitive group.
         """
         url = f"{self.base_url}/explain/shap"
-        files = {"file": model_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        files, data = self._model_payload(model_bytes, model_id)
+        if data_bytes is not None:
+            files["data"] = data_bytes
+        response = self._request("POST", url, files=files, data=data)
         return response.json()
 
-    def explain_lime(self, model_bytes):
+    def explain_lime(self, model_bytes=None, model_id=None, data_bytes=None):
         """
-        Sends the model file to generate a LIME explanation.
+        Sends the model file (or a registered model ID) to generate a LIME explanation.
+        Optional CSV data is explained row by row.
         """
         url = f"{self.base_url}/explain/lime"
-        files = {"file": model_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        files, data = self._model_payload(model_bytes, model_id)
+        if data_bytes is not None:
+            files["data"] = data_bytes
+        response = self._request("POST", url, files=files, data=data)
         return response.json()
 
-    def analyze_privacy(self, model_bytes, train_bytes):
+    def analyze_privacy(self, model_bytes=None, train_bytes=None, model_id=None, attack="threshold",
+                        holdout_bytes=None, n_shadow_models=None, sample_size=None):
         """
-        Sends both a model file and a training dataset to evaluate privacy.
+        Sends a model file (or a registered model ID) and a training dataset to evaluate privacy.
+        Use attack="shadow" (optionally with a holdout dataset) for the shadow-model attack.
         """
         url = f"{self.base_url}/analyze/privacy"
-        files = {"model": model_bytes, "train": train_bytes}
-        response = requests.post(url, files=files, headers=self.headers)
+        files, data = self._model_payload(model_bytes, model_id, field="model")
+        files["train"] = train_bytes
+        data["attack"] = attack
+        if holdout_bytes is not None:
+            files["holdout"] = holdout_bytes
+        if n_shadow_models is not None:
+            data["n_shadow_models"] = n_shadow_models
+        if sample_size is not None:
+            data["sample_size"] = sample_size
+        response = self._request("POST", url, files=files, data=data)
+        return response.json()
+
+    def explain_counterfactual(self, model_bytes=None, model_id=None, data_bytes=None, sample=None, target_prediction=None):
+        """
+        Requests counterfactuals for a CSV cohort (optionally only rows predicted as
+        target_prediction) or for a single sample given as a list of feature values.
+        """
+        url = f"{self.base_url}/explain/counterfactual"
+        files, data = self._model_payload(model_bytes, model_id)
+        if data_bytes is not None:
+            files["data"] = data_bytes
+        if sample is not None:
+            data["sample"] = json.dumps(sample)
+        if target_prediction is not None:
+            data["target_prediction"] = str(target_prediction)
+        response = self._request("POST", url, files=files, data=data)
         return response.json()
+
+    def threshold_sweep(self, data_bytes, model_bytes=None, model_id=None, max_points=None):
+        """
+        Requests the per-group accuracy / selection rate / TPR curve across decision
+        thresholds; the result feeds visualizations.create_tradeoff_chart.
+        """
+        url = f"{self.base_url}/analyze/fairness/sweep"
+        files, data = self._model_payload(model_bytes, model_id)
+        files["data"] = data_bytes
+        if max_points is not None:
+            data["max_points"] = max_points
+        response = self._request("POST", url, files=files, data=data)
+        return response.json()
+
+    def audit(self, data_bytes, model_bytes=None, model_id=None, stages=None):
+        """
+        Runs the full audit (dataset, fairness, model, SHAP and mitigation stages, or the
+        given subset) in one request; the model is optional when the CSV has a 'prediction' column.
+        """
+        url = f"{self.base_url}/audit"
+        files, data = ({}, {}) if model_bytes is None and model_id is None else self._model_payload(model_bytes, model_id)
+        files["data"] = data_bytes
+        if stages:
+            data["stages"] = ",".join(stages)
+        response = self._request("POST", url, files=files, data=data)
+        return response.json()
+
+    def ingest_predictions(self, stream, events):
+        """
+        Sends live predictions to a fairness monitor stream as one NDJSON batch.
+        Each event is a dict with 'label', 'prediction', 'sensitive' and optionally 'timestamp'.
+        """
+        url = f"{self.base_url}/monitor/{stream}/events"
+        body = "\n".join(json.dumps(event) for event in events)
+        headers = {"Content-Type": "application/x-ndjson"}
+        response = self._request("POST", url, data=body.encode("utf-8"), headers=headers)
+        return response.json()
+
+    def monitor_status(self, stream):
+        """
+        Returns the sliding and tumbling window fairness metrics and alerts of a stream.
+        """
+        url = f"{self.base_url}/monitor/{stream}"
+        response = self._request("GET", url)
+        return response.json()
+
+    def privacy_sweep(self, noise_multipliers=None, batch_sizes=None, dataset_sizes=None, epochs=None, delta=None):
+        """
+        Computes DP-SGD epsilon over a parameter grid; omitted values use the backend defaults.
+        """
+        url = f"{self.base_url}/analyze/privacy/sweep"
+        payload = {"noise_multipliers": noise_multipliers, "batch_sizes": batch_sizes,
+                   "epochs": epochs, "delta": delta}
+        if dataset_sizes is not None:
+            payload["dataset_sizes"] = dataset_sizes
+        response = self._request("POST", url, json=payload)
+        return response.json()
+
+    def submit_job(self, endpoint, files=None, data=None, json_body=None):
+        """
+        Submits an analysis endpoint (e.g. "explain/shap") as a background job and returns its job ID.
+        Raises RuntimeError if the backend refuses the job, e.g. with 429 when its queue is full.
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        response = self._request("POST", url, params={"background": "true"}, files=files, data=data,
+                                 json=json_body)
+        body = response.json()
+        if response.status_code != 202:
+            detail = body.get("detail", body)
+            raise RuntimeError(f"Job submission failed ({response.status_code}): {detail}")
+        return body["data"]["job"]["job_id"]
+
+    def job_status(self, job_id):
+        """
+        Returns the status of a background job.
+        """
+        url = f"{self.base_url}/jobs/{job_id}"
+        response = self._request("GET", url)
+        return response.json()
+
+    def job_result(self, job_id):
+        """
+        Fetches the result of a finished background job.
+        """
+        url = f"{self.base_url}/jobs/{job_id}/result"
+        response = self._request("GET", url)
+        return response.json()
+
+    def cancel_job(self, job_id):
+        """
+        Cancels a queued or running background job.
+        """
+        url = f"{self.base_url}/jobs/{job_id}"
+        response = self._request("DELETE", url)
+        return response.json()
+
+    def wait_for_job(self, job_id, poll_interval=0.5, timeout=None):
+        """
+        Polls a background job until it finishes and returns its result.
+        Raises TimeoutError if it is still unfinished after `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.job_status(job_id)["data"]["job"]["status"]
+            if status in ("succeeded", "failed", "cancelled"):
+                return self.job_result(job_id)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} did not finish within {timeout} seconds.")
+            time.sleep(poll_interval)
+
+
+class AsyncAIEthicsClient:
+    """
+    asyncio variant of AIEthicsClient: every client method (audit, analyze_model, ...)
+    is available as a coroutine. Calls run on a pool of max_concurrency threads over
+    one pooled session, so at most max_concurrency requests are in flight at once.
+    """
+
+    def __init__(self, base_url="http://localhost:8000", max_concurrency=8, **kwargs):
+        self.client = AIEthicsClient(base_url, pool_size=max_concurrency, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ai-ethics-client")
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+        return call
+
+    async def audit_many(self, audits, return_exceptions=False):
+        """
+        Runs many audits concurrently; `audits` is an iterable of keyword-argument dicts
+        for audit() (data_bytes, model_bytes or model_id, stages). Returns the responses
+        in the same order.
+        """
+        return await asyncio.gather(*(self.audit(**kwargs) for kwargs in audits), return_exceptions=return_exceptions)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
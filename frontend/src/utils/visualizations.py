@@ -11,6 +11,31 @@ def create_bar_chart(data, title="Bar Chart", xaxis_title="Categories", yaxis_ti
     fig.update_layout(title=title, xaxis_title=xaxis_title, yaxis_title=yaxis_title)
     return fig
 
+def create_tradeoff_chart(sweep, metric="accuracy", gap="demographic_parity_difference", title="Fairness-Accuracy Trade-off"):
+    """
+    Creates a Plotly line chart of a threshold sweep (the backend's threshold_sweep result).
+    
+    :param sweep: A dictionary with "thresholds", "groups", "overall" and "gaps".
+    :param metric: Per-group metric to plot against the threshold ("accuracy", "selection_rate", ...).
+    :param gap: Fairness gap drawn on the secondary axis.
+    :return: A Plotly Figure object.
+    """
+    thresholds = sweep["thresholds"]
+    fig = go.Figure()
+    for group, curves in sweep["groups"].items():
+        fig.add_trace(go.Scatter(x=thresholds, y=curves[metric], mode="lines", name=f"{group} {metric}"))
+    fig.add_trace(go.Scatter(x=thresholds, y=sweep["overall"][metric], mode="lines", name=f"overall {metric}",
+                             line={"dash": "dash", "color": "black"}))
+    fig.add_trace(go.Scatter(x=thresholds, y=sweep["gaps"][gap], mode="lines", name=gap, yaxis="y2",
+                             line={"dash": "dot", "color": "red"}))
+    fig.update_layout(
+        title=title,
+        xaxis_title="Decision threshold",
+        yaxis={"title": metric, "range": [0, 1]},
+        yaxis2={"title": gap, "overlaying": "y", "side": "right", "range": [0, 1]}
+    )
+    return fig
+
 def create_pie_chart(labels, values, title="Pie Chart"):
     """
     Creates a Plotly pie chart.